@@ -1,8 +1,26 @@
 from django.apps import AppConfig
 import os
+import sys
 import json
 from django.conf import settings
+from chatbot.utils.phrase_matcher import AliasMatcher
 product_aliases_data = {}
+product_alias_matcher = AliasMatcher()  # Rebuilt in place whenever the aliases load
+
+SERVER_COMMANDS = ("runserver", "runsslserver")
+
+
+def is_server_process():
+    """
+    True under the WSGI/ASGI entry points (which set CHATBOT_SERVER_PROCESS)
+    and in the process runserver actually serves from, not its autoreloader.
+    """
+    if os.environ.get("CHATBOT_SERVER_PROCESS"):
+        return True
+    if len(sys.argv) > 1 and sys.argv[1] in SERVER_COMMANDS:
+        return os.environ.get("RUN_MAIN") == "true" or "--noreload" in sys.argv
+    return False
+
 
 class ChatbotConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
@@ -41,6 +59,10 @@ class ChatbotConfig(AppConfig):
                 for alias, canonical in sorted_aliases_list:
                     product_aliases_data[alias.lower()] = canonical # Store alias key as lowercase
 
+                # Compile every alias and canonical name into one matcher so
+                # scoring scans each text once instead of once per alias.
+                product_alias_matcher.build(product_aliases_data)
+
             print(f"Successfully loaded and ordered product aliases from {aliases_file_path}")
             print(f"Total aliases loaded: {len(product_aliases_data)}")
         except FileNotFoundError:
@@ -51,4 +73,12 @@ class ChatbotConfig(AppConfig):
         except Exception as e:
             print(f"An unexpected error occurred while loading aliases: {e}")
 
+        # Servers can load the embedding model and Chroma collection up front
+        # instead of on the first request; other management commands skip this.
+        if getattr(settings, "CHATBOT_WARMUP_ON_START", False) and is_server_process():
+            from chatbot.services.resources import registry
+            timings = registry.warmup()
+            summary = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in timings.items())
+            print(f"🔥 Chatbot warmup finished: {summary}")
+
 
@@ -144,6 +144,49 @@ category_map = {
         
     }
 
+# Product listing templates (chatbot.services.listing_renderer), keyed by
+# listing; "{category}" and "{count}" are filled in. Group headings are
+# rendered as "<Group> Products" so format_text.format_bot_reply shows them
+# as headings.
+listing_templates = {
+        "default": {
+            "intro": "Midland Bank offers the following {category} products:",
+            "outro": "Would you like details on any of these? Just ask about a product by name.",
+        },
+        "islamic": {
+            "intro": "Midland Bank's Saalam Islamic Banking offers these Shariah-compliant products:",
+            "outro": "Would you like details on any of these Saalam products?",
+        },
+        "islamic loan": {
+            "intro": "Midland Bank offers the following Shariah-compliant Saalam financing products:",
+            "outro": "Ask about any of them to see features, eligibility and required documents.",
+        },
+        "islamic savings": {
+            "intro": "Midland Bank offers the following Shariah-compliant Saalam savings products:",
+            "outro": "Ask about any of them to see profit rates, features and eligibility.",
+        },
+        "sme": {
+            "intro": "Midland Bank offers the following SME banking products:",
+            "outro": "Would you like details on any of these SME products?",
+        },
+        "nrb": {
+            "intro": "Midland Bank offers the following products for Non-Resident Bangladeshis (NRBs):",
+            "outro": "Would you like details on any of these NRB products?",
+        },
+        "loans": {
+            "intro": "Midland Bank offers the following loan products:",
+            "outro": "Ask about any loan to see its features, eligibility and required documents.",
+        },
+        "savings": {
+            "intro": "Midland Bank offers the following savings and deposit products:",
+            "outro": "Ask about any of them to see rates, features and eligibility.",
+        },
+        "cards": {
+            "intro": "Midland Bank offers the following card products:",
+            "outro": "Ask about any card to see its features, fees and eligibility.",
+        },
+    }
+
 # Extract branding statements
 branding_phrases = {"vision", "mission"}
 
@@ -152,6 +195,21 @@ product_phrases = {
     "green loan", "MDB IT Uddog", "MDB Krishi Loan", "MDB Nari Uddog", "MDB Praromvik",
     "MDB Orjon", "MDB Ogroj", "MDB Diptimoyi", "MDB Nirbhorota", "MDB Start-up", "MDB Nirman"
 }
+# Fee-only terms, matched as whole words, that let BM25 answer on its own
+lexical_fee_terms = [
+    "fee", "fees", "charge", "charges", "vat", "excise duty", "closing charge",
+    "locker charge", "processing fee", "transaction fee", "settlement fee",
+    "reschedule fee", "stamp charge", "penal interest", "npsb-ibft fees"
+]
+
+# Words ignored when checking that a chunk covers a query
+query_stopwords = {
+    "a", "an", "the", "is", "are", "was", "be", "of", "for", "to", "in", "on", "at",
+    "and", "or", "by", "with", "from", "about", "what", "which", "who", "how", "much",
+    "many", "do", "does", "can", "i", "you", "your", "my", "me", "we", "our", "it",
+    "this", "that", "there", "any", "tell", "please", "show", "give", "mdb", "midland", "bank"
+}
+
 role_aliases = {
     "chief technology officer": "cto",
     "deputy managing director": "dmd",
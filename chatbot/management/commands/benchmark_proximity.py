@@ -0,0 +1,67 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from chatbot.services.resources import get_collection
+from chatbot.services.scoring_services import proximity_raw, proximity_raw_all_pairs, word_positions
+
+DEFAULT_QUERIES = [
+    "car loan processing fee",
+    "savings account interest rate",
+    "branch address and contact number",
+    "documents required for home loan",
+]
+
+
+def _best_ms(func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+class Command(BaseCommand):
+    help = (
+        "Time proximity_raw against the old all-pairs scan on the longest chunks in the "
+        "Chroma collection, and check that both give identical scores."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunks", type=int, default=10, help="How many of the longest chunks to time")
+        parser.add_argument("--repeat", type=int, default=5, help="Runs per measurement; the best is reported")
+        parser.add_argument("--query", action="append", dest="queries", help="Query to time (repeatable)")
+
+    def handle(self, *args, **options):
+        queries = options["queries"] or DEFAULT_QUERIES
+        repeat = max(options["repeat"], 1)
+        documents = [doc for doc in get_collection().get(include=["documents"])["documents"] if doc]
+        if not documents:
+            raise CommandError("The collection has no documents")
+        longest = sorted(documents, key=lambda doc: len(doc.split()), reverse=True)[:options["chunks"]]
+
+        self.stdout.write(f"{'words':>7} {'all-pairs ms':>13} {'one-pass ms':>12} {'index ms':>9}")
+        totals = {"old": 0.0, "new": 0.0, "index": 0.0}
+        mismatches = 0
+        for doc in longest:
+            words = doc.lower().split()
+            positions = word_positions(words)
+            old = new = 0.0
+            for query in queries:
+                terms = set(query.lower().split())
+                if proximity_raw(terms, positions) != proximity_raw_all_pairs(terms, words):
+                    mismatches += 1
+                old += _best_ms(lambda: proximity_raw_all_pairs(terms, words), repeat)
+                new += _best_ms(lambda: proximity_raw(terms, positions), repeat)
+            index = _best_ms(lambda: word_positions(words), repeat)
+            totals["old"] += old
+            totals["new"] += new
+            totals["index"] += index
+            self.stdout.write(f"{len(words):>7} {old:>13.3f} {new:>12.3f} {index:>9.3f}")
+
+        self.stdout.write(
+            f"{'total':>7} {totals['old']:>13.3f} {totals['new']:>12.3f} {totals['index']:>9.3f}  "
+            f"({len(queries)} queries per chunk; the index is built once per chunk and cached)"
+        )
+        if mismatches:
+            raise CommandError(f"{mismatches} query/chunk pairs scored differently")
+        self.stdout.write(self.style.SUCCESS("Scores identical on every query/chunk pair"))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from chatbot.services.product_listing_service import build_product_lists
+from chatbot.services.retrieval_services import corpus_fingerprint
+
+
+class Command(BaseCommand):
+    help = "Extract the SME/NRB product lists from the Chroma corpus and store them for the listing views."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true", help="Re-extract even if lists exist for this corpus version")
+
+    def handle(self, *args, **options):
+        version = corpus_fingerprint()
+        lists = build_product_lists(version, force=options["force"])
+        for name, products in lists.items():
+            self.stdout.write(f"{name}: {len(products)} products")
+        self.stdout.write(self.style.SUCCESS(f"Product lists stored for corpus {version}"))
@@ -0,0 +1,57 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from chatbot.services.fake_openai import FakeOpenAIConfig, make_server
+
+
+class Command(BaseCommand):
+    help = (
+        "Run a local stand-in for the OpenAI Responses API (POST /v1/responses, streaming included) "
+        "for load tests and benchmarks. Point the app at it with CHATBOT_OPENAI_BASE_URL=http://HOST:PORT/v1."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument(
+            "--latency", default="fixed:0.3",
+            help="Time to first token: SECONDS, fixed:S, uniform:LOW,HIGH, normal:MEAN,SD, "
+                 "lognormal:MEDIAN,SIGMA or exp:MEAN (default fixed:0.3)"
+        )
+        parser.add_argument("--tokens-per-second", type=float, default=50.0, help="Output rate after the first token (0 = instant)")
+        parser.add_argument("--output-words", type=int, default=80, help="Length of generated (non-canned) answers")
+        parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 500")
+        parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 429")
+        parser.add_argument("--canned", help="JSON file mapping a substring of the user turn to a fixed reply")
+        parser.add_argument("--seed", type=int, default=0, help="Seed for latency and error draws")
+        parser.add_argument("--verbose", action="store_true", help="Log every request")
+
+    def handle(self, *args, **options):
+        canned = {}
+        if options["canned"]:
+            with open(options["canned"], "r", encoding="utf-8") as f:
+                canned = json.load(f)
+            if not isinstance(canned, dict):
+                raise CommandError("--canned must be a JSON object of {substring: reply}")
+        try:
+            config = FakeOpenAIConfig(
+                latency=options["latency"],
+                tokens_per_second=options["tokens_per_second"],
+                output_words=options["output_words"],
+                error_rate=options["error_rate"],
+                rate_limit_rate=options["rate_limit_rate"],
+                canned=canned,
+                seed=options["seed"],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        server = make_server(config, options["host"], options["port"], options["verbose"])
+        base_url = f"http://{options['host']}:{server.server_address[1]}/v1"
+        self.stdout.write(self.style.SUCCESS(f"🧪 Fake OpenAI listening on {base_url}"))
+        self.stdout.write(f"   Set CHATBOT_OPENAI_BASE_URL={base_url} (any API_KEY works)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+from chatbot.services.indexing_services import index_corpus, refresh_chunk_features
+from chatbot.services.product_listing_service import build_product_lists
+
+
+class Command(BaseCommand):
+    help = (
+        "Chunk source documents (.json/.jsonl/.txt/.md) into the Chroma collection. "
+        "Only chunks whose content hash changed are re-embedded."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("source", nargs="?", help="Source file or directory")
+        parser.add_argument("--chunk-size", type=int, default=1200, help="Target chunk length in characters")
+        parser.add_argument("--overlap", type=int, default=150, help="Characters carried over between chunks")
+        parser.add_argument("--batch-size", type=int, default=64, help="Chunks embedded per model call")
+        parser.add_argument("--no-prune", action="store_true", help="Keep chunks that are no longer in the source")
+        parser.add_argument("--dry-run", action="store_true", help="Report what would change without writing")
+        parser.add_argument(
+            "--features-only", action="store_true",
+            help="Only (re)compute stored scoring features for the chunks already in the collection"
+        )
+
+    def handle(self, *args, **options):
+        if options["features_only"]:
+            refreshed = refresh_chunk_features(batch_size=options["batch_size"], log=self.stdout.write)
+            self.stdout.write(self.style.SUCCESS(f"Features refreshed on {refreshed} chunks"))
+            return
+        if not options["source"]:
+            raise CommandError("A source file or directory is required (or pass --features-only)")
+        try:
+            stats = index_corpus(
+                options["source"],
+                chunk_size=options["chunk_size"],
+                overlap=options["overlap"],
+                batch_size=options["batch_size"],
+                prune=not options["no_prune"],
+                dry_run=options["dry_run"],
+                log=self.stdout.write,
+            )
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        if options["dry_run"]:
+            self.stdout.write(self.style.WARNING("Dry run: nothing written"))
+            return
+        # Listing views read these per corpus version; build them now rather than on first request
+        build_product_lists(stats["version"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {stats['chunks']} chunks ({stats['upserted']} upserted, {stats['deleted']} deleted) "
+            f"in {stats['seconds']:.1f}s — corpus version {stats['version']}"
+        ))
@@ -0,0 +1,226 @@
+import re
+import threading
+import time
+from django.conf import settings
+from rapidfuzz import fuzz, process
+from chatbot.data import config
+from chatbot.services.resources import get_collection
+from chatbot.services import retrieval_services
+from chatbot.utils.keyword_index import keyword_index
+
+# "Label: value" lines inside a branch record
+FIELD_LABELS = {
+    "name": r"branch\s*name|branch|sub[-\s]?branch|name",
+    "address": r"address|location",
+    "hours": r"(?:banking|business|office|working)\s*hours?|hours|timings?|time",
+    "phone": r"phone|telephone|tel|mobile|cell|contact\s*(?:no\.?|number)?",
+    "email": r"e-?mail",
+    "services": r"services?(?:\s*available)?|facilities",
+}
+LABELED_LINE_RE = re.compile(
+    r"^\s*[-•*]*\s*(?P<label>" + "|".join(f"(?:{p})" for p in FIELD_LABELS.values()) + r")\s*[:：\-–]\s*(?P<value>.+)$",
+    re.IGNORECASE
+)
+LABEL_RES = {field: re.compile(rf"^(?:{pattern})$", re.IGNORECASE) for field, pattern in FIELD_LABELS.items()}
+# A bare heading such as "Gulshan Branch" or "**Agrabad Sub-Branch:**" starts a
+# new record; capitalised so prose like "visit your nearest branch" doesn't
+HEADING_RE = re.compile(r"^\s*[-•*#]*\s*\**\s*(?P<name>[A-Za-z0-9.,()'&/\- ]{2,60}?\b(?:Sub[-\s]?)?(?:Branch|BRANCH))\s*\**:?\s*$")
+EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+")
+PHONE_RE = re.compile(r"(?:\+?88)?0\d[\d\s-]{6,}\d")
+# WRatio scores a short key by partial match ("gul" ~ "gulshan" at 90), so
+# keys shorter than this are compared whole with fuzz.ratio instead
+SHORT_KEY_LENGTH = 5
+
+
+class Branch:
+    __slots__ = ("name", "city", "address", "hours", "phone", "email", "services")
+
+    def __init__(self, name, city=None, address=None, hours=None, phone=None, email=None, services=None):
+        self.name = name
+        self.city = city
+        self.address = address
+        self.hours = hours
+        self.phone = phone
+        self.email = email
+        self.services = services
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.__slots__}
+
+
+def _label_field(label):
+    for field, label_re in LABEL_RES.items():
+        if label_re.match(label.strip()):
+            return field
+    return None
+
+
+def _finish(record, branches):
+    if not record or not record.get("name"):
+        return
+    text = f"{record['name']} {record.get('address', '')}".lower()
+    record["city"] = next((city for city, _ in keyword_index.analyze(text).location_hits), None)
+    branches.append(Branch(**record))
+
+
+def parse_branches(document):
+    """
+    Branch records found in one chunk. A record starts at a "Branch Name:"
+    line or a "... Branch" heading; following "Label: value" lines fill in
+    its fields, and unlabeled e-mails or phone numbers are picked up too.
+    """
+    branches = []
+    record = None
+    for line in document.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        labeled = LABELED_LINE_RE.match(line)
+        field = _label_field(labeled.group("label")) if labeled else None
+        if field == "name" or (not labeled and HEADING_RE.match(line)):
+            _finish(record, branches)
+            name = labeled.group("value") if labeled else HEADING_RE.match(line).group("name")
+            record = {"name": name.strip(" *:")}
+            continue
+        if record is None:
+            continue
+        if field:
+            value = labeled.group("value").strip(" *")
+            record[field] = f"{record[field]}, {value}" if record.get(field) else value
+        elif "email" not in record and EMAIL_RE.search(line):
+            record["email"] = EMAIL_RE.search(line).group(0)
+        elif "phone" not in record and PHONE_RE.search(line):
+            record["phone"] = PHONE_RE.search(line).group(0).strip()
+        elif "address" not in record:
+            # The first plain line under a branch heading is its address
+            record["address"] = line.strip(" *")
+    _finish(record, branches)
+    return branches
+
+
+def _normalize(name):
+    name = re.sub(r"[^\w\s]", " ", name.lower())
+    name = re.sub(r"\b(?:sub\s+)?branch\b|\bmidland bank\b", " ", name)
+    return " ".join(name.split())
+
+
+class BranchDirectory:
+    """
+    Branches parsed from the corpus, looked up by exact or fuzzy name, by
+    config.location_aliases (city or area) and by city.
+    """
+
+    def __init__(self, branches=(), version=None, score_cutoff=85):
+        self.branches = list(branches)
+        self.version = version
+        self.score_cutoff = score_cutoff
+        self.by_name = {}
+        self.by_city = {}
+        for branch in self.branches:
+            self.by_name.setdefault(_normalize(branch.name), []).append(branch)
+            if branch.city:
+                self.by_city.setdefault(branch.city, []).append(branch)
+        # Area aliases ("agrabad branch") resolve through the branch names;
+        # bare city names resolve to every branch in that city
+        self.alias_city = {}
+        for city, aliases in config.location_aliases.items():
+            self.alias_city[_normalize(city)] = city
+            for alias in aliases:
+                self.alias_city.setdefault(_normalize(alias), city)
+        self.choices = list(self.by_name)
+
+    def lookup(self, location):
+        """
+        Branches matching `location`, or [] if nothing is close enough. A fuzzy
+        match returns every branch tied at the best score (e.g. all the
+        "... Bazar" branches for "bazar").
+        """
+        key = _normalize(location)
+        if not key:
+            return []
+        if key in self.by_name:
+            return self.by_name[key]
+        city = self.alias_city.get(key)
+        if city and key == _normalize(city) and city in self.by_city:
+            return self.by_city[city]
+        if self.choices:
+            scorer = fuzz.ratio if len(key) < SHORT_KEY_LENGTH else fuzz.WRatio
+            matches = process.extract(key, self.choices, scorer=scorer, score_cutoff=self.score_cutoff, limit=None)
+            if matches:
+                best = max(score for _, score, _ in matches)
+                return [branch for name, score, _ in matches if score == best for branch in self.by_name[name]]
+        if city:
+            return self.by_city.get(city, [])
+        return []
+
+
+def render_branches(branches, location):
+    """Deterministic branch answer; the same layout the GPT prompt asked for."""
+    lines = [f"Here are the Midland Bank branch details for **{location.title()}**:", ""]
+    for branch in branches:
+        lines.append(f"**{branch.name}**")
+        for label, value in (
+            ("Address", branch.address), ("Hours", branch.hours), ("Phone", branch.phone),
+            ("Email", branch.email), ("Services", branch.services),
+        ):
+            if value:
+                lines.append(f"- {label}: {value}")
+        lines.append("")
+    return "\n".join(lines).strip()
+
+
+def extract_branches(collection):
+    """Parse branch records from every chunk that mentions a branch."""
+    data = collection.get(include=["documents"])
+    branches, seen = [], set()
+    for document in data["documents"]:
+        if not document or "branch" not in document.lower():
+            continue
+        for branch in parse_branches(document):
+            key = _normalize(branch.name)
+            if key and key not in seen:
+                seen.add(key)
+                branches.append(branch)
+    return branches
+
+
+_directory = BranchDirectory()
+_directory_lock = threading.Lock()
+_directory_failed_at = None
+
+
+def get_branch_directory():
+    """
+    Current BranchDirectory; parsed once per corpus version and shared via the disk cache.
+    After a failed build the last directory is served for
+    CHATBOT_BRANCH_DIRECTORY_RETRY_SECONDS before the parse is tried again.
+    """
+    global _directory, _directory_failed_at
+    retry_after = getattr(settings, "CHATBOT_BRANCH_DIRECTORY_RETRY_SECONDS", 60)
+    if _directory_failed_at is not None and time.monotonic() - _directory_failed_at < retry_after:
+        return _directory
+    try:
+        version = retrieval_services.current_corpus_version()
+        if _directory.version != version:
+            with _directory_lock:
+                if _directory.version != version:
+                    key = f"branches:{version}"
+                    records = retrieval_services.cache.get(key)
+                    if records is None:
+                        records = [branch.to_dict() for branch in extract_branches(get_collection())]
+                        retrieval_services.cache.set(key, records)
+                    _directory = BranchDirectory([Branch(**record) for record in records], version)
+                    print(f"🏦 Branch directory built: {len(records)} branches (corpus {version})")
+        _directory_failed_at = None
+    except Exception as e:
+        print(f"Error building branch directory, will retry in {retry_after}s: {e}")
+        _directory_failed_at = time.monotonic()
+    return _directory
+
+
+def answer_branch_query(location):
+    """Template answer for `location`, or None when the directory has no match."""
+    branches = get_branch_directory().lookup(location)
+    if not branches:
+        return None
+    return render_branches(branches, location)
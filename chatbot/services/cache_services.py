@@ -0,0 +1,132 @@
+import hashlib
+import os
+import threading
+import time
+from django.conf import settings
+from chatbot.data.config import system_message
+from chatbot.services.corpus_state import (
+    cache, corpus_fingerprint, ids_fingerprint, current_corpus_version, current_ids_version
+)
+
+GENERATION_KEY = "cache:generation"
+SWEEP_LOCK_KEY = "cache:sweep_lock"
+# Keys that embed a corpus version directly, e.g. "product_lists:<version>"
+# or "chunkref:<version>|<chunk id>"
+CORPUS_KEYED_PREFIXES = ("product_lists:", "branches:", "chunkref:")
+
+_state = {"namespace": None, "ids_namespace": None, "corpus_version": None, "checked_at": 0.0}
+_sweeper = None
+_sweeper_lock = threading.Lock()
+
+
+def prompt_version():
+    """Identifies the prompt and model behind cached answers; edit either and old answers stop matching."""
+    payload = f"{system_message}\0{getattr(settings, 'DEFAULT_GPT_MODEL', 'gpt-5')}\0" \
+              f"{getattr(settings, 'CHATBOT_PROMPT_VERSION', '')}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:8]
+
+
+def generation():
+    """Admin-controlled counter; bumping it invalidates every namespaced entry."""
+    return cache.get(GENERATION_KEY, 0)
+
+
+def _digest(*parts):
+    return hashlib.sha256("|".join(str(part) for part in parts).encode("utf-8")).hexdigest()[:12]
+
+
+def _namespaces(corpus_version, ids_version, current_generation):
+    return (
+        _digest(corpus_version, prompt_version(), current_generation),
+        _digest("ids", ids_version, current_generation),
+    )
+
+
+def namespace(scope="content"):
+    """
+    Current cache namespace, re-read at most every CHATBOT_CORPUS_CHECK_SECONDS.
+
+    "content" hashes the corpus version, the prompt version and the admin
+    generation; "ids" hashes only the chunk-id set and the generation, for
+    entries that stay valid when chunk texts change.
+    """
+    max_age = getattr(settings, "CHATBOT_CORPUS_CHECK_SECONDS", 60)
+    if _state["namespace"] is None or time.time() - _state["checked_at"] >= max_age:
+        corpus_version = current_corpus_version()
+        _state["namespace"], _state["ids_namespace"] = _namespaces(corpus_version, current_ids_version(), generation())
+        _state["corpus_version"] = corpus_version
+        _state["checked_at"] = time.time()
+        start_sweeper()
+    return _state["ids_namespace"] if scope == "ids" else _state["namespace"]
+
+
+def versioned_key(kind, raw, scope="content"):
+    """Cache key for `raw` under the current namespace, e.g. "v:<ns>:gpt:<hash>"."""
+    return f"v:{namespace(scope)}:{kind}:{raw}"
+
+
+def bump_generation():
+    """Invalidate all namespaced entries now; old ones are removed by the sweeper."""
+    new_generation = cache.incr(GENERATION_KEY, default=0)
+    _state["namespace"] = None
+    return new_generation, namespace()
+
+
+def is_stale(key, current_namespaces, corpus_version):
+    if not isinstance(key, str):
+        return False
+    if key.startswith("v:"):
+        return key.split(":", 2)[1] not in current_namespaces
+    for prefix in CORPUS_KEYED_PREFIXES:
+        if key.startswith(prefix):
+            rest = key[len(prefix):]
+            return rest != corpus_version and not rest.startswith(f"{corpus_version}|")
+    return False
+
+
+def sweep_stale_entries(batch_size=500, pause=0.05):
+    """
+    Delete entries from old namespaces a batch at a time, pausing between
+    batches so the sweep never holds the cache for long. Returns the count.
+    """
+    # Re-read the generation and corpus version rather than this worker's
+    # cached namespace, which may predate a bump another worker just made
+    corpus_version = corpus_fingerprint()
+    current_namespaces = set(_namespaces(corpus_version, ids_fingerprint(), generation()))
+    removed, batch = 0, []
+    for key in cache.iterkeys():
+        if is_stale(key, current_namespaces, corpus_version):
+            batch.append(key)
+        if len(batch) >= batch_size:
+            removed += sum(cache.delete(k) for k in batch)
+            batch = []
+            time.sleep(pause)
+    removed += sum(cache.delete(k) for k in batch)
+    return removed
+
+
+def _sweep_forever(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            # One worker per interval does the sweep
+            if cache.add(SWEEP_LOCK_KEY, os.getpid(), expire=interval):
+                removed = sweep_stale_entries(
+                    batch_size=getattr(settings, "CHATBOT_CACHE_SWEEP_BATCH", 500)
+                )
+                if removed:
+                    print(f"🧹 Cache sweeper removed {removed} stale entries")
+        except Exception as e:
+            print(f"Cache sweeper error: {e}")
+
+
+def start_sweeper():
+    """Start the background sweeper thread once per process (CHATBOT_CACHE_SWEEP_INTERVAL=0 disables it)."""
+    global _sweeper
+    interval = getattr(settings, "CHATBOT_CACHE_SWEEP_INTERVAL", 15 * 60)
+    if _sweeper is not None or not interval:
+        return
+    with _sweeper_lock:
+        if _sweeper is None:
+            _sweeper = threading.Thread(target=_sweep_forever, args=(interval,), daemon=True, name="cache-sweeper")
+            _sweeper.start()
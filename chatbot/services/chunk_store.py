@@ -0,0 +1,85 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class ChunkStore:
+    """
+    Content-addressed chunk text shared by all cached retrieval results.
+
+    `chunkref:<corpus version>|<chunk id>` maps a chunk id to the sha256 of
+    its text and `chunk:<sha256>` holds the text once, however many cached
+    queries point at it. Texts are kept in a bounded in-memory LRU in front
+    of the disk cache; refs are remembered per corpus version.
+    """
+
+    def __init__(self, store, max_entries=2048, expire=None):
+        self.store = store
+        self.max_entries = max_entries
+        self.expire = expire
+        self._texts = OrderedDict()  # sha256 -> text
+        self._refs = {}              # chunk id -> sha256, for self._refs_version
+        self._refs_version = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _digest(text):
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _remember(self, digest, text):
+        self._texts[digest] = text
+        self._texts.move_to_end(digest)
+        while len(self._texts) > self.max_entries:
+            self._texts.popitem(last=False)
+
+    def _check_version(self, version):
+        if version != self._refs_version:
+            self._refs = {}
+            self._refs_version = version
+
+    def put_many(self, items, version):
+        """Store [(chunk_id, text)] and point the ids at them for `version`."""
+        for chunk_id, text in items:
+            digest = self._digest(text)
+            # add() is a no-op when another query already stored this text
+            self.store.add(f"chunk:{digest}", text, expire=self.expire)
+            self.store.set(f"chunkref:{version}|{chunk_id}", digest, expire=self.expire)
+            with self._lock:
+                self._check_version(version)
+                self._refs[chunk_id] = digest
+                self._remember(digest, text)
+
+    def get_many(self, chunk_ids, version, fetch=None):
+        """
+        Texts for `chunk_ids` in order (None where unknown). Ids missing from
+        the store are looked up with `fetch(ids) -> {id: text}` and stored.
+        """
+        texts = {}
+        with self._lock:
+            self._check_version(version)
+            for chunk_id in chunk_ids:
+                digest = self._refs.get(chunk_id)
+                if digest in self._texts:
+                    self._texts.move_to_end(digest)
+                    texts[chunk_id] = self._texts[digest]
+
+        missing = []
+        for chunk_id in chunk_ids:
+            if chunk_id in texts:
+                continue
+            digest = self.store.get(f"chunkref:{version}|{chunk_id}")
+            text = self.store.get(f"chunk:{digest}") if digest else None
+            if text is None:
+                missing.append(chunk_id)
+                continue
+            texts[chunk_id] = text
+            with self._lock:
+                self._check_version(version)
+                self._refs[chunk_id] = digest
+                self._remember(digest, text)
+
+        if missing and fetch is not None:
+            fetched = fetch(missing)
+            self.put_many(fetched.items(), version)
+            texts.update(fetched)
+        return [texts.get(chunk_id) for chunk_id in chunk_ids]
@@ -0,0 +1,65 @@
+import threading
+import time
+
+
+class CircuitBreaker:
+    """
+    Fail-fast guard around an unreliable dependency (per process).
+
+    closed:    calls go through; `failure_threshold` consecutive failures
+               (errors, or calls slower than `slow_call_seconds`) open it.
+    open:      allow_request() is False for `cooldown` seconds, so callers
+               answer from cache or degrade instead of waiting on timeouts.
+    half-open: after the cooldown one trial call goes through; success
+               closes the breaker, failure opens it again.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+    def __init__(self, name, failure_threshold=5, slow_call_seconds=20.0, cooldown=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.failures = 0
+        self._changed_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            # Open: wait out the cooldown. Half-open: one trial at a time,
+            # re-armed if the trial never reported back.
+            if time.monotonic() - self._changed_at < self.cooldown:
+                return False
+            self._set_state(self.HALF_OPEN)
+            return True
+
+    def is_open(self):
+        """True while calls are being refused (does not start a trial)."""
+        with self._lock:
+            return self.state != self.CLOSED and time.monotonic() - self._changed_at < self.cooldown
+
+    def record_success(self, latency):
+        if self.slow_call_seconds and latency > self.slow_call_seconds:
+            self.record_failure(f"slow call ({latency:.1f}s)")
+            return
+        with self._lock:
+            self.failures = 0
+            if self.state != self.CLOSED:
+                self._set_state(self.CLOSED)
+
+    def record_failure(self, reason="error"):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                print(f"🔌 {self.name} circuit opened after {self.failures} failures (last: {reason})")
+                self._set_state(self.OPEN)
+
+    def _set_state(self, state):
+        if state == self.CLOSED and self.state != self.CLOSED:
+            print(f"🔌 {self.name} circuit closed")
+        self.state = state
+        self._changed_at = time.monotonic()
@@ -0,0 +1,53 @@
+import time
+import diskcache as dc
+from django.conf import settings
+from chatbot.services.resources import DEFAULT_COLLECTION_NAME, get_collection
+
+cache = dc.Cache("cache_dir", size_limit=1e9)  # Initialize disk cache for caching results
+
+
+def corpus_version_key(kind="version"):
+    """Cache key where `manage.py index_corpus` records the corpus version (or ids_version)."""
+    name = getattr(settings, "CHATBOT_COLLECTION_NAME", DEFAULT_COLLECTION_NAME)
+    return f"corpus:{kind}:{name}"
+
+
+def corpus_fingerprint():
+    """
+    Identifier of the collection contents, used to resync in-memory indexes.
+    Prefers the content-hash version recorded at indexing time; collections
+    built elsewhere fall back to name:count.
+    """
+    recorded = cache.get(corpus_version_key())
+    if recorded:
+        return recorded
+    collection = get_collection()
+    return f"{collection.name}:{collection.count()}"
+
+
+def ids_fingerprint():
+    """Identifier of the set of chunk ids; unchanged when only chunk contents change."""
+    return cache.get(corpus_version_key("ids_version")) or corpus_fingerprint()
+
+
+_corpus_state = {"version": None, "ids_version": None, "checked_at": 0.0}
+
+
+def _refresh_corpus_state():
+    max_age = getattr(settings, "CHATBOT_CORPUS_CHECK_SECONDS", 60)
+    if _corpus_state["version"] is None or time.time() - _corpus_state["checked_at"] >= max_age:
+        _corpus_state["version"] = corpus_fingerprint()
+        _corpus_state["ids_version"] = ids_fingerprint()
+        _corpus_state["checked_at"] = time.time()
+
+
+def current_corpus_version():
+    """corpus_fingerprint(), re-read at most every CHATBOT_CORPUS_CHECK_SECONDS."""
+    _refresh_corpus_state()
+    return _corpus_state["version"]
+
+
+def current_ids_version():
+    """ids_fingerprint(), re-read together with the corpus version."""
+    _refresh_corpus_state()
+    return _corpus_state["ids_version"]
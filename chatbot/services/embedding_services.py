@@ -0,0 +1,84 @@
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+
+
+def normalize_query_text(text):
+    """Lowercase and collapse whitespace so trivially different queries share an embedding."""
+    return " ".join(str(text).lower().split())
+
+
+class CachedEmbeddingFunction:
+    """
+    Memoizing wrapper around the SentenceTransformer embedding function.
+
+    Embeddings are keyed by normalized query text. Hot entries live in a
+    bounded in-memory LRU; every embedding is also written to the disk cache
+    as float16 so other workers and restarts can reuse it.
+    """
+
+    def __init__(self, embedding_func, store=None, model_name="", max_entries=2048):
+        self.embedding_func = embedding_func
+        self.store = store
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, normalized):
+        digest = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+        return f"emb:{self.model_name}:{digest}"
+
+    def _remember(self, key, vector):
+        with self._lock:
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _lookup(self, key):
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                return vector
+        if self.store is not None:
+            raw = self.store.get(key)
+            if raw is not None:
+                vector = np.frombuffer(raw, dtype=np.float16).astype(np.float32)
+                self._remember(key, vector)
+                return vector
+        return None
+
+    def embed(self, texts):
+        """Return one float32 vector per text, embedding only the cache misses (in one batch)."""
+        normalized = [normalize_query_text(text) for text in texts]
+        keys = [self._key(text) for text in normalized]
+        vectors = [self._lookup(key) for key in keys]
+
+        missing = {}
+        for i, vector in enumerate(vectors):
+            if vector is None:
+                missing.setdefault(normalized[i], []).append(i)
+
+        self.hits += len(texts) - sum(len(idxs) for idxs in missing.values())
+        if missing:
+            pending = list(missing)
+            self.misses += len(pending)
+            embedded = self.embedding_func(pending)
+            for text, vector in zip(pending, embedded):
+                # Round through float16 so fresh and stored embeddings are identical
+                vector = np.asarray(vector, dtype=np.float16).astype(np.float32)
+                key = self._key(text)
+                self._remember(key, vector)
+                if self.store is not None:
+                    self.store.set(key, vector.astype(np.float16).tobytes())
+                for i in missing[text]:
+                    vectors[i] = vector
+        return vectors
+
+    def embed_one(self, text):
+        return self.embed([text])[0]
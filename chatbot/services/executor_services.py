@@ -0,0 +1,58 @@
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import close_old_connections
+
+_executors = {}
+_executor_lock = threading.Lock()
+
+
+def _pool(name, size_setting, default_size):
+    executor = _executors.get(name)
+    if executor is None:
+        with _executor_lock:
+            executor = _executors.get(name)
+            if executor is None:
+                executor = _executors[name] = ThreadPoolExecutor(
+                    max_workers=getattr(settings, size_setting, default_size),
+                    thread_name_prefix=f"chatbot-{name}"
+                )
+    return executor
+
+
+def get_executor():
+    """
+    Process-wide pool for blocking work (Chroma queries, embeddings, disk
+    cache) done on behalf of async views. Bounded by CHATBOT_BLOCKING_WORKERS,
+    so a burst of requests queues here instead of starting a thread each.
+    """
+    return _pool("blocking", "CHATBOT_BLOCKING_WORKERS", 8)
+
+
+def get_fanout_executor():
+    """
+    Pool for the parallel parts of a single request (e.g. summarizing both
+    products of a comparison), bounded by CHATBOT_FANOUT_WORKERS. Separate
+    from get_executor() because the request itself may be running there.
+    """
+    return _pool("fanout", "CHATBOT_FANOUT_WORKERS", 8)
+
+
+def _with_db_cleanup(func, *args, **kwargs):
+    # Pool threads outlive requests, so close their expired or broken DB
+    # connections around each call as Django's request signals would
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Run func(*args, **kwargs) on the bounded executor and await its result."""
+    loop = asyncio.get_running_loop()
+    call = functools.partial(contextvars.copy_context().run, _with_db_cleanup, func, *args, **kwargs)
+    return await loop.run_in_executor(get_executor(), call)
@@ -0,0 +1,215 @@
+import hashlib
+import itertools
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Deterministic filler for answers without a canned reply
+FILLER_SENTENCES = [
+    "Midland Bank offers this service at all of its branches.",
+    "Eligibility depends on your income, age and existing relationship with the bank.",
+    "You can apply online or by visiting your nearest branch.",
+    "Profit rates and fees are reviewed periodically and may change.",
+    "Please bring a copy of your NID and recent photographs.",
+    "Our relationship managers can help you choose the right product.",
+    "Processing usually takes three to five working days.",
+    "The account can be operated through internet and mobile banking.",
+]
+TOKEN_RE = re.compile(r"\S+\s*")
+
+
+def parse_latency(spec):
+    """
+    Latency distribution from a spec, as a function rng -> seconds:
+    "0.5" / "fixed:0.5", "uniform:LOW,HIGH", "normal:MEAN,SD",
+    "lognormal:MEDIAN,SIGMA" or "exp:MEAN".
+    """
+    kind, _, params = str(spec).partition(":")
+    if not params:
+        kind, params = "fixed", kind
+    values = [float(value) for value in params.split(",")]
+    distributions = {
+        "fixed": lambda rng: values[0],
+        "uniform": lambda rng: rng.uniform(values[0], values[1]),
+        "normal": lambda rng: rng.gauss(values[0], values[1]),
+        "lognormal": lambda rng: rng.lognormvariate(math.log(values[0]), values[1]),
+        "exp": lambda rng: rng.expovariate(1 / values[0]) if values[0] else 0.0,
+    }
+    if kind not in distributions:
+        raise ValueError(f"Unknown latency distribution {kind!r}; use one of {', '.join(distributions)}")
+    draw = distributions[kind]
+    return lambda rng: max(draw(rng), 0.0)
+
+
+class FakeOpenAIConfig:
+    """Behaviour of the stand-in server; see the fake_openai_server command for the options."""
+
+    def __init__(self, latency="fixed:0.3", tokens_per_second=50.0, output_words=80,
+                 error_rate=0.0, rate_limit_rate=0.0, canned=None, seed=0):
+        self.latency = parse_latency(latency)
+        self.tokens_per_second = tokens_per_second
+        self.output_words = output_words
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.canned = canned or {}  # substring of the user turn -> reply
+        self.seed = seed
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def request_rng(self):
+        # Draws depend only on the seed and the request's arrival order
+        with self._lock:
+            number = next(self._counter)
+        return random.Random(f"{self.seed}:{number}")
+
+    def output_for(self, messages):
+        """Same input, same answer: a canned reply if one matches, else seeded filler."""
+        user_turns = [m.get("content", "") for m in messages if isinstance(m, dict) and m.get("role") == "user"]
+        question = str(user_turns[-1]) if user_turns else ""
+        for needle, reply in self.canned.items():
+            if needle.lower() in question.lower():
+                return reply
+        digest = hashlib.sha256(json.dumps(messages, sort_keys=True).encode("utf-8")).hexdigest()
+        rng = random.Random(digest)
+        words = []
+        while len(words) < self.output_words:
+            words.extend(rng.choice(FILLER_SENTENCES).split())
+        return " ".join(words[:self.output_words])
+
+
+def _count_tokens(text):
+    return max(1, len(text) // 4)
+
+
+def _response_body(response_id, model, text, input_tokens, status="completed"):
+    output = []
+    if status == "completed":
+        output = [{
+            "id": f"msg_{response_id}",
+            "type": "message",
+            "status": "completed",
+            "role": "assistant",
+            "content": [{"type": "output_text", "text": text, "annotations": []}],
+        }]
+    output_tokens = _count_tokens(text) if status == "completed" else 0
+    return {
+        "id": f"resp_{response_id}",
+        "object": "response",
+        "created_at": int(time.time()),
+        "status": status,
+        "model": model,
+        "output": output,
+        "usage": {
+            "input_tokens": input_tokens,
+            "input_tokens_details": {"cached_tokens": 0},
+            "output_tokens": output_tokens,
+            "output_tokens_details": {"reasoning_tokens": 0},
+            "total_tokens": input_tokens + output_tokens,
+        },
+    }
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    server_version = "FakeOpenAI/1.0"
+    config = None   # set by make_server
+    verbose = False
+
+    def log_message(self, format, *args):
+        if self.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status, message, error_type, code=None, headers=None):
+        self._send_json(status, {"error": {"message": message, "type": error_type, "param": None, "code": code}}, headers)
+
+    def do_POST(self):
+        if self.path.rstrip("/").split("?")[0] not in ("/v1/responses", "/responses"):
+            self._send_error(404, f"Unknown path {self.path}", "invalid_request_error")
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_error(400, "Request body is not valid JSON", "invalid_request_error")
+            return
+
+        config = self.config
+        rng = config.request_rng()
+        roll = rng.random()
+        if roll < config.rate_limit_rate:
+            self._send_error(429, "Rate limit reached (injected)", "requests", "rate_limit_exceeded", {"Retry-After": "1"})
+            return
+        if roll < config.rate_limit_rate + config.error_rate:
+            self._send_error(500, "The server had an error (injected)", "server_error")
+            return
+
+        messages = request.get("input") or []
+        if isinstance(messages, str):
+            messages = [{"role": "user", "content": messages}]
+        model = request.get("model", "fake-model")
+        text = config.output_for(messages)
+        input_tokens = sum(_count_tokens(str(m.get("content", ""))) for m in messages if isinstance(m, dict))
+        response_id = uuid.uuid4().hex[:24]
+        first_token_delay = config.latency(rng)
+        token_delay = 1 / config.tokens_per_second if config.tokens_per_second else 0.0
+
+        if request.get("stream"):
+            self._stream(response_id, model, text, input_tokens, first_token_delay, token_delay)
+            return
+        tokens = TOKEN_RE.findall(text)
+        time.sleep(first_token_delay + token_delay * len(tokens))
+        self._send_json(200, _response_body(response_id, model, text, input_tokens))
+
+    def _stream(self, response_id, model, text, input_tokens, first_token_delay, token_delay):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        sequence = itertools.count()
+        item_id = f"msg_{response_id}"
+
+        def send(event):
+            event["sequence_number"] = next(sequence)
+            self.wfile.write(f"event: {event['type']}\ndata: {json.dumps(event)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        try:
+            send({"type": "response.created", "response": _response_body(response_id, model, "", input_tokens, "in_progress")})
+            time.sleep(first_token_delay)
+            for i, token in enumerate(TOKEN_RE.findall(text)):
+                if i:
+                    time.sleep(token_delay)
+                send({
+                    "type": "response.output_text.delta", "item_id": item_id,
+                    "output_index": 0, "content_index": 0, "delta": token, "logprobs": [],
+                })
+            send({
+                "type": "response.output_text.done", "item_id": item_id,
+                "output_index": 0, "content_index": 0, "text": text, "logprobs": [],
+            })
+            send({"type": "response.completed", "response": _response_body(response_id, model, text, input_tokens)})
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client went away mid-stream
+
+
+def make_server(config, host="127.0.0.1", port=8765, verbose=False):
+    """A ThreadingHTTPServer answering POST /v1/responses like the OpenAI Responses API."""
+    handler = type("ConfiguredFakeOpenAIHandler", (FakeOpenAIHandler,), {"config": config, "verbose": verbose})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
@@ -0,0 +1,293 @@
+import hashlib
+import json
+import os
+import re
+import time
+from django.conf import settings
+from chatbot.services.resources import DEFAULT_COLLECTION_NAME, get_embedding_function, registry
+from chatbot.services.retrieval_services import cache, corpus_version_key
+from chatbot.services.scoring_services import chunk_feature_metadata, chunk_features_version
+
+SOURCE_EXTENSIONS = (".json", ".jsonl", ".txt", ".md")
+CONTENT_FIELDS = ("content", "text", "body")
+METADATA_FIELDS = ("title", "category", "sub_category", "section", "url")
+
+
+class SourceDocument:
+    __slots__ = ("key", "text", "metadata")
+
+    def __init__(self, key, text, metadata):
+        self.key = key            # stable id of the document, e.g. "rates.json#3"
+        self.text = text
+        self.metadata = metadata  # scalar Chroma metadata (title, category, ...)
+
+
+class Chunk:
+    __slots__ = ("id", "text", "metadata", "content_hash")
+
+    def __init__(self, chunk_id, text, metadata):
+        self.id = chunk_id
+        self.text = text
+        self.metadata = metadata
+        self.content_hash = content_hash(text, metadata)
+
+
+def content_hash(text, metadata):
+    """sha256 over the chunk text and its metadata; a changed hash means re-embed."""
+    payload = json.dumps({"text": text, "metadata": metadata}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _scalar_metadata(record):
+    # Chroma metadata values must be str/int/float/bool
+    return {
+        field: record[field] for field in METADATA_FIELDS
+        if isinstance(record.get(field), (str, int, float, bool))
+    }
+
+
+def _records_from_json(path, key):
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            records = [json.loads(line) for line in f if line.strip()]
+        else:
+            data = json.load(f)
+            records = data.get("documents", data.get("pages", [data])) if isinstance(data, dict) else data
+    for i, record in enumerate(records):
+        text = next((record[field] for field in CONTENT_FIELDS if record.get(field)), None)
+        if not text:
+            continue
+        doc_key = str(record.get("id") or f"{key}#{i}")
+        yield SourceDocument(doc_key, text, _scalar_metadata(record))
+
+
+def load_source_documents(source):
+    """
+    Read source documents from a file or directory.
+
+    .json/.jsonl hold records with a content/text/body field and optional
+    title, category, sub_category, section and url; .txt/.md files are one
+    document each, titled after the file name.
+    """
+    if os.path.isfile(source):
+        paths = [source]
+        root = os.path.dirname(source)
+    else:
+        root = source
+        paths = sorted(
+            os.path.join(dirpath, name)
+            for dirpath, _, names in os.walk(source)
+            for name in names if name.lower().endswith(SOURCE_EXTENSIONS)
+        )
+
+    documents = []
+    for path in paths:
+        key = os.path.relpath(path, root).replace(os.sep, "/")
+        if path.lower().endswith((".json", ".jsonl")):
+            documents.extend(_records_from_json(path, key))
+        else:
+            with open(path, "r", encoding="utf-8") as f:
+                text = f.read()
+            title = os.path.splitext(os.path.basename(path))[0].replace("_", " ").strip()
+            documents.append(SourceDocument(key, text, {"title": title}))
+    return documents
+
+
+def _split_long(paragraph, chunk_size):
+    # Break an oversized paragraph at sentence ends, then at spaces
+    pieces, current = [], ""
+    for sentence in re.split(r"(?<=[.!?])\s+", paragraph):
+        if len(sentence) > chunk_size:
+            # Flush what came before so the pieces stay in paragraph order;
+            # the sentence's tail goes on accumulating like any other sentence
+            if current:
+                pieces.append(current)
+                current = ""
+            while len(sentence) > chunk_size:
+                cut = sentence.rfind(" ", 0, chunk_size)
+                cut = cut if cut > 0 else chunk_size
+                pieces.append(sentence[:cut].strip())
+                sentence = sentence[cut:].strip()
+        if current and len(current) + len(sentence) + 1 > chunk_size:
+            pieces.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}".strip()
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def chunk_text(text, chunk_size=1200, overlap=150):
+    """
+    Split text into chunks of at most ~chunk_size characters on paragraph
+    boundaries. Each chunk after the first starts with up to `overlap`
+    characters (whole words) from the end of the previous one.
+    """
+    paragraphs = []
+    for paragraph in re.split(r"\n\s*\n", text.strip()):
+        paragraph = paragraph.strip()
+        if paragraph:
+            paragraphs.extend(_split_long(paragraph, chunk_size) if len(paragraph) > chunk_size else [paragraph])
+
+    chunks, current = [], ""
+    for paragraph in paragraphs:
+        if current and len(current) + len(paragraph) + 2 > chunk_size:
+            chunks.append(current)
+            tail = current[-overlap:] if overlap else ""
+            tail = tail[tail.find(" ") + 1:] if " " in tail else ""
+            current = f"{tail}\n\n{paragraph}" if tail else paragraph
+        else:
+            current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def build_chunks(documents, chunk_size=1200, overlap=150):
+    chunks = []
+    for document in documents:
+        for i, text in enumerate(chunk_text(document.text, chunk_size, overlap)):
+            metadata = dict(document.metadata, source=document.key, chunk_index=i)
+            chunks.append(Chunk(f"{document.key}::{i}", text, metadata))
+    return chunks
+
+
+def plan_sync(existing_hashes, chunks):
+    """Split chunks into (to_upsert, unchanged_ids, to_delete_ids) against the stored hashes."""
+    to_upsert, unchanged = [], []
+    for chunk in chunks:
+        if existing_hashes.get(chunk.id) == chunk.content_hash:
+            unchanged.append(chunk.id)
+        else:
+            to_upsert.append(chunk)
+    current_ids = {chunk.id for chunk in chunks}
+    to_delete = sorted(chunk_id for chunk_id in existing_hashes if chunk_id not in current_ids)
+    return to_upsert, unchanged, to_delete
+
+
+def corpus_versions(id_hashes):
+    """(version, ids_version): hashes over sorted (id, content_hash) pairs and over the ids alone."""
+    version, ids_version = hashlib.sha256(), hashlib.sha256()
+    for chunk_id, digest in sorted(id_hashes.items()):
+        version.update(f"{chunk_id}\0{digest}\n".encode("utf-8"))
+        ids_version.update(f"{chunk_id}\n".encode("utf-8"))
+    return version.hexdigest()[:16], ids_version.hexdigest()[:16]
+
+
+def record_corpus_version(id_hashes):
+    version, ids_version = corpus_versions(id_hashes)
+    cache.set(corpus_version_key(), version)
+    cache.set(corpus_version_key("ids_version"), ids_version)
+    return version, ids_version
+
+
+def chunk_metadata(chunk):
+    """Source metadata plus the content hash and the precomputed scoring features."""
+    return dict(
+        chunk.metadata,
+        content_hash=chunk.content_hash,
+        **chunk_feature_metadata(chunk.text, chunk.metadata)
+    )
+
+
+def refresh_chunk_features(batch_size=64, log=print):
+    """
+    Store scoring features on every chunk whose features are missing or stale,
+    without re-embedding. Works on collections built by other tools too.
+    """
+    collection = _open_collection()
+    data = collection.get(include=["documents", "metadatas"])
+    features_version = chunk_features_version()
+    stale = [
+        (chunk_id, doc, meta or {})
+        for chunk_id, doc, meta in zip(data["ids"], data["documents"], data["metadatas"])
+        if (meta or {}).get("features_version") != features_version
+    ]
+    for start in range(0, len(stale), batch_size):
+        batch = stale[start:start + batch_size]
+        collection.update(
+            ids=[chunk_id for chunk_id, _, _ in batch],
+            metadatas=[dict(meta, **chunk_feature_metadata(doc, meta)) for _, doc, meta in batch]
+        )
+    log(f"🧮 Stored features on {len(stale)} of {len(data['ids'])} chunks")
+    return len(stale)
+
+
+def _open_collection():
+    return registry.get("chroma_client").get_or_create_collection(
+        name=getattr(settings, "CHATBOT_COLLECTION_NAME", DEFAULT_COLLECTION_NAME),
+        embedding_function=get_embedding_function()
+    )
+
+
+def index_corpus(source, chunk_size=1200, overlap=150, batch_size=64, prune=True, dry_run=False, log=print):
+    """
+    Bring the Chroma collection in line with `source`: embed and upsert new
+    or changed chunks, delete chunks that disappeared (unless prune=False),
+    record the corpus version. Returns a stats dict.
+    """
+    start_time = time.time()
+    chunks = build_chunks(load_source_documents(source), chunk_size, overlap)
+    duplicate_ids = len(chunks) - len({chunk.id for chunk in chunks})
+    if duplicate_ids:
+        raise ValueError(f"{duplicate_ids} duplicate chunk ids in {source}; give records unique ids")
+
+    collection = _open_collection()
+    existing = collection.get(include=["metadatas"])
+    existing_hashes = {
+        chunk_id: (meta or {}).get("content_hash")
+        for chunk_id, meta in zip(existing["ids"], existing["metadatas"])
+    }
+    to_upsert, unchanged, to_delete = plan_sync(existing_hashes, chunks)
+    # Unchanged text but features from older keyword/alias tables: metadata-only update
+    features_version = chunk_features_version()
+    existing_features = {
+        chunk_id: (meta or {}).get("features_version")
+        for chunk_id, meta in zip(existing["ids"], existing["metadatas"])
+    }
+    unchanged_ids = set(unchanged)
+    stale_features = [
+        chunk for chunk in chunks
+        if chunk.id in unchanged_ids and existing_features.get(chunk.id) != features_version
+    ]
+    id_hashes = {chunk.id: chunk.content_hash for chunk in chunks}
+    if not prune:
+        # Chunks missing from the source stay, and still count towards the version
+        id_hashes.update((chunk_id, existing_hashes[chunk_id] or "") for chunk_id in to_delete)
+        to_delete = []
+    log(f"📦 {len(chunks)} chunks: {len(to_upsert)} new/changed, {len(unchanged)} unchanged, "
+        f"{len(to_delete)} removed, {len(stale_features)} with stale features")
+
+    if not dry_run:
+        embed = get_embedding_function()
+        for start in range(0, len(to_upsert), batch_size):
+            batch = to_upsert[start:start + batch_size]
+            documents = [chunk.text for chunk in batch]
+            collection.upsert(
+                ids=[chunk.id for chunk in batch],
+                documents=documents,
+                metadatas=[chunk_metadata(chunk) for chunk in batch],
+                embeddings=embed(documents)
+            )
+            log(f"  ↳ embedded {min(start + batch_size, len(to_upsert))}/{len(to_upsert)}")
+        for start in range(0, len(stale_features), batch_size):
+            batch = stale_features[start:start + batch_size]
+            collection.update(ids=[chunk.id for chunk in batch], metadatas=[chunk_metadata(chunk) for chunk in batch])
+        for start in range(0, len(to_delete), batch_size):
+            collection.delete(ids=to_delete[start:start + batch_size])
+        # The lazily opened collection handle may predate get_or_create
+        registry.reset("collection")
+
+    version, ids_version = record_corpus_version(id_hashes) if not dry_run else corpus_versions(id_hashes)
+
+    return {
+        "chunks": len(chunks),
+        "upserted": len(to_upsert),
+        "unchanged": len(unchanged),
+        "deleted": len(to_delete),
+        "features_refreshed": len(stale_features),
+        "version": version,
+        "ids_version": ids_version,
+        "seconds": time.time() - start_time,
+    }
@@ -0,0 +1,109 @@
+import math
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+class _Corpus:
+    """Immutable snapshot of the indexed chunks and their postings."""
+
+    def __init__(self, ids=(), documents=(), metadatas=(), fingerprint=None):
+        self.ids = list(ids)
+        self.documents = list(documents)
+        self.metadatas = [meta or {} for meta in metadatas]
+        self.positions = {chunk_id: i for i, chunk_id in enumerate(self.ids)}
+        self.fingerprint = fingerprint
+
+        postings = defaultdict(list)
+        self.doc_lengths = []
+        for position, doc in enumerate(self.documents):
+            tokens = tokenize(doc or "")
+            self.doc_lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                postings[term].append((position, tf))
+        self.postings = dict(postings)
+
+        total = len(self.documents)
+        self.avg_length = (sum(self.doc_lengths) / total) if total else 0.0
+        self.idf = {
+            term: math.log(1 + (total - len(plist) + 0.5) / (len(plist) + 0.5))
+            for term, plist in self.postings.items()
+        }
+
+
+class BM25Index:
+    """
+    In-process Okapi BM25 inverted index over the Chroma chunks.
+
+    Rebuilt from the collection whenever its fingerprint changes, so lexical
+    and vector retrieval always see the same corpus.
+    """
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.corpus = _Corpus()
+        self.checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def build(self, ids, documents, metadatas, fingerprint=None):
+        # Swap the snapshot in one assignment so searches never see a half-built index
+        self.corpus = _Corpus(ids, documents, metadatas, fingerprint)
+        print(f"📚 BM25 index built over {len(self.corpus.ids)} chunks ({len(self.corpus.postings)} terms)")
+
+    def sync(self, collection, fingerprint, min_interval=60):
+        """Rebuild from `collection` if `fingerprint()` no longer matches."""
+        if self.corpus.fingerprint is not None and time.time() - self.checked_at < min_interval:
+            return self
+        with self._lock:
+            if self.corpus.fingerprint is not None and time.time() - self.checked_at < min_interval:
+                return self
+            current = fingerprint()
+            if current != self.corpus.fingerprint:
+                data = collection.get(include=["documents", "metadatas"])
+                self.build(data["ids"], data["documents"], data["metadatas"], fingerprint=current)
+            self.checked_at = time.time()
+        return self
+
+    def search(self, query, top_k=10):
+        """Return [(chunk_id, score)] for the best `top_k` chunks."""
+        corpus = self.corpus
+        scores = defaultdict(float)
+        k1, b, avg = self.k1, self.b, corpus.avg_length or 1.0
+        for term in set(tokenize(query)):
+            plist = corpus.postings.get(term)
+            if not plist:
+                continue
+            idf = corpus.idf[term]
+            for position, tf in plist:
+                norm = k1 * (1 - b + b * corpus.doc_lengths[position] / avg)
+                scores[position] += idf * tf * (k1 + 1) / (tf + norm)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        return [(corpus.ids[position], score) for position, score in ranked]
+
+    def get(self, chunk_id):
+        """Return (document, metadata) for an indexed chunk, or (None, None)."""
+        corpus = self.corpus
+        position = corpus.positions.get(chunk_id)
+        if position is None:
+            return None, None
+        return corpus.documents[position], corpus.metadatas[position]
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """Merge ranked id lists; each list contributes 1 / (k + rank)."""
+    fused = defaultdict(float)
+    for ranking in rankings:
+        for rank, item_id in enumerate(ranking, start=1):
+            fused[item_id] += 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+
+lexical_index = BM25Index()
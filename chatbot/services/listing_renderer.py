@@ -0,0 +1,28 @@
+from chatbot.data import config
+
+
+def _template(key):
+    return config.listing_templates.get(key.lower(), config.listing_templates["default"])
+
+
+def render_listing(key, products=None, groups=None, label=None):
+    """
+    Deterministic product listing: the intro for `key` from
+    config.listing_templates, then either a flat "- product" list or one
+    "<Group> Products" heading per non-empty group, then the outro.
+    """
+    template = _template(key)
+    groups = {heading: items for heading, items in (groups or {}).items() if items}
+    count = sum(len(items) for items in groups.values()) if groups else len(products or [])
+    lines = [template["intro"].format(category=label or key, count=count), ""]
+    if groups:
+        for heading, items in groups.items():
+            lines.append(f"{heading} Products")
+            lines.extend(f"- {product}" for product in items)
+            lines.append("")
+    else:
+        lines.extend(f"- {product}" for product in products or [])
+        lines.append("")
+    if template.get("outro"):
+        lines.append(template["outro"].format(category=label or key, count=count))
+    return "\n".join(lines).strip()
@@ -1,16 +1,50 @@
-from openai import OpenAI
 from django.conf import settings 
 from chatbot.services.retrieval_services import cache
 # from chatbot.utils.text_utils import clean_response
 from chatbot.data.config import system_message
-from chatbot.utils import text_utils
 import hashlib
 import json
-client = OpenAI(api_key=settings.API_KEY)
+import time
+from chatbot.services.openai_client import create_openai_client, get_async_openai_client
+client = create_openai_client()
 import logging
 logger = logging.getLogger(__name__)
-from tenacity import retry, wait_random_exponential, stop_after_attempt, retry_if_exception_type
+from tenacity import retry, wait_random_exponential, stop_after_attempt, stop_after_delay, retry_if_exception_type
 from openai import RateLimitError, APIError
+from chatbot.services import retrieval_services
+from chatbot.services import cache_services
+from chatbot.services.executor_services import run_blocking
+from chatbot.services.single_flight import SingleFlight
+from chatbot.services import prompt_budget
+from chatbot.services.semantic_cache import SemanticAnswerCache
+from chatbot.services.circuit_breaker import CircuitBreaker
+
+API_ERROR_REPLY = "Sorry, I'm having trouble right now."
+UNEXPECTED_ERROR_REPLY = "Sorry, I’m having trouble right now."
+ERROR_REPLIES = {API_ERROR_REPLY, UNEXPECTED_ERROR_REPLY}
+DEGRADED_NOTICE = "I can't reach my answer service right now, so here is the most relevant information I found:"
+DEGRADED_EXCERPT_TOKENS = 250
+
+# While OpenAI is failing or very slow, answer from cache or degrade at once
+gpt_breaker = CircuitBreaker(
+    "OpenAI",
+    failure_threshold=getattr(settings, "CHATBOT_BREAKER_FAILURES", 5),
+    slow_call_seconds=getattr(settings, "CHATBOT_BREAKER_SLOW_SECONDS", 20),
+    cooldown=getattr(settings, "CHATBOT_BREAKER_COOLDOWN", 30),
+)
+
+# Identical prompts arriving together (e.g. after a campaign) make one OpenAI call
+gpt_flight = SingleFlight(
+    cache,
+    wait_timeout=getattr(settings, "CHATBOT_SINGLE_FLIGHT_TIMEOUT", 45),
+    lock_expire=getattr(settings, "CHATBOT_SINGLE_FLIGHT_LOCK_TTL", 120)
+)
+
+semantic_cache = SemanticAnswerCache(
+    threshold=getattr(settings, "CHATBOT_SEMANTIC_CACHE_THRESHOLD", 0.92),
+    ttl=getattr(settings, "CHATBOT_SEMANTIC_CACHE_TTL", 6 * 60 * 60),
+    max_entries=getattr(settings, "CHATBOT_SEMANTIC_CACHE_SIZE", 5000),
+)
 
 def build_message_list(prompt: str,context: str,cache: dict,history: list) -> list:
     
@@ -20,13 +54,23 @@ def build_message_list(prompt: str,context: str,cache: dict,history: list) -> li
 
     # If it's not a string, coerce it to one
     context = str(context)
-    processed_context = text_utils.truncate_context(context)
+
+    # Fit history and context into the token budget (prompt_budget.assemble_prompt)
+    history, processed_context, report = prompt_budget.assemble_prompt(
+        system_message, (history or [])[-6:], prompt, context
+    )
+    print(
+        f"🧮 Prompt tokens: {report['total']}/{report['budget']} ({report['tokenizer']}) — "
+        f"system {report['system']}, user {report['prompt']}, "
+        f"history {report['history']}/{report['history_wanted']}, "
+        f"context {report['context']}/{report['context_wanted']}"
+    )
 
     # 1) Seed with your system prompt
     messages = [{"role": "system", "content": system_message}]
 
-    # 2) Inject up to the last 20 turns of history
-    messages.extend(history[-6:])
+    # 2) Inject the last turns of history that fit
+    messages.extend(history)
 
     # 3) Add the new user turn
     messages.append({"role": "user", "content": prompt})
@@ -38,54 +82,375 @@ def build_message_list(prompt: str,context: str,cache: dict,history: list) -> li
     return messages
 
 
-@retry(
+def gpt_cache_key(messages: list) -> str:
+    model = getattr(settings, "DEFAULT_GPT_MODEL", "gpt-5")
+    key_data = json.dumps(messages, sort_keys=True)
+    return cache_services.versioned_key("gpt", f"{model}:{hashlib.sha256(key_data.encode()).hexdigest()}")
+
+
+def _store_answer(cache, key, out):
+    # Use TTL if available
+    if hasattr(cache, "set"):
+        cache.set(key, out, expire=getattr(settings, "CHATBOT_ANSWER_CACHE_TTL", 7 * 24 * 60 * 60))
+    else:
+        cache[key] = out
+
+
+def _request_options(messages: list) -> dict:
+    return dict(
+        model=getattr(settings, "DEFAULT_GPT_MODEL", "gpt-5"),
+        input=messages,
+        reasoning={"effort": "minimal"},
+        text={"verbosity": "low"}
+    )
+
+
+def is_error_reply(response) -> bool:
+    """Error and degraded replies must never be cached as answers."""
+    return response in ERROR_REPLIES or str(response).startswith(DEGRADED_NOTICE)
+
+
+def degraded_reply(messages: list) -> str:
+    """
+    Answer without GPT: the start of the retrieved context (the system note
+    build_message_list appends after the user turn), or the error reply.
+    """
+    if len(messages) > 2 and messages[-1]["role"] == "system" and messages[-2]["role"] == "user":
+        excerpt = prompt_budget.trim_to_tokens(messages[-1]["content"].strip(), DEGRADED_EXCERPT_TOKENS)
+        if excerpt:
+            return f"{DEGRADED_NOTICE}\n\n{excerpt}"
+    return API_ERROR_REPLY
+
+
+def _breaker_open(retry_state) -> bool:
+    return gpt_breaker.is_open()
+
+
+def _give_up(retry_state) -> str:
+    # tenacity stopped retrying (attempts, deadline or open breaker)
+    logger.warning("Giving up on OpenAI after %s attempts", retry_state.attempt_number)
+    return degraded_reply(retry_state.args[0])
+
+
+# Retry rate limits briefly, and not at all once the breaker has opened
+gpt_retry = retry(
     retry=retry_if_exception_type(RateLimitError),
     wait=wait_random_exponential(min=1, max=10),
-    stop=stop_after_attempt(3)
+    stop=(
+        stop_after_attempt(3)
+        | stop_after_delay(getattr(settings, "CHATBOT_OPENAI_RETRY_DEADLINE", 8))
+        | _breaker_open
+    ),
+    retry_error_callback=_give_up
 )
+
+
 def get_gpt_response(messages: list, cache) -> str:
     """
     Sends `messages` to GPT-5, caching by the hash of their content.
-    Supports TTL if cache is DiskCache.
+    Supports TTL if cache is DiskCache. Concurrent identical requests share
+    one call through gpt_flight.
     """
     if cache is None:
         logger.warning("No cache provided; using temporary in-memory cache")
         cache = {}
 
-    model = getattr(settings, "DEFAULT_GPT_MODEL", "gpt-5")
-    key_data = json.dumps(messages, sort_keys=True)
-    key = f"{model}:{hashlib.sha256(key_data.encode()).hexdigest()}"
+    key = gpt_cache_key(messages)
 
     if key in cache:
         return cache[key]
 
-    try:
-        resp = client.responses.create(
-            model=model,
-            input=messages,
-            reasoning={"effort": "minimal"},
-            text={"verbosity": "low"},
-            timeout=30
-        )
-        out = resp.output_text.strip()
+    if not hasattr(cache, "add"):
+        # A private dict: no other request could ever read its result
+        return _request_gpt_response(messages, cache, key)
+    return gpt_flight.do(key, lambda: cache.get(key), lambda: _request_gpt_response(messages, cache, key))
 
-        # Use TTL if available
-        if hasattr(cache, "set"):
-            cache.set(key, out, expire=60 * 60)
-        else:
-            cache[key] = out
 
+@gpt_retry
+def _request_gpt_response(messages: list, cache, key: str) -> str:
+    if not gpt_breaker.allow_request():
+        print("🔌 OpenAI circuit open; serving a degraded answer")
+        return degraded_reply(messages)
+
+    start_time = time.monotonic()
+    try:
+        resp = client.responses.create(**_request_options(messages))
+        gpt_breaker.record_success(time.monotonic() - start_time)
+        out = resp.output_text.strip()
+        _store_answer(cache, key, out)
         return out
     
     
     except RateLimitError:
+        gpt_breaker.record_failure("rate limit")
+        logger.warning("Rate limit hit — retrying automatically")
+        raise
+
+    except APIError as e:
+        gpt_breaker.record_failure(type(e).__name__)
+        logger.error("OpenAI API error", exc_info=e)
+        return API_ERROR_REPLY
+
+    except Exception as e:
+        gpt_breaker.record_failure(type(e).__name__)
+        logger.error("OpenAI API Error:", exc_info=e)
+        return UNEXPECTED_ERROR_REPLY
+
+
+async def aget_gpt_response(messages: list, cache) -> str:
+    """
+    Async get_gpt_response: same cache key, TTL, breaker and error replies,
+    awaiting AsyncOpenAI. Identical requests, sync or async, share one call
+    through gpt_flight.
+    """
+    if cache is None:
+        logger.warning("No cache provided; using temporary in-memory cache")
+        cache = {}
+
+    # The key depends on the corpus version, which may need a Chroma lookup
+    key = await run_blocking(gpt_cache_key, messages)
+
+    if key in cache:
+        return cache[key]
+
+    if not hasattr(cache, "add"):
+        return await _arequest_gpt_response(messages, cache, key)
+    return await gpt_flight.ado(key, lambda: cache.get(key), lambda: _arequest_gpt_response(messages, cache, key))
+
+
+@gpt_retry
+async def _arequest_gpt_response(messages: list, cache, key: str) -> str:
+    if not gpt_breaker.allow_request():
+        print("🔌 OpenAI circuit open; serving a degraded answer")
+        return degraded_reply(messages)
+
+    start_time = time.monotonic()
+    try:
+        resp = await get_async_openai_client().responses.create(**_request_options(messages))
+        gpt_breaker.record_success(time.monotonic() - start_time)
+        out = resp.output_text.strip()
+        _store_answer(cache, key, out)
+        return out
+
+    except RateLimitError:
+        gpt_breaker.record_failure("rate limit")
         logger.warning("Rate limit hit — retrying automatically")
         raise
 
     except APIError as e:
+        gpt_breaker.record_failure(type(e).__name__)
         logger.error("OpenAI API error", exc_info=e)
-        return "Sorry, I'm having trouble right now."
+        return API_ERROR_REPLY
 
     except Exception as e:
+        gpt_breaker.record_failure(type(e).__name__)
         logger.error("OpenAI API Error:", exc_info=e)
-        return "Sorry, I’m having trouble right now."
+        return UNEXPECTED_ERROR_REPLY
+
+
+def stream_gpt_response(messages: list, cache):
+    """
+    Generator form of get_gpt_response: yields output-text deltas as GPT
+    writes them and returns the full answer. Cached answers are yielded whole;
+    completed streams are cached under the same key. A request identical to
+    one already in flight waits for it and yields its answer whole.
+    """
+    if cache is None:
+        cache = {}
+
+    key = gpt_cache_key(messages)
+    cached = cache.get(key)
+    if cached is not None:
+        yield cached
+        return cached
+    if not hasattr(cache, "add"):
+        return (yield from _stream_gpt_response(messages, cache, key))
+
+    call, leader = gpt_flight.join(key)
+    if not leader:
+        try:
+            out = gpt_flight.wait(call)
+        except Exception:
+            out = None
+        if out is not None:
+            yield out
+            return out
+        # The leader gave up or timed out; stream independently
+        return (yield from _stream_gpt_response(messages, cache, key))
+
+    out, token = None, None
+    try:
+        token = gpt_flight.acquire(key)
+        if token is None:
+            out = gpt_flight.wait_shared(key, lambda: cache.get(key))
+            if out is not None:
+                yield out
+                return out
+        out = yield from _stream_gpt_response(messages, cache, key)
+        return out
+    finally:
+        # Also reached when the client disconnects mid-stream (out is None then)
+        if token:
+            gpt_flight.release(key, token)
+        gpt_flight.finish(key, call, out)
+
+
+def _stream_gpt_response(messages: list, cache, key: str):
+    if not gpt_breaker.allow_request():
+        print("🔌 OpenAI circuit open; serving a degraded answer")
+        out = degraded_reply(messages)
+        yield out
+        return out
+
+    parts = []
+    start_time = time.monotonic()
+    try:
+        stream = client.responses.create(stream=True, **_request_options(messages))
+        for event in stream:
+            if event.type == "response.output_text.delta":
+                if not parts:
+                    # Streams are judged on time to first token
+                    gpt_breaker.record_success(time.monotonic() - start_time)
+                # Answers are stored stripped; skip the leading whitespace here too
+                delta = event.delta if parts else event.delta.lstrip()
+                if delta:
+                    parts.append(delta)
+                    yield delta
+            elif event.type in ("response.failed", "error"):
+                raise RuntimeError(f"GPT stream ended with {event.type}")
+
+    except RateLimitError:
+        gpt_breaker.record_failure("rate limit")
+        if parts:
+            logger.error("Rate limit hit mid-stream; answer left incomplete")
+            return None
+        # Nothing shown yet: take the retrying non-streaming path instead
+        logger.warning("Rate limit hit — retrying without streaming")
+        out = _request_gpt_response(messages, cache, key)
+        yield out
+        return out
+
+    except Exception as e:
+        gpt_breaker.record_failure(type(e).__name__)
+        logger.error("OpenAI streaming error", exc_info=e)
+        if parts:
+            return None
+        yield API_ERROR_REPLY
+        return API_ERROR_REPLY
+
+    out = "".join(parts).strip()
+    _store_answer(cache, key, out)
+    return out
+
+
+def semantic_context_key(messages: list) -> str:
+    """
+    Digest of everything in `messages` except the user's question (system
+    prompt, chat history, retrieved context), so a semantic hit also needs
+    the same conversation around the paraphrase.
+    """
+    # build_message_list puts the question last, or just before the context note
+    question_at = max((i for i, message in enumerate(messages) if message["role"] == "user"), default=None)
+    rest = [message for i, message in enumerate(messages) if i != question_at]
+    return hashlib.sha256(json.dumps(rest, sort_keys=True).encode()).hexdigest()
+
+
+def answer_with_semantic_cache(question: str, messages: list, chunk_ids: list, cache) -> str:
+    """
+    Like get_gpt_response, but first reuses an answer given to a paraphrase
+    of `question` that was grounded on the same chunks.
+    """
+    if not getattr(settings, "CHATBOT_SEMANTIC_CACHE_ENABLED", True) or not chunk_ids:
+        return get_gpt_response(messages, cache)
+
+    embedding = retrieval_services.query_embedder.embed_one(question)
+    version = cache_services.namespace()
+    context = semantic_context_key(messages)
+    cached = semantic_cache.lookup(embedding, chunk_ids, version, question, context)
+    if cached:
+        print("⚡ Serving answer from semantic cache")
+        return cached
+
+    response = get_gpt_response(messages, cache)
+    if response and not is_error_reply(response):
+        semantic_cache.store(embedding, chunk_ids, response, version, question, context)
+    return response
+
+
+async def aanswer_with_semantic_cache(question: str, messages: list, chunk_ids: list, cache) -> str:
+    """Async answer_with_semantic_cache; the query embedding runs on the blocking executor."""
+    if not getattr(settings, "CHATBOT_SEMANTIC_CACHE_ENABLED", True) or not chunk_ids:
+        return await aget_gpt_response(messages, cache)
+
+    embedding = await run_blocking(retrieval_services.query_embedder.embed_one, question)
+    version = await run_blocking(cache_services.namespace)
+    context = semantic_context_key(messages)
+    cached = semantic_cache.lookup(embedding, chunk_ids, version, question, context)
+    if cached:
+        print("⚡ Serving answer from semantic cache")
+        return cached
+
+    response = await aget_gpt_response(messages, cache)
+    if response and not is_error_reply(response):
+        semantic_cache.store(embedding, chunk_ids, response, version, question, context)
+    return response
+
+
+def stream_answer_with_semantic_cache(question: str, messages: list, chunk_ids: list, cache):
+    """Streaming form of answer_with_semantic_cache; semantic hits are yielded whole."""
+    if not getattr(settings, "CHATBOT_SEMANTIC_CACHE_ENABLED", True) or not chunk_ids:
+        return (yield from stream_gpt_response(messages, cache))
+
+    embedding = retrieval_services.query_embedder.embed_one(question)
+    version = cache_services.namespace()
+    context = semantic_context_key(messages)
+    cached = semantic_cache.lookup(embedding, chunk_ids, version, question, context)
+    if cached:
+        print("⚡ Serving answer from semantic cache")
+        yield cached
+        return cached
+
+    response = yield from stream_gpt_response(messages, cache)
+    if response and not is_error_reply(response):
+        semantic_cache.store(embedding, chunk_ids, response, version, question, context)
+    return response
+
+
+class GptReply:
+    """
+    A reply the view pipeline hands to GPT: the messages to send, whether
+    the semantic cache may answer them, whether the turn goes into chat
+    history, and an optional `finalize(response)` that can replace the
+    answer (e.g. with a product list when GPT comes back empty-handed).
+    """
+
+    def __init__(self, user_message, messages, chunk_ids=None, semantic=False, record=True, finalize=None):
+        self.user_message = user_message
+        self.messages = messages
+        self.chunk_ids = chunk_ids or []
+        self.semantic = semantic
+        self.record = record
+        self.finalize = finalize
+
+    def text(self):
+        """The complete answer, for the JSON endpoint."""
+        if self.semantic:
+            return answer_with_semantic_cache(self.user_message, self.messages, self.chunk_ids, cache)
+        return get_gpt_response(self.messages, cache)
+
+    async def atext(self):
+        """The complete answer, for the async endpoint."""
+        if self.semantic:
+            return await aanswer_with_semantic_cache(self.user_message, self.messages, self.chunk_ids, cache)
+        return await aget_gpt_response(self.messages, cache)
+
+    def stream(self):
+        """Answer deltas as they arrive, for the streaming endpoint."""
+        if self.semantic:
+            return stream_answer_with_semantic_cache(self.user_message, self.messages, self.chunk_ids, cache)
+        return stream_gpt_response(self.messages, cache)
+
+    def finish(self, response):
+        """The answer to show and record once `response` is complete."""
+        replacement = self.finalize(response) if self.finalize else None
+        return replacement or response
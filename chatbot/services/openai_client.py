@@ -0,0 +1,68 @@
+import asyncio
+import threading
+import weakref
+import httpx
+from django.conf import settings
+from openai import OpenAI, AsyncOpenAI
+
+
+def _timeout():
+    # Per stage: connecting fails fast; read covers a full non-streamed answer
+    # (or the gap between streamed chunks)
+    return httpx.Timeout(
+        connect=getattr(settings, "CHATBOT_OPENAI_CONNECT_TIMEOUT", 3.0),
+        read=getattr(settings, "CHATBOT_OPENAI_READ_TIMEOUT", 30.0),
+        write=getattr(settings, "CHATBOT_OPENAI_WRITE_TIMEOUT", 10.0),
+        pool=getattr(settings, "CHATBOT_OPENAI_POOL_TIMEOUT", 2.0),
+    )
+
+
+def _limits():
+    # One keep-alive pool per process, shared by every request thread
+    return httpx.Limits(
+        max_connections=getattr(settings, "CHATBOT_OPENAI_MAX_CONNECTIONS", 50),
+        max_keepalive_connections=getattr(settings, "CHATBOT_OPENAI_MAX_KEEPALIVE", 20),
+        keepalive_expiry=getattr(settings, "CHATBOT_OPENAI_KEEPALIVE_EXPIRY", 30.0),
+    )
+
+
+def _client_options():
+    return dict(
+        api_key=settings.API_KEY,
+        base_url=getattr(settings, "CHATBOT_OPENAI_BASE_URL", None) or None,
+        timeout=_timeout(),
+        # Retries belong to llm_services (tenacity + circuit breaker), not the SDK
+        max_retries=getattr(settings, "CHATBOT_OPENAI_MAX_RETRIES", 0),
+    )
+
+
+def create_openai_client():
+    """OpenAI client with a pooled keep-alive transport and per-stage timeouts from settings."""
+    options = _client_options()
+    return OpenAI(http_client=httpx.Client(limits=_limits(), timeout=options["timeout"]), **options)
+
+
+def create_async_openai_client():
+    """AsyncOpenAI counterpart of create_openai_client, for the ASGI view."""
+    options = _client_options()
+    return AsyncOpenAI(http_client=httpx.AsyncClient(limits=_limits(), timeout=options["timeout"]), **options)
+
+
+_async_clients = weakref.WeakKeyDictionary()  # event loop -> AsyncOpenAI
+_async_clients_lock = threading.Lock()
+
+
+def get_async_openai_client():
+    """
+    The AsyncOpenAI client for the running event loop. Under WSGI each async
+    view call gets its own loop, and pooled connections must not outlive it,
+    so clients are never shared across loops.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        with _async_clients_lock:
+            client = _async_clients.get(loop)
+            if client is None:
+                client = _async_clients[loop] = create_async_openai_client()
+    return client
@@ -1,110 +1,197 @@
-from chatbot.services.retrieval_services import collection
+from chatbot.services.resources import get_collection
+from chatbot.services.retrieval_services import cache, current_corpus_version
 from chatbot.utils.product_utils import match_product_name
 import re
 # from chatbot.utils.text_utils import clean_response
-def list_products_grouped_by_category():
-    """Group all products by category using ChromaDB metadata."""
-    try:
-        data = collection.get(include=["metadatas"])
+import threading
+import time
+from django.conf import settings
+
+
+ISLAMIC_SUBCATEGORY_KEYWORDS = {
+    "Savings": ["savings", "deposit", "digital", "scheme","sthaee","sathi","super saver","family support","e-saver", "snd","super high performance"],
+    "Loan": ["loan", "finance", "bai muajjal", "melk","nirman","amar bari"],
+    "Current": ["current account", "corporate payroll package", "abiram","saalam personal retail"],
+}
+
+
+def clean_title(title):
+    return title.replace("– Midland Bank PLC.", "").strip()
+
+
+def group_islamic_titles(titles):
+    """Split Islamic product titles into inferred subcategories like Savings and Loan."""
+    grouped = {subcat: [] for subcat in ISLAMIC_SUBCATEGORY_KEYWORDS}
+    for title in titles:
+        lower_title = title.lower()
+        # First matching subcategory wins, in Savings → Loan → Current order
+        for subcat, keywords in ISLAMIC_SUBCATEGORY_KEYWORDS.items():
+            if any(keyword in lower_title for keyword in keywords):
+                grouped[subcat].append(title)
+                break
+    return grouped
+
+
+class ProductCatalog:
+    """
+    Product titles from the Chroma metadata, indexed by category, Islamic
+    subcategory, metadata sub_category and lowercase name, plus the SME and
+    NRB lists extracted from document bodies by build_product_lists().
+
+    Built from one metadata scan and tagged with the corpus version it was
+    built from; get_product_catalog() rebuilds it only when that changes.
+    """
+
+    def __init__(self, metadatas=(), version=None, product_lists=None):
         grouped = {}
-        for meta in data["metadatas"]:
+        sub_categories = {}
+        for meta in metadatas:
+            meta = meta or {}
             title = meta.get("title", "").strip()
             category = meta.get("category", "general").strip().title()
             if title and "MDB" in title:
-                cleaned_title = clean_title(title)
-                grouped.setdefault(category, set()).add(cleaned_title)
-        return {k: sorted(v) for k, v in grouped.items()}
+                grouped.setdefault(category, set()).add(clean_title(title))
+                sub_category = (meta.get("sub_category") or "").strip().lower()
+                if sub_category:
+                    sub_categories.setdefault(sub_category, set()).add(clean_title(title))
+        self.by_category = {k: sorted(v) for k, v in grouped.items()}
+        self.by_sub_category = {k: sorted(v) for k, v in sub_categories.items()}
+        self.names = sorted({name for names in grouped.values() for name in names})
+        self.by_lower_name = {name.lower(): name for name in self.names}
+        self.islamic = group_islamic_titles(self.by_category.get("Islamic", []))
+        product_lists = product_lists or {}
+        self.sme = product_lists.get("sme", [])
+        self.nrb = product_lists.get("nrb", [])
+        self.version = version
+
+
+_catalog = ProductCatalog()
+_catalog_lock = threading.Lock()
+_catalog_failed_at = None
+
+
+def get_product_catalog():
+    """
+    Current ProductCatalog; rescans the collection only after the corpus changes.
+    After a failed build the last catalog is served for
+    CHATBOT_CATALOG_RETRY_SECONDS before the scan is tried again.
+    """
+    global _catalog, _catalog_failed_at
+    retry_after = getattr(settings, "CHATBOT_CATALOG_RETRY_SECONDS", 60)
+    if _catalog_failed_at is not None and time.monotonic() - _catalog_failed_at < retry_after:
+        return _catalog
+    try:
+        version = current_corpus_version()
+        if _catalog.version != version:
+            with _catalog_lock:
+                if _catalog.version != version:
+                    data = get_collection().get(include=["metadatas"])
+                    _catalog = ProductCatalog(data["metadatas"], version, build_product_lists(version))
+                    print(f"🗂️ Product catalog built: {len(_catalog.names)} products (corpus {version})")
+        _catalog_failed_at = None
     except Exception as e:
-        print(f"Error grouping products: {e}")
-        return {}
+        print(f"Error building product catalog, will retry in {retry_after}s: {e}")
+        _catalog_failed_at = time.monotonic()
+    return _catalog
+
+
+def list_products_grouped_by_category():
+    """Group all products by category using ChromaDB metadata."""
+    return {k: list(v) for k, v in get_product_catalog().by_category.items()}
 
-def clean_title(title):
-    return title.replace("– Midland Bank PLC.", "").strip()
 
 def list_products_by_category(category):
-    grouped = list_products_grouped_by_category()
-    return sorted(list(grouped.get(category.title(), [])))
+    return list(get_product_catalog().by_category.get(category.title(), []))
 
 
 def get_all_product_names():
     """Returns a flat list of all product names across categories."""
-    grouped = list_products_grouped_by_category()
-    all_products = set()
-    for products in grouped.values():
-        all_products.update(products)
-    return sorted(all_products)
+    return list(get_product_catalog().names)
+
+
+def find_product(name):
+    """Exact, case-insensitive product name lookup; None if unknown."""
+    return get_product_catalog().by_lower_name.get(name.lower().strip())
 
 
 def list_islamic_products_grouped():
     """Return Islamic products grouped into inferred subcategories like Savings and Loan."""
-    all_islamic = list_products_by_category("Islamic")
+    return {k: list(v) for k, v in get_product_catalog().islamic.items()}
 
-    grouped = {
-        "Savings": [],
-        "Loan": [],
-        "Current": []
-    }
 
-    for title in all_islamic:
-        lower_title = title.lower()
-        if any(keyword in lower_title for keyword in ["savings", "deposit", "digital", "scheme","sthaee","sathi","super saver","family support","e-saver", "snd","super high performance"]):
-            grouped["Savings"].append(title)
-        elif any(keyword in lower_title for keyword in ["loan", "finance", "bai muajjal", "melk","nirman","amar bari"]):
-            grouped["Loan"].append(title)
-        elif any(keyword in lower_title for keyword in ["current account", "corporate payroll package", "abiram","saalam personal retail"]):
-            grouped["Current"].append(title)
+VALID_SME_PRODUCTS = {
+    "MDB Abiram", "MDB Diptimoyi", "MDB Green", "MDB IT",
+    "MDB Krishi", "MDB NGO", "MDB Nirbhorota", "MDB Nirman",
+    "MDB Ogroj", "MDB Orjon", "MDB Praromvik", "MDB Property", "MDB Start-up"
+}
 
-    return grouped
+VALID_NRB_PRODUCTS = {
+    "MDB Probashi Savings","MDB NFCD Account","MDB FC Account","Wage Earner's Development Bond (WEDB)",
+    "US Dollar Investment Bond","US Dollar Premium Bond","MDB Foreign Remittence Service","MDB Student File Service"
+}
 
 
-def get_sme_product_names():
-    VALID_SME_PRODUCTS = {
-        "MDB Abiram", "MDB Diptimoyi", "MDB Green", "MDB IT",
-        "MDB Krishi", "MDB NGO", "MDB Nirbhorota", "MDB Nirman",
-        "MDB Ogroj", "MDB Orjon", "MDB Praromvik", "MDB Property", "MDB Start-up"
-    }
-
+def extract_product_lists(collection):
+    """
+    Product lists that can only be found in document bodies (SME, NRB).
+    This is the one place that reads the bodies; run it once per corpus version.
+    """
     loan_docs = collection.get(
         where={"category": "Loan"},
         include=["documents", "metadatas"]
     )
-
     raw_matches = set()
-
     # Extract and normalize matches
     for doc, meta in zip(loan_docs["documents"], loan_docs["metadatas"]):
-        if meta.get("sub_category") == "SME":
-            matches = re.findall(r"MDB [A-Z][a-zA-Z()\-]+", doc)
-            for match in matches:
-                normalized = match.title().replace("Mdb", "MDB")
-                raw_matches.add(normalized)
-
-    # ✅ Filter only valid SME products
-    filtered_products = {p for p in raw_matches if p in VALID_SME_PRODUCTS}
-
-    return sorted(filtered_products)
-
-
-def get_nrb_product_names():
-    
-    VALID_NRB_PRODUCTS = {
-    "MDB Probashi Savings","MDB NFCD Account","MDB FC Account","Wage Earner's Development Bond (WEDB)",
-    "US Dollar Investment Bond","US Dollar Premium Bond","MDB Foreign Remittence Service","MDB Student File Service"
-    }
+        if (meta or {}).get("sub_category") == "SME":
+            for match in re.findall(r"MDB [A-Z][a-zA-Z()\-]+", doc):
+                raw_matches.add(match.title().replace("Mdb", "MDB"))
 
     savings_docs = collection.get(
         where={"category": "savings"},
         include=["documents"]
     )
-
-    product_names = set()
-
+    nrb_products = set()
     for doc in savings_docs["documents"]:
+        doc_lower = doc.lower()
         for product in VALID_NRB_PRODUCTS:
-            if product.lower() in doc.lower():
-                product_names.add(product)
+            if product.lower() in doc_lower:
+                nrb_products.add(product)
+
+    return {
+        # ✅ Filter only valid SME products
+        "sme": sorted(p for p in raw_matches if p in VALID_SME_PRODUCTS),
+        "nrb": sorted(nrb_products),
+    }
+
+
+def build_product_lists(version=None, force=False):
+    """
+    Extract the body-derived product lists for the current corpus and store
+    them in the disk cache under `product_lists:<version>`.
+    Returns the lists; skips the extraction when they are already stored.
+    """
+    version = version or current_corpus_version()
+    key = f"product_lists:{version}"
+    lists = None if force else cache.get(key)
+    if lists is None:
+        lists = extract_product_lists(get_collection())
+        cache.set(key, lists)
+        print(f"🗂️ Product lists extracted for corpus {version}: "
+              f"{len(lists['sme'])} SME, {len(lists['nrb'])} NRB")
+    return lists
+
+
+def get_sme_product_names():
+    return list(get_product_catalog().sme)
+
+
+def get_nrb_product_names():
+    return list(get_product_catalog().nrb)
+
 
-    return sorted(product_names)
+def list_products_by_sub_category(sub_category):
+    return list(get_product_catalog().by_sub_category.get(sub_category.lower(), []))
 
 
 def is_product_list_request(message: str) -> bool:
@@ -0,0 +1,142 @@
+import re
+import threading
+from django.conf import settings
+
+# Estimator used when tiktoken is unavailable, roughly calibrated to
+# o200k_base: English runs ~4 characters per token, Bangla script ~1.6;
+# each message adds ~4 tokens of chat framing.
+ASCII_CHARS_PER_TOKEN = 4.0
+OTHER_CHARS_PER_TOKEN = 1.6
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Sentence ends (including the Bangla danda) and line breaks are the places
+# trimmed text may stop
+SENTENCE_END_RE = re.compile(r"[.!?।](?=\s|$)|\n")
+WORD_END_RE = re.compile(r"\S(?=\s|$)")
+
+_tokenizer = {"encoding": None, "loaded": False}
+_tokenizer_lock = threading.Lock()
+
+
+def _encoding():
+    # tiktoken is optional, and its BPE file must already be on disk
+    # (TIKTOKEN_CACHE_DIR) to load offline; otherwise the estimator is used.
+    if not _tokenizer["loaded"]:
+        with _tokenizer_lock:
+            if not _tokenizer["loaded"]:
+                name = getattr(settings, "CHATBOT_TOKENIZER", "o200k_base")
+                try:
+                    import tiktoken
+                    _tokenizer["encoding"] = tiktoken.get_encoding(name) if name else None
+                except Exception as e:
+                    print(f"Tokenizer {name!r} unavailable, estimating token counts: {e}")
+                _tokenizer["loaded"] = True
+    return _tokenizer["encoding"]
+
+
+def tokenizer_name():
+    encoding = _encoding()
+    return encoding.name if encoding is not None else "estimate"
+
+
+def count_tokens(text):
+    if not text:
+        return 0
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    other_chars = len(text) - ascii_chars
+    return int(ascii_chars / ASCII_CHARS_PER_TOKEN + other_chars / OTHER_CHARS_PER_TOKEN) + 1
+
+
+def message_tokens(message):
+    return count_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+
+
+def _longest_prefix(text, cut_points, max_tokens):
+    # cut_points ascend, and so do the prefix counts: binary search
+    best, lo, hi = None, 0, len(cut_points) - 1
+    while lo <= hi:
+        mid = (lo + hi) // 2
+        if count_tokens(text[:cut_points[mid]]) <= max_tokens:
+            best, lo = cut_points[mid], mid + 1
+        else:
+            hi = mid - 1
+    return best
+
+
+def trim_to_tokens(text, max_tokens):
+    """
+    Longest prefix of `text` within `max_tokens`, ending at a sentence or
+    line end; at a word end (marked " ...") if not even one sentence fits.
+    """
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+    cut = _longest_prefix(text, [m.end() for m in SENTENCE_END_RE.finditer(text)], max_tokens)
+    if cut:
+        return text[:cut].rstrip()
+    cut = _longest_prefix(text, [m.end() for m in WORD_END_RE.finditer(text)], max_tokens - 1)
+    return f"{text[:cut]} ..." if cut else ""
+
+
+def fit_history(history, max_tokens):
+    """The most recent turns that fit in `max_tokens`; the oldest kept one may be trimmed."""
+    kept, used = [], 0
+    for message in reversed(history):
+        cost = message_tokens(message)
+        if used + cost > max_tokens:
+            room = max_tokens - used - MESSAGE_OVERHEAD_TOKENS
+            content = trim_to_tokens(message["content"], room) if room > 0 else ""
+            if content:
+                kept.append(dict(message, content=content))
+                used += count_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+            break
+        kept.append(message)
+        used += cost
+    kept.reverse()
+    return kept, used
+
+
+def assemble_prompt(system, history, prompt, context, budget=None, history_share=None):
+    """
+    Fit a prompt into `budget` tokens (CHATBOT_PROMPT_TOKEN_BUDGET), by priority:
+
+    1. the system message and the user turn, always whole;
+    2. up to `history_share` of what is left is held for recent history;
+    3. retrieved context takes the rest, trimmed at a sentence boundary;
+    4. history then gets whatever context did not use, newest turns first.
+
+    Returns (history, context, report) where report has the token counts.
+    """
+    budget = budget or getattr(settings, "CHATBOT_PROMPT_TOKEN_BUDGET", 2500)
+    if history_share is None:
+        history_share = getattr(settings, "CHATBOT_PROMPT_HISTORY_SHARE", 0.3)
+
+    system_tokens = count_tokens(system) + MESSAGE_OVERHEAD_TOKENS
+    prompt_tokens = count_tokens(prompt) + MESSAGE_OVERHEAD_TOKENS
+    remaining = max(budget - system_tokens - prompt_tokens, 0)
+
+    history_wanted = sum(message_tokens(message) for message in history)
+    history_reserve = min(history_wanted, int(remaining * history_share))
+
+    context_wanted = count_tokens(context) + MESSAGE_OVERHEAD_TOKENS if context else 0
+    context = trim_to_tokens(context, remaining - history_reserve - MESSAGE_OVERHEAD_TOKENS) if context else ""
+    context_tokens = count_tokens(context) + MESSAGE_OVERHEAD_TOKENS if context else 0
+
+    history, history_tokens = fit_history(history, remaining - context_tokens)
+
+    report = {
+        "budget": budget,
+        "system": system_tokens,
+        "prompt": prompt_tokens,
+        "history": history_tokens,
+        "history_wanted": history_wanted,
+        "context": context_tokens,
+        "context_wanted": context_wanted,
+        "total": system_tokens + prompt_tokens + history_tokens + context_tokens,
+        "tokenizer": tokenizer_name(),
+    }
+    return history, context, report
@@ -0,0 +1,87 @@
+import threading
+import time
+from django.conf import settings
+from chatbot.services.resources import registry
+
+_background_load = None
+_load_failed_at = None
+# Seconds per (query, chunk) pair, from the last batch scored
+_pair_seconds = None
+
+
+def reranker_enabled():
+    return bool(getattr(settings, "CHATBOT_RERANKER_MODEL_PATH", None))
+
+
+def _load_in_background():
+    global _background_load, _load_failed_at
+    try:
+        registry.get("reranker")
+    except Exception as e:
+        print(f"Reranker load failed, will retry: {e}")
+        _load_failed_at = time.monotonic()
+        _background_load = None
+
+
+def _get_model():
+    """Return the cross-encoder, or None while it is (re)loading in the background."""
+    global _background_load
+    if registry.is_loaded("reranker"):
+        return registry.get("reranker")
+    if _background_load is None:
+        retry_after = getattr(settings, "CHATBOT_RERANK_RETRY_SECONDS", 60)
+        if _load_failed_at is not None and time.monotonic() - _load_failed_at < retry_after:
+            return None
+        # Never make a request wait for the model load; it would blow the budget anyway
+        print("⏳ Loading cross-encoder reranker in the background")
+        _background_load = threading.Thread(target=_load_in_background, daemon=True)
+        _background_load.start()
+    return None
+
+
+def rerank(query, results, deadline):
+    """
+    Reorder `results` (dicts with 'content') by cross-encoder relevance to `query`.
+
+    Pairs are scored in small batches, each shrunk to what the last measured
+    per-pair cost fits before the deadline (time.monotonic()); scores that
+    arrive late are discarded. Returns None when the reranker is disabled,
+    still loading or out of time, in which case callers keep the heuristic order.
+    """
+    global _pair_seconds
+    if not reranker_enabled() or len(results) < 2:
+        return None
+    model = _get_model()
+    if model is None:
+        return None
+
+    max_batch = getattr(settings, "CHATBOT_RERANK_BATCH_SIZE", 8)
+    pairs = [(query, result['content']) for result in results]
+    scores = []
+    start_time = time.monotonic()
+    try:
+        while len(scores) < len(pairs):
+            remaining = deadline - time.monotonic()
+            batch_size = max_batch
+            if _pair_seconds:
+                batch_size = min(max_batch, int(remaining / _pair_seconds))
+            if remaining <= 0 or batch_size < 1:
+                print(f"⌛ Rerank budget exhausted after {len(scores)}/{len(pairs)} pairs — keeping heuristic order")
+                return None
+            batch = pairs[len(scores):len(scores) + batch_size]
+            batch_start = time.monotonic()
+            scores.extend(model.predict(batch, batch_size=len(batch), show_progress_bar=False))
+            _pair_seconds = (time.monotonic() - batch_start) / len(batch)
+            if time.monotonic() > deadline:
+                print("⌛ Rerank batch finished past the budget — keeping heuristic order")
+                return None
+    except Exception as e:
+        print(f"Reranker Error: {str(e)}")
+        return None
+    print(f"⏱️ Reranked {len(pairs)} chunks in {time.monotonic() - start_time:.3f} seconds")
+
+    # sorted() is stable, so equal scores keep the heuristic order
+    order = sorted(range(len(results)), key=lambda i: scores[i], reverse=True)
+    for i in order:
+        results[i]['rerank_score'] = float(scores[i])
+    return [results[i] for i in order]
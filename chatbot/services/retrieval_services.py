@@ -1,58 +1,62 @@
 from chatbot.data.config import category_keywords, bonus_keywords, personnel_info
 import re
-import chromadb
+import hashlib
 from tenacity import retry, wait_random_exponential, stop_after_attempt
 from rest_framework.decorators import api_view
 import os
-from tenacity import retry, wait_random_exponential, stop_after_attempt
-import chromadb
-from chromadb.config import Settings
-os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'  # Suppress INFO and WARNING logs
-import diskcache as dc
-cache = dc.Cache("cache_dir", size_limit=1e9)  # Initialize disk cache for caching results
-from chromadb.utils import embedding_functions
+# Disk cache and corpus version live in corpus_state so cache_services can use them too
+from chatbot.services.corpus_state import (
+    cache, corpus_version_key, corpus_fingerprint, ids_fingerprint, current_corpus_version, current_ids_version
+)
 # Import the loaded product aliases data
 from chatbot.apps import product_aliases_data as product_aliases
+from chatbot.services.scoring_services import ChunkFeatureCache, score_candidates
 from chatbot.data import config 
 from chatbot.utils.text_utils import normalize_query_with_aliases
+from chatbot.utils.keyword_index import keyword_index
+from chatbot.services.embedding_services import CachedEmbeddingFunction
+from chatbot.services.lexical_index import lexical_index, reciprocal_rank_fusion, tokenize
+from chatbot.services.resources import (
+    get_collection, get_embedding_function, embedding_model_path
+)
+from chatbot.services.rerank_services import rerank, reranker_enabled
+from chatbot.services import cache_services
+from chatbot.services.chunk_store import ChunkStore
+from chatbot.services.single_flight import SingleFlight
 import time
-import os
-os.environ["CUDA_VISIBLE_DEVICES"] = "-1"
+from django.conf import settings
 
-LOCAL_MODEL_PATH = r"C:\Users\mdbl.plc\Downloads\bge-base-en-v1.5"
+# The embedding model and Chroma collection are created lazily by
+# chatbot.services.resources (or eagerly by its warmup hook), so importing
+# this module no longer loads the model or opens the Chroma directory.
 
-# embedding_func = embedding_functions.SentenceTransformerEmbeddingFunction(
-#     model_name= LOCAL_MODEL_PATH,
-#      local_files_only=True
-# )
 
-# embedding_func = embedding_functions.SentenceTransformerEmbeddingFunction(
-#     model_name="BAAI/bge-base-en-v1.5"
-# )
+def _embed_texts(texts):
+    return get_embedding_function()(texts)
 
 
-try:
-    embedding_func = embedding_functions.SentenceTransformerEmbeddingFunction(
-        model_name= LOCAL_MODEL_PATH,
-       local_files_only=True
-    )
-    print("Embedding model loaded successfully.")
-except Exception as e:
-    print("❌ Failed to load embedding model:", e)
-        
+# Memoized query embeddings; collection.query receives precomputed vectors
+query_embedder = CachedEmbeddingFunction(
+    _embed_texts,
+    store=cache,
+    model_name=os.path.basename(embedding_model_path()),
+    max_entries=getattr(settings, "CHATBOT_EMBEDDING_CACHE_SIZE", 2048)
+)
 
-# Initialize ChromaDB client
-chroma_client = chromadb.PersistentClient(
-    path=r"C:\Users\mdbl.plc\Scraper\chroma_rich",
-    # path=r"/var/www/midlandbank_chatbot/chroma_rich",
-    settings=Settings(
-        anonymized_telemetry=False  # Disable telemetry for faster performance
-    )
+# Chunk texts behind cached retrieval results, stored once per distinct text
+chunk_store = ChunkStore(
+    cache,
+    max_entries=getattr(settings, "CHATBOT_CHUNK_STORE_SIZE", 2048),
+    expire=getattr(settings, "CHATBOT_RETRIEVAL_CACHE_TTL", 30 * 24 * 60 * 60)
 )
 
-collection = chroma_client.get_collection(
-    name="midland_detailed",
-    embedding_function=embedding_func
+# Query-independent chunk features (keyword hits, token-position index), by chunk id
+chunk_feature_cache = ChunkFeatureCache(getattr(settings, "CHATBOT_CHUNK_FEATURE_CACHE_SIZE", 4096))
+# Identical cache-missing queries arriving together run one Chroma query
+retrieval_flight = SingleFlight(
+    cache,
+    wait_timeout=getattr(settings, "CHATBOT_SINGLE_FLIGHT_TIMEOUT", 45),
+    lock_expire=getattr(settings, "CHATBOT_SINGLE_FLIGHT_LOCK_TTL", 120)
 )
 
 
@@ -82,26 +86,18 @@ def identify_query_category(query):
     4. Single-word location fallback
     """
     query_lower = query.lower().strip()
+    # One scan of the query answers every keyword and location alias check below
+    hits = keyword_index.analyze(query_lower)
 
     # ---------------------------------------------
     # 1️⃣ STEP 1 — HIGH-PRIORITY CATEGORIES FIRST
     #    (management, board, sponsor)
     # ---------------------------------------------
     high_priority = ["management", "board", "sponsor"]
-    category_scores = {}
-
-    for category in high_priority:
-        info = category_keywords.get(category)
-        if not info:
-            continue
-
-        score = 0
-        for keyword in info["keywords"]:
-            if re.search(rf'\b{re.escape(keyword.lower())}\b', query_lower):
-                score += 1
-
-        if score > 0:
-            category_scores[category] = score * info["weight"]
+    category_scores = {
+        category: hits.category_scores[category]
+        for category in high_priority if category in hits.category_scores
+    }
 
     # If high-priority category matched → return immediately
     if category_scores:
@@ -111,24 +107,10 @@ def identify_query_category(query):
     # ---------------------------------------------
     # 2️⃣ STEP 2 — NORMAL KEYWORD CATEGORIES
     # ---------------------------------------------
-    normal_categories = [
-        cat for cat in category_keywords.keys() 
-        if cat not in high_priority
-    ]
-
-    category_scores = {}
-    for category in normal_categories:
-        info = category_keywords.get(category)
-        if not info:
-            continue
-
-        score = 0
-        for keyword in info["keywords"]:
-            if re.search(rf'\b{re.escape(keyword.lower())}\b', query_lower):
-                score += 1
-
-        if score > 0:
-            category_scores[category] = score * info["weight"]
+    category_scores = {
+        category: score for category, score in hits.category_scores.items()
+        if category not in high_priority
+    }
 
     # If something matched here, return it
     if category_scores:
@@ -139,10 +121,8 @@ def identify_query_category(query):
     # 3️⃣ STEP 3 — LOCATION ALIASES (SAFE)
     #     Only apply if no other category matched
     # ---------------------------------------------
-    for city, aliases in config.location_aliases.items():
-        for alias in aliases:
-            if alias.lower() in query_lower:
-                return "location", 100
+    if hits.location_hits:
+        return "location", 100
 
     # ---------------------------------------------
     # 4️⃣ STEP 4 — SINGLE-WORD FALLBACK:
@@ -159,392 +139,351 @@ def identify_query_category(query):
     return None, 0
 
 
-@retry(wait=wait_random_exponential(min=1, max=10), stop=stop_after_attempt(2))
-def get_relevant_chroma_data(query: str, n_results: int = 5):
-    cache_key = f"chroma:{query.lower().strip()}"
-    cached = cache.get(cache_key)
-    if cached:
-        print("⚡ Serving ChromaDB result from cache")
-        return cached
+def get_lexical_index():
+    """BM25 index over the collection, rebuilt when the corpus changes."""
+    return lexical_index.sync(
+        get_collection(), corpus_fingerprint,
+        min_interval=getattr(settings, "CHATBOT_CORPUS_CHECK_SECONDS", 60)
+    )
 
-    def calculate_relevance_score(doc, query, found_categories, query_category, product_aliases, personnel_info, meta=None, distance=0.0): # Added product_aliases, meta
-        """
-        Calculate a weighted relevance score for a document with category focus,
-        generality penalty, and service-specific boosts.
-        """
-        # query = normalize_query_with_aliases(query, product_aliases)
-        query_lower = query.lower()
-        doc_lower = doc.lower()
-        query_terms = set(query_lower.split())
-        doc_terms = set(doc_lower.split())
-        term_overlap = len(query_terms.intersection(doc_terms)) 
-
-        is_general_query = bool(re.match(r"what is\s+(.*?)\??$", query_lower))
-        
-        # --- 1. Base Score from Semantic Distance (Inverse of distance) ---
-        # Max score if distance is 0, gradually decreasing. Max 10.0 for very close matches.
-        # Adjust the divisor (e.g., 1.5, 2.0) to control sensitivity.
-        # Higher divisor means semantic score drops off faster.
-        semantic_score = max(0, (1 - (distance / 1.5)) * 10.0)
-
-        # --- 2. Keyword/Term Overlap and Exact Matches ---
-        # 'term_overlap' is already calculated.
-        exact_matches = sum(1 for phrase in query_terms if phrase in doc_lower)
-        term_overlap_score = term_overlap * 0.75 # Increased weight
-        exact_matches_score = exact_matches * 1.0 # Increased weight
-
-        # --- 3. Proximity Score ---
-        proximity_score_raw = 0.0 # Initialize raw proximity score
-        if len(query_terms) > 1:
-            words = doc_lower.split()
-            positions = {}
-            for i, word in enumerate(words):
-                for term in query_terms:
-                    if term in word:
-                        if term not in positions:
-                            positions[term] = []
-                        positions[term].append(i)
-
-            if len(positions) > 1:
-                min_distance = float('inf')
-                for term1_key in positions:
-                    for term2_key in positions:
-                        if term1_key != term2_key:
-                            for pos1 in positions[term1_key]:
-                                for pos2 in positions[term2_key]:
-                                    dist_val = abs(pos1 - pos2) # Renamed 'distance' to 'dist_val' to avoid confusion with function parameter
-                                    min_distance = min(min_distance, dist_val)
-                if min_distance != float('inf'):
-                    proximity_score_raw = 1.0 / (1.0 + min_distance)
-                else:
-                    proximity_score_raw = 0.25 # If terms are found but too far apart or not forming a cluster
-
-        proximity_score = proximity_score_raw * 5.0 # Scale to give more impact
-
-        # Initialize overall score with base components
-        final_score = semantic_score + term_overlap_score + exact_matches_score + proximity_score
-        
-        # Strong boost for exact query phrase match in document content
-        if query_lower in doc_lower:
-            final_score += 100.0 # Significant boost for exact phrase match
-            # print(f"DEBUG: Exact query match boost applied for '{query_lower}' in doc.")
-    
-        # Stronger boost if exact query phrase is in the document title/metadata
-        if meta and 'title' in meta and meta['title'] is not None:
-            if query_lower in meta['title'].lower():
-                final_score += 150.0 # Even higher boost for title match
-                # print(f"DEBUG: Exact query match in title boost applied for '{query_lower}'")
-
-        # --- 4. Category Alignment Boost ---
-        # A significant boost if the document's categories align with the query's identified category
-        if query_category:
-            if query_category in found_categories:
-                final_score += 15.0 # Strong boost for direct query category match
-                if category_keywords[query_category].get('exclusive', False):
-                    final_score += 5.0 # Even stronger for exclusive category match
-            elif found_categories: # Smaller boost if any document category matches (but not the primary query category)
-                final_score += sum(category_keywords[cat]['weight'] for cat in found_categories) * 2.0 # Use weights
-                
-        
-        # --- 5. Targeted Entity Boosts (Personnel and Products) ---
-        # These are high-impact additive boosts for specific matches,
-        # conditional on the *type* of query.
-
-        # Personnel Match Boost (if query is likely about management/personnel)
-        if query_category == 'management' or any(role in query_lower for role in ["cto", "md", "ceo", "chairman", "dmd", "cro","senior executive"]):
-            for person_canonical, associated_roles in personnel_info.items():
-                query_mentions_person = person_canonical in query_lower
-                query_mentions_role = any(role_alias.lower() in query_lower for role_alias in associated_roles)
-
-                doc_contains_person = person_canonical in doc_lower
-                doc_contains_role = any(role_alias.lower() in doc_lower for role_alias in associated_roles)
-
-                if (query_mentions_person or query_mentions_role) and doc_contains_person and doc_contains_role:
-                    # Give a very strong but non-absolute boost. This ensures it floats near the top.
-                    final_score += 70.0
-                    break # Apply only once
-
-     
-       # Product Match Boost
-        # Ensure general_product_queries is accessible here
-        is_general_product_query = any(phrase in query_lower for phrase in config.general_product_queries) 
-
-        # Prioritize if the query is specifically about a product or if a strong product match is found
-        # (even in a general query context)
-        # Strong boost for exact product match to avoid "plus" variants overshadowing base queries
-        normalized_query = query_lower.strip()
-        product_match_boost_applied = False # This can remain or be reset here
-        for alias_key, canonical_name in product_aliases.items():
-            if normalized_query == alias_key.lower() or normalized_query == canonical_name.lower():
-                if re.search(r'\b' + re.escape(alias_key.lower()) + r'\b', doc_lower) or \
-                    re.search(r'\b' + re.escape(canonical_name.lower()) + r'\b', doc_lower):
-                    final_score += 200.0  # High boost for exact match
-                    product_match_boost_applied = True
-                    break
-            
-            if not product_match_boost_applied:
-                for alias_key, canonical_name in product_aliases.items():
-                    if (alias_key.lower() in query_lower or canonical_name.lower() in query_lower) and \
-                        (re.search(r'\b' + re.escape(canonical_name.lower()) + r'\b', doc_lower) or \
-                          re.search(r'\b' + re.escape(alias_key.lower()) + r'\b', doc_lower)):
-                            final_score += 100.0  # Moderate boost for partial match
-                            product_match_boost_applied = True
-                            break
-                
-                # Adjust boost based on query type or strength of match
-                if query_category in ["savings", "loans", "cards", "islamic"] or is_general_product_query:
-                    final_score += 60.0 # High boost for product-specific queries or if category matches
-                else:
-                    final_score += 40.0 # Moderate boost for product match in other contexts
-                
-                product_match_boost_applied = True
-                break # Apply only once
-        
-        # Penalty for extended variant mismatch: e.g., "double benefit plus" shown for "double benefit"
-        if "plus" in doc_lower and "plus" not in query_lower:
-            final_score *= 0.9  # Slight demotion
-
-        # Consider a specific boost if the title in meta contains the queried product
-        # Ensure meta is not None before accessing it
-        if meta and 'title' in meta:
-            title_lower = meta['title'].lower()
-            for alias_key, canonical_name in product_aliases.items():
-                if (alias_key.lower() in query_lower or canonical_name.lower() in query_lower) and \
-                   (alias_key.lower() in title_lower or canonical_name.lower() in title_lower):
-                    final_score += 50.0 # Additional boost for title match
-                    break # Apply only once
-        
-       
-        compound_keywords = ["vision", "mission", "chairman", "logo", "md", "values", "green banking", "profile"]
-        compound_hit_count = sum(kw in doc_lower for kw in compound_keywords)
 
-        if compound_hit_count >= 4 and meta.get("section", "").lower() == "general":
-            final_score *= 0.6  # Significant demotion
-        
-        
-        if query_category == "management":
-            if "vice chairman" in query_lower:
-                if "vice chairman" not in doc_lower and "vice-chairman" not in doc_lower:
-                    return max(0, final_score)  # skip chairman-only chunks
-
-         
-        if query_category == "management" and "vice chairman" in query_lower:
-             if "message from chairman" in doc_lower or "chairman" in doc_lower:
-                 final_score *= 0.7
-
-            
-        if meta.get("section", "").lower() == "board of directors":
-            final_score += 200.0  # Strong boost for clean board chunk
-
-        # --- 6. Sponsor Boost --
-        sponsor_section = meta.get("section", "").lower()    
-        applied_sponsor_boost = False
-        if query_category == "sponsor":
-            if any(keyword in sponsor_section for keyword in ["sponsor", "founder"]):
-                final_score += 250.0
-                applied_sponsor_boost = True
-            elif "sponsor" in doc_lower:
-                final_score += 180.0
-                applied_sponsor_boost = True
+FEE_TERMS_RE = re.compile(
+    r"(?<!\w)(?:" + "|".join(re.escape(term) for term in config.lexical_fee_terms) + r")(?!\w)"
+)
+
+
+def is_lexical_only_query(query, lexical_hits, index):
+    """
+    Exact product names and fee/charge questions are answered well by BM25
+    alone when the top lexical chunk contains every query token, so the
+    embedding model can be skipped for them.
+    """
+    if not lexical_hits:
+        return False
+    query_lower = query.lower().strip()
+    exact_product = query_lower in product_aliases or \
+        any(query_lower == canonical.lower().strip() for canonical in product_aliases.values())
+    fee_query = bool(FEE_TERMS_RE.search(query_lower))
+    if not (exact_product or fee_query):
+        return False
+    top_doc, _ = index.get(lexical_hits[0][0])
+    top_tokens = set(tokenize(top_doc or ""))
+    query_tokens = [token for token in tokenize(query_lower) if token not in config.query_stopwords]
+    return bool(query_tokens) and all(token in top_tokens for token in query_tokens)
+
+
+def _fuse_rankings(lexical_hits, vector_results, index, n_candidates):
+    """
+    Fuse BM25 and vector rankings with reciprocal-rank fusion.
+
+    Returns the same shape as collection.query so scoring is unchanged.
+    Chunks found only lexically get a pseudo distance from their BM25 score
+    relative to the best lexical hit, scaled between the worst vector
+    distance and 1.5 so they never look semantically closer than a real
+    vector hit.
+    """
+    documents, metadatas, distances = {}, {}, {}
+
+    vector_ids = []
+    if vector_results and vector_results['ids']:
+        vector_ids = vector_results['ids'][0]
+        for idx, chunk_id in enumerate(vector_ids):
+            documents[chunk_id] = vector_results['documents'][0][idx]
+            metadatas[chunk_id] = vector_results['metadatas'][0][idx]
+            distances[chunk_id] = vector_results['distances'][0][idx]
+
+    floor = min(max(distances.values()), 1.5) if distances else 0.0
+    top_lexical = lexical_hits[0][1] if lexical_hits else 0.0
+    for chunk_id, score in lexical_hits:
+        if chunk_id in documents:
+            continue
+        documents[chunk_id], metadatas[chunk_id] = index.get(chunk_id)
+        distances[chunk_id] = floor + (1.5 - floor) * (1 - score / top_lexical) if top_lexical else 1.5
+
+    fused = reciprocal_rank_fusion(
+        [vector_ids, [chunk_id for chunk_id, _ in lexical_hits]],
+        k=getattr(settings, "CHATBOT_RRF_K", 60)
+    )[:n_candidates]
+    ids = [chunk_id for chunk_id, _ in fused]
+    return {
+        'ids': [ids],
+        'documents': [[documents[chunk_id] for chunk_id in ids]],
+        'metadatas': [[metadatas[chunk_id] for chunk_id in ids]],
+        'distances': [[distances[chunk_id] for chunk_id in ids]],
+    }
+
+
+def vector_query_many(queries, n_candidates):
+    """
+    Embed all `queries` in one forward pass (cache misses only) and run a
+    single collection.query. Returns one collection.query-shaped dict per query.
+    """
+    if not queries:
+        return []
+    results = get_collection().query(
+        query_embeddings=query_embedder.embed(queries),
+        n_results=n_candidates,
+        include=["documents", "metadatas", "distances"]
+    )
+    return [
+        {key: [results[key][i]] for key in ('ids', 'documents', 'metadatas', 'distances')}
+        for i in range(len(queries))
+    ]
+
+
+def hybrid_query_many(queries, n_candidates):
+    """Hybrid candidates for several queries, sharing one batched vector query."""
+    index = get_lexical_index()
+    lexical = [index.search(query, n_candidates) for query in queries]
+
+    needs_vector = []
+    for i, query in enumerate(queries):
+        if is_lexical_only_query(query, lexical[i], index):
+            print(f"⚡ Lexical match is decisive for '{query}' — skipping the embedding model")
+        else:
+            needs_vector.append(i)
+    vector_results = dict(zip(
+        needs_vector, vector_query_many([queries[i] for i in needs_vector], n_candidates)
+    ))
+    return [
+        _fuse_rankings(lexical[i], vector_results.get(i), index, n_candidates)
+        for i in range(len(queries))
+    ]
+
+
+def hybrid_query(query, n_candidates):
+    return hybrid_query_many([query], n_candidates)[0]
+
+
+def _rank_candidates(query, results, n_results, collection_name, deadline=None):
+    """
+    Score, filter and join one query's candidates into (context, chunk_ids).
+    `deadline` (time.monotonic()) bounds the optional cross-encoder rerank.
+    """
+    all_results = []
+    query_category, query_category_score = identify_query_category(query)
+    print(f"\nIdentified query category: {query_category} (score: {query_category_score:.2f})")
+
+    if results and results['documents']:
+        docs = results['documents'][0]
+        # Chunk features don't depend on the query, so batches and requests share them
+        chunks = [
+            chunk_feature_cache.get(results['ids'][0][idx], doc, results['metadatas'][0][idx])
+            for idx, doc in enumerate(docs)
+        ]
+        # Score the whole candidate set in one pass
+        relevance_scores = score_candidates(query, query_category, chunks, results['distances'][0])
+        for idx, doc in enumerate(docs):
+            dist = results['distances'][0][idx]
+            found_categories = chunks[idx].categories
+            relevance_score = float(relevance_scores[idx])
+            # Only include results that match the query category if it's exclusive
+            if query_category and category_keywords[query_category].get('exclusive', False):
+                if query_category not in found_categories and not any(
+                    kw in chunks[idx].doc_lower for kw in ['savings', 'account', 'deposit', 'scheme']):
+                    continue
+            result_entry = {
+                'id': results['ids'][0][idx],
+                'content': doc,
+                'score': dist,
+                'collection': collection_name,
+                'categories': found_categories,
+                'relevance_score': relevance_score
+            }
+            all_results.append(result_entry)
+
+    # Sort results using the comprehensive scoring system
+    all_results.sort(key=lambda x: x['relevance_score'], reverse=True)
+
+    # Optional cross-encoder pass over the heuristic top-N
+    rerank_fell_back = False
+    if deadline is not None:
+        top_n = getattr(settings, "CHATBOT_RERANK_TOP_N", 10)
+        reranked = rerank(query, all_results[:top_n], deadline)
+        if reranked:
+            all_results = reranked + all_results[top_n:]
+            # The reranked head is precise enough to send GPT fewer chunks
+            n_results = min(n_results, getattr(settings, "CHATBOT_RERANK_KEEP", 3))
+        else:
+            # Loading or out of budget: the heuristic order stands in for now
+            rerank_fell_back = reranker_enabled() and len(all_results[:top_n]) >= 2
+    # for i, res in enumerate(all_results[:5]): # Print top 5 to see what's being prioritized
+    #     print(f"Rank {i+1}: Score={res['relevance_score']:.4f}, Categories={res['categories']}, Content Preview: {res['content'][:150]}...")
+    # print("-------------------------------------------------------------------")
+
+    # Filter results to keep only the most relevant ones
+    if query_category and category_keywords[query_category].get('exclusive', False):
+        best_results = [r for r in all_results[:n_results] if query_category in r['categories']]
+    else:
+        best_results = all_results[:n_results]
+        # print("\n--- DEBUG: Contents of best_results before raw_results creation ---")
+        # for i, res in enumerate(best_results):
+        #     print(f"Result {i+1} (Score: {res['relevance_score']:.4f}): Content Length={len(res['content'])}, Content Preview: {res['content'][:300]}...")
+        # print("-------------------------------------------------------------------")
+
+    if best_results:
+        original_results = best_results.copy()
+        query_lower = query.lower().strip()
+        canonical_title = product_aliases.get(query_lower, "").lower()
         
-        if query_category == "sponsor" and not applied_sponsor_boost:
-            if any(kw in doc_lower for kw in ["chairman", "md", "ceo", "executive message"]):
-                final_score *= 0.90
-
-
-        # --- Generality Penalty for Product-Specific Content ---
-        if is_general_query and query_category == 'digital': # Apply specifically for digital, or other general categories
-            specific_product_mentions = 0
-            canonical_product_names = set(product_aliases.values())
-
-            for p_name in canonical_product_names:
-                if re.search(rf'\b{re.escape(p_name.lower())}\b', doc_lower):
-                    specific_product_mentions += 1
-
-            if specific_product_mentions >= 3:
-                final_score *= 0.5 # Substantial penalty
-            elif specific_product_mentions >= 1:
-                final_score *= 0.8 # Moderate penalty
-
-        # --- Service-Specific Query Boost ---
-        if any(k in query_lower for k in ["services", "what services", "list services", "service provided", "what are the services", "features of agent banking"]):
-            explicit_service_phrases_in_doc = 0
-
-            explicit_service_phrases_patterns = [
-                r"what is midland online",
-                r"services available",
-                r"key services",
-                r"list of services",
-                r"special features of mdb agent banking",
-                r"prohibited activities",
-                r"features of agent banking",
-                r"services provided by agent banking"
+        if canonical_title:
+            best_results = [
+                r for r in best_results
+                if canonical_title in r.get("content", "").lower() or 
+                   canonical_title in r.get("metadata", {}).get("title", "").lower()
             ]
+            if not best_results:
+                print("⚠️ No matching product chunks found — reverting to original top results.")
+                best_results = original_results
+
+        
+        # ✅ Return raw results instead of formatted preview
+        raw_results = [result['content'].strip() for result in best_results]
+        print("\n--- DEBUG: Content of raw_results list before final join ---")
+        for i, r_doc in enumerate(raw_results):
+            print(f"Raw Result {i+1} (Length: {len(r_doc)}): Content Preview: {r_doc[:300]}...")
+        print("-------------------------------------------------------------------")
+        #print(f"Raw results {raw_results}")
+        context = "\n\n".join(raw_results)
+        chunk_ids = [result['id'] for result in best_results]
+        # Cache the ranking only; texts go to the shared chunk store. A ranking
+        # the reranker should have refined is kept briefly, not for the full TTL
+        chunk_store.put_many([(r['id'], r['content']) for r in best_results], current_corpus_version())
+        if rerank_fell_back:
+            expire = getattr(settings, "CHATBOT_RETRIEVAL_FALLBACK_CACHE_TTL", 5 * 60)
+        else:
+            expire = getattr(settings, "CHATBOT_RETRIEVAL_CACHE_TTL", 30 * 24 * 60 * 60)
+        cache.set(
+            retrieval_cache_key(query),
+            {"ids": chunk_ids, "scores": [r['relevance_score'] for r in best_results]},
+            expire=expire
+        )
+        # print(f"\n--- DEBUG: FINAL context sent to GPT (first 1000 chars) ---")
+        # print(context[:6000])
+        # print("-----------------------------------------------------------")
+        return context, chunk_ids
+
+    return "No relevant information found in the bank's knowledge base.", []
+
+
+def ranking_config():
+    """The settings a cached ranking depends on: retrieval mode and reranker."""
+    parts = [getattr(settings, "CHATBOT_RETRIEVAL_MODE", "vector")]
+    if reranker_enabled():
+        parts += [
+            settings.CHATBOT_RERANKER_MODEL_PATH,
+            getattr(settings, "CHATBOT_RERANK_TOP_N", 10),
+            getattr(settings, "CHATBOT_RERANK_KEEP", 3),
+        ]
+    return hashlib.sha256("|".join(str(part) for part in parts).encode("utf-8")).hexdigest()[:8]
+
+
+def retrieval_cache_key(query):
+    # Keyed by the chunk-id set, not contents: edited chunks are re-read from the chunk store
+    return cache_services.versioned_key("chroma", f"{ranking_config()}:{query.lower().strip()}", scope="ids")
+
+
+def _fetch_chunk_texts(chunk_ids):
+    data = get_collection().get(ids=list(chunk_ids), include=["documents"])
+    return {chunk_id: doc for chunk_id, doc in zip(data["ids"], data["documents"]) if doc is not None}
+
 
-            for pattern in explicit_service_phrases_patterns:
-                if re.search(pattern, doc_lower):
-                    explicit_service_phrases_in_doc += 1
+def assemble_context(chunk_ids):
+    """Join the current texts of `chunk_ids` into a context; None if any chunk is gone."""
+    texts = chunk_store.get_many(chunk_ids, current_corpus_version(), fetch=_fetch_chunk_texts)
+    if any(text is None for text in texts):
+        return None
+    return "\n\n".join(text.strip() for text in texts)
 
-            if explicit_service_phrases_in_doc > 0:
-                final_score += (explicit_service_phrases_in_doc * 7.0)
 
-            if "prohibited" in query_lower and "prohibited activities" in doc_lower:
-                final_score += 10.0
+def cached_context(query):
+    """(context, chunk_ids) from the retrieval cache, or None."""
+    cached = cache.get(retrieval_cache_key(query))
+    context = assemble_context(cached["ids"]) if cached else None
+    if context is None:
+        return None
+    return context, cached["ids"]
 
-        # --- Optional: Title/Heading Boost (Requires 'meta' to be passed and contain 'title') ---
-        if meta and 'title' in meta:
-            title_lower = meta['title'].lower()
-            if any(k in query_lower for k in ["services", "features"]) and \
-               ("services available" in title_lower or "special features" in title_lower or "prohibited activities" in title_lower):
-                final_score += 1.0
 
-        for kw, bonus in bonus_keywords.items():
-            if kw in doc_lower:
-                final_score += bonus * 2.0
-                
+def get_relevant_chroma_data(query: str, n_results: int = 5):
+    """Context string for `query` (see retrieve_context)."""
+    context, _ = retrieve_context(query, n_results)
+    return context
+
+
+def get_relevant_chroma_data_many(queries, n_results: int = 5):
+    """Context strings for several queries, retrieved as one batch."""
+    return [context for context, _ in retrieve_context_many(queries, n_results)]
+
+
+def retrieve_context(query: str, n_results: int = 5):
+    """
+    Retrieve and rank chunks for `query`.
+    Returns (context, chunk_ids) where chunk_ids are the Chroma ids behind the context.
+    """
+    cached = cached_context(query)
+    if cached is not None:
+        print("⚡ Serving ChromaDB result from cache")
+        return cached
+    return retrieval_flight.do(
+        retrieval_cache_key(query),
+        lambda: cached_context(query),
+        lambda: retrieve_context_many([query], n_results)[0]
+    )
 
-        # Ensure score doesn't become negative (good practice)
-        return max(0, final_score)
+
+@retry(wait=wait_random_exponential(min=1, max=10), stop=stop_after_attempt(2))
+def retrieve_context_many(queries, n_results: int = 5):
+    """
+    Batched retrieve_context, one (context, chunk_ids) per query.
+
+    Cached queries are answered from the cache; the rest share one embedding
+    pass, one collection.query and the per-chunk features used for scoring.
+    """
+    outputs = [None] * len(queries)
+    pending = []
+    for i, query in enumerate(queries):
+        cached = cached_context(query)
+        if cached is not None:
+            print("⚡ Serving ChromaDB result from cache")
+            outputs[i] = cached
+        else:
+            pending.append(i)
+    if not pending:
+        return outputs
 
     try:
-        print(f"\n📦 Querying vector data from ChromaDB collection: {collection.name}")
+        collection = get_collection()
+        print(f"\n📦 Querying vector data from ChromaDB collection: {collection.name} ({len(pending)} queries)")
         start_time = time.time()
-        results = collection.query(
-            query_texts=[query],
-            n_results=n_results,
-            include=["documents", "metadatas", "distances"]
-
-        )
+        # Pull a wider candidate pool than we return; the batch scorer keeps
+        # re-ranking cheap even at 30-50 candidates.
+        n_candidates = max(n_results, getattr(settings, "CHATBOT_CANDIDATE_POOL", n_results))
+        pending_queries = [queries[i] for i in pending]
+        if getattr(settings, "CHATBOT_RETRIEVAL_MODE", "vector") == "hybrid":
+            candidates = hybrid_query_many(pending_queries, n_candidates)
+        else:
+            candidates = vector_query_many(pending_queries, n_candidates)
         end_time = time.time()
         print(f"⏱️ ChromaDB query completed in {end_time - start_time:.2f} seconds")
 
-        all_results = []
-        query_category, query_category_score = identify_query_category(query)
-        print(f"\nIdentified query category: {query_category} (score: {query_category_score:.2f})")
-
-        if results and results['documents']:
-            for idx, doc in enumerate(results['documents'][0]):
-                meta = results['metadatas'][0][idx]
-                dist = results['distances'][0][idx]
-                # Find matching categories
-                found_categories = []
-                for category, info in category_keywords.items():
-                    if any(kw.lower() in doc.lower() for kw in info['keywords']):
-                        found_categories.append(category)
-                # Calculate relevance score with category focus
-                relevance_score = calculate_relevance_score(doc, query, found_categories, query_category, product_aliases, personnel_info, meta, dist)
-                # Only include results that match the query category if it's exclusive
-                if query_category and category_keywords[query_category].get('exclusive', False):
-                    if query_category not in found_categories and not any(
-                        kw in doc.lower() for kw in ['savings', 'account', 'deposit', 'scheme']):
-                        continue
-                result_entry = {
-                    'content': doc,
-                    'score': dist,
-                    'collection': collection.name,
-                    'categories': found_categories,
-                    'relevance_score': relevance_score
-                }
-                all_results.append(result_entry)
-
-        # Sort results using the comprehensive scoring system
-        all_results.sort(key=lambda x: x['relevance_score'], reverse=True)
-        # for i, res in enumerate(all_results[:5]): # Print top 5 to see what's being prioritized
-        #     print(f"Rank {i+1}: Score={res['relevance_score']:.4f}, Categories={res['categories']}, Content Preview: {res['content'][:150]}...")
-        # print("-------------------------------------------------------------------")
-
-        # Filter results to keep only the most relevant ones
-        if query_category and category_keywords[query_category].get('exclusive', False):
-            best_results = [r for r in all_results[:n_results] if query_category in r['categories']]
-        else:
-            best_results = all_results[:n_results]
-            # print("\n--- DEBUG: Contents of best_results before raw_results creation ---")
-            # for i, res in enumerate(best_results):
-            #     print(f"Result {i+1} (Score: {res['relevance_score']:.4f}): Content Length={len(res['content'])}, Content Preview: {res['content'][:300]}...")
-            # print("-------------------------------------------------------------------")
-
-        if best_results:
-            formatted_results = []
-            for result in best_results:
-                # For exclusive categories, only show the relevant part of the content
-                if query_category == "location":
-                    query_location = query.lower().strip()
-                    content_lower = result['content'].lower()
-                    if query_location in content_lower:
-                        content = result['content']
-                    else:
-                        continue
-                    # if any(key in result['content'].lower() for key in ["gulshan", "n. b. tower", "40/7", "dhaka"]):
-                    #     content = result['content']
-                    # else:
-                    #     content = (
-                    #         "Midland Bank Limited Head Office:\n"
-                    #         "N. B. Tower (Level 6–9)\n"
-                    #         "40/7 Gulshan Avenue\n"
-                    #         "Gulshan-2, Dhaka-1212, Bangladesh."
-                    #          )
-                elif query_category and category_keywords[query_category]['exclusive']:
-                    sentences = result['content'].split('.')
-                    relevant_sentences = []
-                    query_terms = set(query.lower().split())
-                    for sentence in sentences:
-                        if any(term in sentence.lower() for term in query_terms):
-                            relevant_sentences.append(sentence)
-                    if relevant_sentences:
-                        content = '. '.join(relevant_sentences) + '.'
-                    else:
-                        content = result['content']
-                else:
-                    content = result['content']
-                formatted_results.append(f"• {content}\n  [Relevance: {result['relevance_score']:.4f}]")
-
-            # Debug log each document being passed to GPT
-            # print("\n📄 Documents sent to GPT:")
-            # for result in best_results:
-            #     print(f"\n[Collection: {result['collection']}]")
-            #     print(f"Categories: {result['categories']}")
-            #     print(f"Relevance Score: {result['relevance_score']:.4f}")
-            #     print("Content Preview:\n", result['content'][:500], "...\n")
-
-            original_results = best_results.copy()
-            query_lower = query.lower().strip()
-            canonical_title = product_aliases.get(query_lower, "").lower()
-            
-            if canonical_title:
-                best_results = [
-                    r for r in best_results
-                    if canonical_title in r.get("content", "").lower() or 
-                       canonical_title in r.get("metadata", {}).get("title", "").lower()
-                ]
-                if not best_results:
-                    print("⚠️ No matching product chunks found — reverting to original top results.")
-                    best_results = original_results
-
-            
-            # ✅ Return raw results instead of formatted preview
-            raw_results = [result['content'].strip() for result in best_results]
-            print("\n--- DEBUG: Content of raw_results list before final join ---")
-            for i, r_doc in enumerate(raw_results):
-                print(f"Raw Result {i+1} (Length: {len(r_doc)}): Content Preview: {r_doc[:300]}...")
-            print("-------------------------------------------------------------------")
-            #print(f"Raw results {raw_results}")
-            context = "\n\n".join(raw_results)
-            cache[cache_key] = context
-            # print(f"\n--- DEBUG: FINAL context sent to GPT (first 1000 chars) ---")
-            # print(context[:6000])
-            # print("-----------------------------------------------------------")
-            return context
-
-
-        return "No relevant information found in the bank's knowledge base."
+        # One rerank budget for the whole request, however many queries it batches
+        deadline = time.monotonic() + getattr(settings, "CHATBOT_RERANK_BUDGET_MS", 300) / 1000
+        for i, results in zip(pending, candidates):
+            outputs[i] = _rank_candidates(
+                queries[i], results, n_results, collection.name, deadline
+            )
+        return outputs
 
     except Exception as e:
         print(f"ChromaDB Error: {str(e)}")
-        return "Error accessing the knowledge base."
+        return [output or ("Error accessing the knowledge base.", []) for output in outputs]
+
 
 def inspect_chroma_collections():
     """Inspect ChromaDB collections and their metadata"""
     try:
+        collection = get_collection()
         collections = [collection]
         print("\n=== ChromaDB Collections Information ===")
         for coll in collections:
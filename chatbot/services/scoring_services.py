@@ -0,0 +1,583 @@
+import hashlib
+import json
+import re
+import threading
+from collections import OrderedDict
+import numpy as np
+from chatbot.data.config import category_keywords, bonus_keywords, personnel_info
+from chatbot.data import config
+from chatbot.apps import product_alias_matcher
+from chatbot.utils.keyword_index import keyword_index
+
+
+def calculate_relevance_score(doc, query, found_categories, query_category, product_aliases, personnel_info, meta=None, distance=0.0, query_alias_pairs=None): # Added product_aliases, meta
+    """
+    Calculate a weighted relevance score for a document with category focus,
+    generality penalty, and service-specific boosts.
+    """
+    # query = normalize_query_with_aliases(query, product_aliases)
+    query_lower = query.lower()
+    doc_lower = doc.lower()
+    query_terms = set(query_lower.split())
+    doc_terms = set(doc_lower.split())
+    term_overlap = len(query_terms.intersection(doc_terms)) 
+
+    is_general_query = bool(re.match(r"what is\s+(.*?)\??$", query_lower))
+    
+    # --- 1. Base Score from Semantic Distance (Inverse of distance) ---
+    # Max score if distance is 0, gradually decreasing. Max 10.0 for very close matches.
+    # Adjust the divisor (e.g., 1.5, 2.0) to control sensitivity.
+    # Higher divisor means semantic score drops off faster.
+    semantic_score = max(0, (1 - (distance / 1.5)) * 10.0)
+
+    # --- 2. Keyword/Term Overlap and Exact Matches ---
+    # 'term_overlap' is already calculated.
+    exact_matches = sum(1 for phrase in query_terms if phrase in doc_lower)
+    term_overlap_score = term_overlap * 0.75 # Increased weight
+    exact_matches_score = exact_matches * 1.0 # Increased weight
+
+    # --- 3. Proximity Score ---
+    proximity_score_raw = proximity_raw(query_terms, word_positions(doc_lower.split()))
+
+    proximity_score = proximity_score_raw * 5.0 # Scale to give more impact
+
+    # Initialize overall score with base components
+    final_score = semantic_score + term_overlap_score + exact_matches_score + proximity_score
+    
+    # Strong boost for exact query phrase match in document content
+    if query_lower in doc_lower:
+        final_score += 100.0 # Significant boost for exact phrase match
+        # print(f"DEBUG: Exact query match boost applied for '{query_lower}' in doc.")
+
+    # Stronger boost if exact query phrase is in the document title/metadata
+    if meta and 'title' in meta and meta['title'] is not None:
+        if query_lower in meta['title'].lower():
+            final_score += 150.0 # Even higher boost for title match
+            # print(f"DEBUG: Exact query match in title boost applied for '{query_lower}'")
+
+    # --- 4. Category Alignment Boost ---
+    # A significant boost if the document's categories align with the query's identified category
+    if query_category:
+        if query_category in found_categories:
+            final_score += 15.0 # Strong boost for direct query category match
+            if category_keywords[query_category].get('exclusive', False):
+                final_score += 5.0 # Even stronger for exclusive category match
+        elif found_categories: # Smaller boost if any document category matches (but not the primary query category)
+            final_score += sum(category_keywords[cat]['weight'] for cat in found_categories) * 2.0 # Use weights
+            
+    
+    # --- 5. Targeted Entity Boosts (Personnel and Products) ---
+    # These are high-impact additive boosts for specific matches,
+    # conditional on the *type* of query.
+
+    # Personnel Match Boost (if query is likely about management/personnel)
+    if query_category == 'management' or any(role in query_lower for role in ["cto", "md", "ceo", "chairman", "dmd", "cro","senior executive"]):
+        for person_canonical, associated_roles in personnel_info.items():
+            query_mentions_person = person_canonical in query_lower
+            query_mentions_role = any(role_alias.lower() in query_lower for role_alias in associated_roles)
+
+            doc_contains_person = person_canonical in doc_lower
+            doc_contains_role = any(role_alias.lower() in doc_lower for role_alias in associated_roles)
+
+            if (query_mentions_person or query_mentions_role) and doc_contains_person and doc_contains_role:
+                # Give a very strong but non-absolute boost. This ensures it floats near the top.
+                final_score += 70.0
+                break # Apply only once
+
+ 
+   # Product Match Boost
+    # Ensure general_product_queries is accessible here
+    is_general_product_query = any(phrase in query_lower for phrase in config.general_product_queries) 
+
+    # Every alias/canonical name in the doc is found in one automaton scan,
+    # so the checks below are set lookups instead of per-alias regexes.
+    if query_alias_pairs is None:
+        query_alias_pairs = product_alias_matcher.pairs_in_query(product_alias_matcher.scan(query_lower))
+    doc_alias_words = product_alias_matcher.scan(doc_lower).word
+
+    # Prioritize if the query is specifically about a product or if a strong product match is found
+    # (even in a general query context)
+    # Strong boost for exact product match to avoid "plus" variants overshadowing base queries
+    normalized_query = query_lower.strip()
+    if product_alias_matcher.pairs:
+        # Only the first (longest) alias is checked for an exact match
+        first_alias, first_canonical = product_alias_matcher.pairs[0]
+        if normalized_query in (first_alias, first_canonical) and \
+                (first_alias in doc_alias_words or first_canonical in doc_alias_words):
+            final_score += 200.0  # High boost for exact match
+        else:
+            if any(a in doc_alias_words or c in doc_alias_words for a, c in query_alias_pairs):
+                final_score += 100.0  # Moderate boost for partial match
+
+            # Adjust boost based on query type or strength of match
+            if query_category in ["savings", "loans", "cards", "islamic"] or is_general_product_query:
+                final_score += 60.0 # High boost for product-specific queries or if category matches
+            else:
+                final_score += 40.0 # Moderate boost for product match in other contexts
+    
+    # Penalty for extended variant mismatch: e.g., "double benefit plus" shown for "double benefit"
+    if "plus" in doc_lower and "plus" not in query_lower:
+        final_score *= 0.9  # Slight demotion
+
+    # Consider a specific boost if the title in meta contains the queried product
+    # Ensure meta is not None before accessing it
+    if meta and 'title' in meta:
+        title_lower = meta['title'].lower()
+        title_aliases = product_alias_matcher.scan(title_lower).substring
+        if any(a in title_aliases or c in title_aliases for a, c in query_alias_pairs):
+            final_score += 50.0 # Additional boost for title match
+    
+   
+    compound_keywords = ["vision", "mission", "chairman", "logo", "md", "values", "green banking", "profile"]
+    compound_hit_count = sum(kw in doc_lower for kw in compound_keywords)
+
+    if compound_hit_count >= 4 and meta.get("section", "").lower() == "general":
+        final_score *= 0.6  # Significant demotion
+    
+    
+    if query_category == "management":
+        if "vice chairman" in query_lower:
+            if "vice chairman" not in doc_lower and "vice-chairman" not in doc_lower:
+                return max(0, final_score)  # skip chairman-only chunks
+
+     
+    if query_category == "management" and "vice chairman" in query_lower:
+         if "message from chairman" in doc_lower or "chairman" in doc_lower:
+             final_score *= 0.7
+
+        
+    if meta.get("section", "").lower() == "board of directors":
+        final_score += 200.0  # Strong boost for clean board chunk
+
+    # --- 6. Sponsor Boost --
+    sponsor_section = meta.get("section", "").lower()    
+    applied_sponsor_boost = False
+    if query_category == "sponsor":
+        if any(keyword in sponsor_section for keyword in ["sponsor", "founder"]):
+            final_score += 250.0
+            applied_sponsor_boost = True
+        elif "sponsor" in doc_lower:
+            final_score += 180.0
+            applied_sponsor_boost = True
+    
+    if query_category == "sponsor" and not applied_sponsor_boost:
+        if any(kw in doc_lower for kw in ["chairman", "md", "ceo", "executive message"]):
+            final_score *= 0.90
+
+
+    # --- Generality Penalty for Product-Specific Content ---
+    if is_general_query and query_category == 'digital': # Apply specifically for digital, or other general categories
+        specific_product_mentions = sum(
+            1 for p_name in product_alias_matcher.canonical_names if p_name in doc_alias_words
+        )
+
+        if specific_product_mentions >= 3:
+            final_score *= 0.5 # Substantial penalty
+        elif specific_product_mentions >= 1:
+            final_score *= 0.8 # Moderate penalty
+
+    # --- Service-Specific Query Boost ---
+    if any(k in query_lower for k in ["services", "what services", "list services", "service provided", "what are the services", "features of agent banking"]):
+        explicit_service_phrases_in_doc = 0
+
+        explicit_service_phrases_patterns = [
+            r"what is midland online",
+            r"services available",
+            r"key services",
+            r"list of services",
+            r"special features of mdb agent banking",
+            r"prohibited activities",
+            r"features of agent banking",
+            r"services provided by agent banking"
+        ]
+
+        for pattern in explicit_service_phrases_patterns:
+            if re.search(pattern, doc_lower):
+                explicit_service_phrases_in_doc += 1
+
+        if explicit_service_phrases_in_doc > 0:
+            final_score += (explicit_service_phrases_in_doc * 7.0)
+
+        if "prohibited" in query_lower and "prohibited activities" in doc_lower:
+            final_score += 10.0
+
+    # --- Optional: Title/Heading Boost (Requires 'meta' to be passed and contain 'title') ---
+    if meta and 'title' in meta:
+        title_lower = meta['title'].lower()
+        if any(k in query_lower for k in ["services", "features"]) and \
+           ("services available" in title_lower or "special features" in title_lower or "prohibited activities" in title_lower):
+            final_score += 1.0
+
+    for kw, bonus in bonus_keywords.items():
+        if kw in doc_lower:
+            final_score += bonus * 2.0
+            
+
+    # Ensure score doesn't become negative (good practice)
+    return max(0, final_score)
+
+
+# === Batch scoring ===
+# The batch scorer reproduces calculate_relevance_score for a whole candidate
+# set: every document becomes one feature row, the additive boosts are combined
+# with FEATURE_WEIGHTS and the multiplicative penalties are applied as masks in
+# the same order as the per-document function.
+
+PERSONNEL_ROLE_TRIGGERS = ["cto", "md", "ceo", "chairman", "dmd", "cro", "senior executive"]
+SERVICE_QUERY_TRIGGERS = ["services", "what services", "list services", "service provided", "what are the services", "features of agent banking"]
+SERVICE_PHRASES = [
+    "what is midland online", "services available", "key services", "list of services",
+    "special features of mdb agent banking", "prohibited activities", "features of agent banking",
+    "services provided by agent banking"
+]
+COMPOUND_KEYWORDS = ["vision", "mission", "chairman", "logo", "md", "values", "green banking", "profile"]
+SPONSOR_EXECUTIVE_KEYWORDS = ["chairman", "md", "ceo", "executive message"]
+PRODUCT_QUERY_CATEGORIES = ["savings", "loans", "cards", "islamic"]
+
+FEATURES = [
+    # Stage 1: base components and boosts before the "plus" variant penalty
+    ("semantic", 1.0),
+    ("term_overlap", 0.75),
+    ("exact_matches", 1.0),
+    ("proximity", 5.0),
+    ("exact_phrase", 100.0),
+    ("title_phrase", 150.0),
+    ("query_category_hit", 15.0),
+    ("exclusive_category_hit", 5.0),
+    ("other_category_weight", 2.0),
+    ("personnel", 70.0),
+    ("product_exact", 200.0),
+    ("product_partial", 100.0),
+    ("product_specific_query", 60.0),
+    ("product_other_query", 40.0),
+    # Stage 2: title product boost, before the compound-chunk penalty
+    ("title_product", 50.0),
+    # Stage 3: section boosts, before the sponsor and digital penalties
+    ("board_section", 200.0),
+    ("sponsor_section", 250.0),
+    ("sponsor_doc", 180.0),
+    # Stage 4: service phrases and bonus keywords
+    ("service_phrases", 7.0),
+    ("prohibited", 10.0),
+    ("service_title", 1.0),
+    ("bonus_keywords", 2.0),
+]
+FEATURE_INDEX = {name: i for i, (name, _) in enumerate(FEATURES)}
+FEATURE_WEIGHTS = np.array([weight for _, weight in FEATURES], dtype=np.float64)
+STAGES = [
+    slice(FEATURE_INDEX["semantic"], FEATURE_INDEX["title_product"]),
+    slice(FEATURE_INDEX["title_product"], FEATURE_INDEX["board_section"]),
+    slice(FEATURE_INDEX["board_section"], FEATURE_INDEX["service_phrases"]),
+    slice(FEATURE_INDEX["service_phrases"], len(FEATURES)),
+]
+
+
+def word_positions(words):
+    """Token-position index: distinct word -> ascending positions in `words`."""
+    index = {}
+    for i, word in enumerate(words):
+        index.setdefault(word, []).append(i)
+    return index
+
+
+def proximity_raw(query_terms, positions_by_word):
+    """
+    Inverse of the smallest word gap between two different query terms.
+
+    A term occurs wherever a word containing it occurs, so terms are matched
+    against the distinct words only. In the merged, position-ordered list of
+    occurrences the closest pair of different terms is always adjacent,
+    which makes the minimum a single pass instead of an all-pairs comparison.
+    """
+    if len(query_terms) <= 1:
+        return 0.0
+    occurrences = []
+    found = set()
+    for word, positions in positions_by_word.items():
+        for term in query_terms:
+            if term in word:
+                found.add(term)
+                occurrences.extend((pos, term) for pos in positions)
+    if len(found) <= 1:
+        return 0.0
+    occurrences.sort()
+
+    min_distance = None
+    prev_pos, prev_term = occurrences[0]
+    for pos, term in occurrences[1:]:
+        if term != prev_term and (min_distance is None or pos - prev_pos < min_distance):
+            min_distance = pos - prev_pos
+            if min_distance == 0:
+                break
+        prev_pos, prev_term = pos, term
+    return 1.0 / (1.0 + min_distance)
+
+
+def proximity_raw_all_pairs(query_terms, words):
+    """
+    The all-pairs scan proximity_raw replaced, kept as its reference for the
+    parity test and the benchmark_proximity command.
+    """
+    if len(query_terms) <= 1:
+        return 0.0
+    positions = {}
+    for i, word in enumerate(words):
+        for term in query_terms:
+            if term in word:
+                positions.setdefault(term, []).append(i)
+    if len(positions) <= 1:
+        return 0.0
+    min_distance = float('inf')
+    for term1_key in positions:
+        for term2_key in positions:
+            if term1_key != term2_key:
+                for pos1 in positions[term1_key]:
+                    for pos2 in positions[term2_key]:
+                        min_distance = min(min_distance, abs(pos1 - pos2))
+    return 1.0 / (1.0 + min_distance)
+
+
+# Keyword tables the stored chunk features were computed from; the product
+# alias part is added at call time because aliases load in ChatbotConfig.ready
+_FEATURE_TABLES_DIGEST = hashlib.sha256(json.dumps(
+    [category_keywords, bonus_keywords, personnel_info, COMPOUND_KEYWORDS, SERVICE_PHRASES, SPONSOR_EXECUTIVE_KEYWORDS],
+    sort_keys=True, default=str
+).encode("utf-8")).hexdigest()[:12]
+
+
+def chunk_features_version():
+    return f"{_FEATURE_TABLES_DIGEST}-{product_alias_matcher.fingerprint}"
+
+
+def extract_chunk_features(doc_lower, title_lower=None):
+    """
+    The keyword, alias and personnel scans for one chunk, as a JSON-ready dict.
+    Run at index time (stored in metadata) or, for older chunks, at query time.
+    """
+    keyword_hits = keyword_index.analyze(doc_lower)
+    roles = {role.lower() for person_roles in personnel_info.values() for role in person_roles}
+    return {
+        "categories": keyword_hits.categories,
+        "alias_words": sorted(product_alias_matcher.scan(doc_lower).word),
+        "title_aliases": sorted(product_alias_matcher.scan(title_lower).substring) if title_lower else [],
+        "personnel": sorted(person for person in personnel_info if person in doc_lower),
+        "roles": sorted(role for role in roles if role in doc_lower),
+        "has_plus": "plus" in doc_lower,
+        "compound_hits": sum(kw in doc_lower for kw in COMPOUND_KEYWORDS),
+        "service_phrases": sum(1 for phrase in SERVICE_PHRASES if phrase in doc_lower),
+        "bonus_total": keyword_hits.bonus_total,
+        "sponsor_executive": any(kw in doc_lower for kw in SPONSOR_EXECUTIVE_KEYWORDS),
+        "token_count": len(doc_lower.split()),
+    }
+
+
+def chunk_feature_metadata(doc, meta=None):
+    """Metadata fields that let ChunkFeatures skip the text scans for this chunk."""
+    title = (meta or {}).get("title")
+    features = extract_chunk_features(doc.lower(), title.lower() if title is not None else None)
+    return {
+        "features": json.dumps(features, separators=(",", ":")),
+        "features_version": chunk_features_version(),
+        "token_count": features["token_count"],
+    }
+
+
+def stored_chunk_features(meta):
+    """Features precomputed at index time, or None if absent or built from other keyword tables."""
+    if not meta or meta.get("features_version") != chunk_features_version():
+        return None
+    try:
+        return json.loads(meta["features"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class ChunkFeatures:
+    """Query-independent facts about one candidate chunk."""
+
+    __slots__ = (
+        "doc_lower", "words", "terms", "categories", "alias_words", "title_lower",
+        "title_aliases", "section", "has_plus", "compound_hits", "service_phrases",
+        "bonus_total", "sponsor_executive", "positions", "personnel", "roles",
+    )
+
+    def __init__(self, doc, meta=None):
+        meta = meta or {}
+        self.doc_lower = doc.lower()
+        self.words = self.doc_lower.split()
+        self.positions = word_positions(self.words)
+        self.terms = set(self.words)
+        title = meta.get("title")
+        self.title_lower = title.lower() if title is not None else None
+        self.section = (meta.get("section") or "").lower()
+
+        features = stored_chunk_features(meta) or extract_chunk_features(self.doc_lower, self.title_lower)
+        self.categories = features["categories"]
+        self.alias_words = set(features["alias_words"])
+        self.title_aliases = set(features["title_aliases"])
+        self.personnel = set(features["personnel"])
+        self.roles = set(features["roles"])
+        self.has_plus = features["has_plus"]
+        self.compound_hits = features["compound_hits"]
+        self.service_phrases = features["service_phrases"]
+        self.bonus_total = features["bonus_total"]
+        self.sponsor_executive = features["sponsor_executive"]
+
+
+class ChunkFeatureCache:
+    """
+    Bounded LRU of ChunkFeatures by chunk id, shared across requests.
+    An entry is reused only while the chunk's text and metadata are unchanged.
+    """
+
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # chunk_id -> (doc, meta, ChunkFeatures)
+        self._lock = threading.Lock()
+
+    def get(self, chunk_id, doc, meta=None):
+        with self._lock:
+            entry = self._entries.get(chunk_id)
+            if entry is not None and entry[0] == doc and entry[1] == meta:
+                self._entries.move_to_end(chunk_id)
+                return entry[2]
+        features = ChunkFeatures(doc, meta)
+        with self._lock:
+            self._entries[chunk_id] = (doc, meta, features)
+            self._entries.move_to_end(chunk_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return features
+
+
+class QueryFeatures:
+    """Facts about the query shared by every candidate."""
+
+    def __init__(self, query, query_category):
+        self.query_lower = query.lower()
+        self.terms = set(self.query_lower.split())
+        self.category = query_category
+        self.category_exclusive = bool(query_category) and category_keywords[query_category].get('exclusive', False)
+        self.is_general_query = bool(re.match(r"what is\s+(.*?)\??$", self.query_lower))
+        self.is_general_product_query = any(phrase in self.query_lower for phrase in config.general_product_queries)
+        self.alias_pairs = product_alias_matcher.pairs_in_query(product_alias_matcher.scan(self.query_lower))
+        self.normalized = self.query_lower.strip()
+        self.has_plus = "plus" in self.query_lower
+        self.vice_chairman = query_category == "management" and "vice chairman" in self.query_lower
+
+        # People the query refers to, by name or by role
+        self.personnel = []
+        if query_category == 'management' or any(role in self.query_lower for role in PERSONNEL_ROLE_TRIGGERS):
+            for person, roles in personnel_info.items():
+                roles_lower = [role.lower() for role in roles]
+                if person in self.query_lower or any(role in self.query_lower for role in roles_lower):
+                    self.personnel.append((person, roles_lower))
+
+        self.service_query = any(k in self.query_lower for k in SERVICE_QUERY_TRIGGERS)
+        self.service_title_query = any(k in self.query_lower for k in ["services", "features"])
+        self.prohibited = "prohibited" in self.query_lower
+
+
+def feature_row(q, chunk, distance):
+    """Feature vector for one candidate, in FEATURES order."""
+    row = np.zeros(len(FEATURES), dtype=np.float64)
+    f = FEATURE_INDEX
+
+    row[f["semantic"]] = max(0, (1 - (distance / 1.5)) * 10.0)
+    row[f["term_overlap"]] = len(q.terms & chunk.terms)
+    row[f["exact_matches"]] = sum(1 for term in q.terms if term in chunk.doc_lower)
+    row[f["proximity"]] = proximity_raw(q.terms, chunk.positions)
+    row[f["exact_phrase"]] = q.query_lower in chunk.doc_lower
+    row[f["title_phrase"]] = chunk.title_lower is not None and q.query_lower in chunk.title_lower
+
+    if q.category:
+        if q.category in chunk.categories:
+            row[f["query_category_hit"]] = 1
+            row[f["exclusive_category_hit"]] = q.category_exclusive
+        elif chunk.categories:
+            row[f["other_category_weight"]] = sum(category_keywords[cat]['weight'] for cat in chunk.categories)
+
+    row[f["personnel"]] = any(
+        person in chunk.personnel and any(role in chunk.roles for role in roles)
+        for person, roles in q.personnel
+    )
+
+    if product_alias_matcher.pairs:
+        first_alias, first_canonical = product_alias_matcher.pairs[0]
+        if q.normalized in (first_alias, first_canonical) and \
+                (first_alias in chunk.alias_words or first_canonical in chunk.alias_words):
+            row[f["product_exact"]] = 1
+        else:
+            row[f["product_partial"]] = any(a in chunk.alias_words or c in chunk.alias_words for a, c in q.alias_pairs)
+            if q.category in PRODUCT_QUERY_CATEGORIES or q.is_general_product_query:
+                row[f["product_specific_query"]] = 1
+            else:
+                row[f["product_other_query"]] = 1
+
+    row[f["title_product"]] = any(a in chunk.title_aliases or c in chunk.title_aliases for a, c in q.alias_pairs)
+    row[f["board_section"]] = chunk.section == "board of directors"
+    if q.category == "sponsor":
+        if any(keyword in chunk.section for keyword in ["sponsor", "founder"]):
+            row[f["sponsor_section"]] = 1
+        elif "sponsor" in chunk.doc_lower:
+            row[f["sponsor_doc"]] = 1
+
+    if q.service_query:
+        row[f["service_phrases"]] = chunk.service_phrases
+        row[f["prohibited"]] = q.prohibited and "prohibited activities" in chunk.doc_lower
+    if chunk.title_lower is not None and q.service_title_query:
+        row[f["service_title"]] = any(
+            phrase in chunk.title_lower for phrase in ["services available", "special features", "prohibited activities"]
+        )
+    row[f["bonus_keywords"]] = chunk.bonus_total
+    return row
+
+
+def score_candidates(query, query_category, chunks, distances):
+    """
+    Score every candidate at once.
+
+    `chunks` are ChunkFeatures in candidate order and `distances` the matching
+    Chroma distances. Returns a NumPy array of relevance scores identical to
+    calling calculate_relevance_score on each candidate.
+    """
+    if not chunks:
+        return np.zeros(0, dtype=np.float64)
+
+    q = QueryFeatures(query, query_category)
+    X = np.vstack([feature_row(q, chunk, dist) for chunk, dist in zip(chunks, distances)])
+
+    plus_mask = np.array([chunk.has_plus for chunk in chunks]) & (not q.has_plus)
+    compound_mask = np.array([chunk.compound_hits >= 4 and chunk.section == "general" for chunk in chunks])
+    vc_skip_mask = np.array([
+        q.vice_chairman and "vice chairman" not in chunk.doc_lower and "vice-chairman" not in chunk.doc_lower
+        for chunk in chunks
+    ])
+    vc_chairman_mask = np.array([q.vice_chairman and "chairman" in chunk.doc_lower for chunk in chunks])
+
+    sponsor_mask = np.zeros(len(chunks), dtype=bool)
+    if q.category == "sponsor":
+        applied = X[:, FEATURE_INDEX["sponsor_section"]] + X[:, FEATURE_INDEX["sponsor_doc"]] > 0
+        sponsor_mask = ~applied & np.array([chunk.sponsor_executive for chunk in chunks])
+
+    digital_multiplier = np.ones(len(chunks))
+    if q.is_general_query and q.category == 'digital':
+        mentions = np.array([
+            sum(1 for name in product_alias_matcher.canonical_names if name in chunk.alias_words)
+            for chunk in chunks
+        ])
+        digital_multiplier = np.where(mentions >= 3, 0.5, np.where(mentions >= 1, 0.8, 1.0))
+
+    scores = X[:, STAGES[0]] @ FEATURE_WEIGHTS[STAGES[0]]
+    scores = np.where(plus_mask, scores * 0.9, scores)
+    scores = scores + X[:, STAGES[1]] @ FEATURE_WEIGHTS[STAGES[1]]
+    scores = np.where(compound_mask, scores * 0.6, scores)
+    # Vice-chairman queries stop scoring chairman-only chunks at this point
+    skipped_scores = scores
+    scores = np.where(vc_chairman_mask, scores * 0.7, scores)
+    scores = scores + X[:, STAGES[2]] @ FEATURE_WEIGHTS[STAGES[2]]
+    scores = np.where(sponsor_mask, scores * 0.90, scores)
+    scores = scores * digital_multiplier
+    scores = scores + X[:, STAGES[3]] @ FEATURE_WEIGHTS[STAGES[3]]
+    scores = np.where(vc_skip_mask, skipped_scores, scores)
+    return np.maximum(scores, 0)
@@ -0,0 +1,138 @@
+import re
+import threading
+import time
+import numpy as np
+
+NUMBER_RE = re.compile(r"\d+(?:[.,]\d+)*")
+WORD_RE = re.compile(r"[a-z']+")
+NEGATIONS = {"not", "no", "without", "never", "cannot", "can't", "don't", "doesn't", "isn't", "won't", "non"}
+# Words that flip a question's meaning while barely moving its embedding,
+# mapped to the pole they stand for
+POLAR_TERMS = {
+    "minimum": "min", "min": "min", "lowest": "min", "least": "min",
+    "maximum": "max", "max": "max", "highest": "max", "most": "max", "limit": "max",
+    "open": "open", "opening": "open", "opened": "open",
+    "close": "close", "closing": "close", "closed": "close", "closure": "close",
+    "deposit": "deposit", "deposits": "deposit",
+    "withdraw": "withdraw", "withdrawal": "withdraw", "withdrawals": "withdraw",
+    "before": "before", "early": "before", "premature": "before",
+    "after": "after", "late": "after", "maturity": "after",
+    "increase": "increase", "raise": "increase",
+    "decrease": "decrease", "reduce": "decrease",
+    "buy": "buy", "buying": "buy", "sell": "sell", "selling": "sell",
+    "individual": "individual", "personal": "individual", "corporate": "corporate", "business": "corporate",
+}
+
+
+def question_signature(question):
+    """
+    The parts of a question an embedding is nearly blind to: its numbers,
+    whether it is negated, and which pole of each opposite pair it asks about.
+    Two questions may share an answer only if their signatures match.
+    """
+    text = (question or "").lower()
+    words = WORD_RE.findall(text)
+    return (
+        frozenset(number.replace(",", "") for number in NUMBER_RE.findall(text)),
+        any(word in NEGATIONS or word.endswith("n't") for word in words),
+        frozenset(POLAR_TERMS[word] for word in words if word in POLAR_TERMS),
+    )
+
+
+class SemanticAnswerCache:
+    """
+    Nearest-neighbour cache of GPT answers for paraphrased questions.
+
+    Entries are bucketed by the set of chunk ids the answer was grounded on
+    and a digest of the rest of the prompt (system message, history, context);
+    inside a bucket the question embedding is compared by cosine similarity.
+    A hit needs the same bucket, similarity >= threshold, the same
+    question_signature (numbers, negation, opposite terms), an unexpired
+    entry and the same corpus version it was written under.
+    """
+
+    def __init__(self, threshold=0.92, ttl=6 * 60 * 60, max_entries=5000):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.version = None
+        # (frozenset(chunk_ids), context) -> {"vectors": ndarray, "answers": [], "signatures": [], "created": []}
+        self._buckets = {}
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _unit(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _check_version(self, version):
+        if version != self.version:
+            if self.version is not None:
+                print(f"♻️ Corpus changed ({self.version} → {version}); clearing semantic answer cache")
+            self._buckets.clear()
+            self._size = 0
+            self.version = version
+
+    def invalidate(self):
+        with self._lock:
+            self._buckets.clear()
+            self._size = 0
+
+    def lookup(self, embedding, chunk_ids, version=None, question="", context=""):
+        """Return a cached answer for a similar question over the same chunks and prompt, or None."""
+        if not chunk_ids:
+            return None
+        signature = question_signature(question)
+        with self._lock:
+            self._check_version(version)
+            bucket = self._buckets.get((frozenset(chunk_ids), context))
+            if not bucket:
+                return None
+            similarities = bucket["vectors"] @ self._unit(embedding)
+            now = time.time()
+            for idx in np.argsort(-similarities):
+                if similarities[idx] < self.threshold:
+                    break
+                if bucket["signatures"][idx] == signature and now - bucket["created"][idx] <= self.ttl:
+                    return bucket["answers"][idx]
+        return None
+
+    def store(self, embedding, chunk_ids, answer, version=None, question="", context=""):
+        if not chunk_ids or not answer:
+            return
+        vector = self._unit(embedding)
+        signature = question_signature(question)
+        with self._lock:
+            self._check_version(version)
+            if self._size >= self.max_entries:
+                self._evict_expired()
+            if self._size >= self.max_entries:
+                return
+            key = (frozenset(chunk_ids), context)
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                self._buckets[key] = {
+                    "vectors": vector[None, :], "answers": [answer], "signatures": [signature], "created": [time.time()]
+                }
+            else:
+                bucket["vectors"] = np.vstack([bucket["vectors"], vector])
+                bucket["answers"].append(answer)
+                bucket["signatures"].append(signature)
+                bucket["created"].append(time.time())
+            self._size += 1
+
+    def _evict_expired(self):
+        now = time.time()
+        for key in list(self._buckets):
+            bucket = self._buckets[key]
+            keep = [i for i, created in enumerate(bucket["created"]) if now - created <= self.ttl]
+            self._size -= len(bucket["answers"]) - len(keep)
+            if not keep:
+                del self._buckets[key]
+            elif len(keep) < len(bucket["answers"]):
+                bucket["vectors"] = bucket["vectors"][keep]
+                bucket["answers"] = [bucket["answers"][i] for i in keep]
+                bucket["signatures"] = [bucket["signatures"][i] for i in keep]
+                bucket["created"] = [bucket["created"][i] for i in keep]
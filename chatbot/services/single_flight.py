@@ -0,0 +1,182 @@
+import asyncio
+import os
+import threading
+import time
+import uuid
+
+
+class _Call:
+    __slots__ = ("event", "value", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces identical in-flight work by cache key.
+
+    Within a process the first thread to ask for a key leads and the rest
+    wait on its Event and share its result. Across workers the leader also
+    takes `flight:<key>` in the shared disk cache (add() is atomic there);
+    a leader that finds the lock taken polls the cache for the other
+    worker's result instead of computing it again. Followers give up after
+    `wait_timeout` seconds and compute the value themselves.
+
+    ado() is the coroutine form for async views. It shares the same table
+    of in-flight calls, so sync and async callers coalesce with each other,
+    and it waits with asyncio.sleep so it never blocks the event loop.
+    """
+
+    def __init__(self, store, wait_timeout=30, lock_expire=60, poll_interval=0.05):
+        self.store = store
+        self.wait_timeout = wait_timeout
+        self.lock_expire = lock_expire
+        self.poll_interval = poll_interval
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, lookup, compute):
+        """
+        lookup() -> cached value or None; compute() produces the value and
+        caches it. Returns the value, computing it at most once at a time.
+        """
+        call, leader = self.join(key)
+        if not leader:
+            value = self.wait(call)
+            return value if value is not None else compute()
+
+        value = None
+        try:
+            value = lookup()
+            if value is None:
+                token = self.acquire(key)
+                if token:
+                    try:
+                        value = compute()
+                    finally:
+                        self.release(key, token)
+                else:
+                    value = self.wait_shared(key, lookup)
+                    if value is None:
+                        value = compute()
+            return value
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            self.finish(key, call, value)
+
+    async def ado(self, key, lookup, compute):
+        """do() for coroutines: compute() returns an awaitable."""
+        call, leader = self.join(key)
+        if not leader:
+            value = await self.await_call(call)
+            return value if value is not None else await compute()
+
+        value = None
+        try:
+            value = lookup()
+            if value is None:
+                token = self.acquire(key)
+                if token:
+                    try:
+                        value = await compute()
+                    finally:
+                        self.release(key, token)
+                else:
+                    value = await self.await_shared(key, lookup)
+                    if value is None:
+                        value = await compute()
+            return value
+        except asyncio.CancelledError:
+            # The leader's client went away; followers compute for themselves
+            raise
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            self.finish(key, call, value)
+
+    # --- in-process ---
+
+    def join(self, key):
+        """Register for `key`: (call, True) for the leader, (call, False) for followers."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                return call, False
+            call = self._calls[key] = _Call()
+            return call, True
+
+    def wait(self, call):
+        """Leader's value (re-raising its error), or None after a timeout or a leader that gave up."""
+        if not call.event.wait(self.wait_timeout):
+            print("⏳ Single-flight wait timed out; computing independently")
+            return None
+        if call.error is not None:
+            raise call.error
+        return call.value
+
+    async def await_call(self, call):
+        """wait() without blocking the event loop."""
+        deadline = time.monotonic() + self.wait_timeout
+        while not call.event.is_set():
+            if time.monotonic() >= deadline:
+                print("⏳ Single-flight wait timed out; computing independently")
+                return None
+            await asyncio.sleep(self.poll_interval)
+        if call.error is not None:
+            raise call.error
+        return call.value
+
+    def finish(self, key, call, value=None):
+        call.value = value
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+        call.event.set()
+
+    # --- across workers ---
+
+    def acquire(self, key):
+        """Take the shared lock for `key`; a release token, or None if another caller holds it."""
+        token = f"{os.getpid()}:{uuid.uuid4().hex}"
+        if self.store.add(f"flight:{key}", token, expire=self.lock_expire):
+            return token
+        return None
+
+    def release(self, key, token):
+        lock_key = f"flight:{key}"
+        if self.store.get(lock_key) == token:
+            self.store.delete(lock_key)
+
+    def wait_shared(self, key, lookup):
+        """Poll for another worker's result; None once its lock is gone or on timeout."""
+        print("⏳ Identical request in flight in another worker; waiting for its result")
+        lock_key = f"flight:{key}"
+        deadline = time.monotonic() + self.wait_timeout
+        while time.monotonic() < deadline:
+            time.sleep(self.poll_interval)
+            value = lookup()
+            if value is not None:
+                return value
+            if self.store.get(lock_key) is None:
+                return lookup()
+        return None
+
+    async def await_shared(self, key, lookup):
+        """wait_shared() without blocking the event loop."""
+        print("⏳ Identical request in flight in another worker; waiting for its result")
+        lock_key = f"flight:{key}"
+        deadline = time.monotonic() + self.wait_timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.poll_interval)
+            value = lookup()
+            if value is not None:
+                return value
+            if self.store.get(lock_key) is None:
+                return lookup()
+        return None
@@ -112,16 +112,36 @@ function addGreeting() {
   const loadingMessage = { text: "Thinking", isUser: false, isLoading: true };
   addMessage(loadingMessage.text, false, true);
 
-  // Send request to backend
-  fetch("/chatbot/", {
-    method: "POST",
-    credentials: "same-origin",
-    headers: {
-      "Content-Type": "application/json",
-      "X-CSRFToken": getCSRFToken(),
-    },
-    body: JSON.stringify({ message: text }),
-  })
+  // Stream the answer; fall back to the JSON endpoint only if the server has
+  // no streaming endpoint. Any other failure may come after the server took
+  // the turn, so sending the message again could answer it twice.
+  streamReply(text).catch((err) => {
+    if (err.streamUnsupported) {
+      console.warn("Streaming unavailable, falling back:", err);
+      fetchReply(text);
+      return;
+    }
+    chatHistory = chatHistory.filter(m => !m.isLoading);
+    renderChat();
+    console.error("Chatbot error:", err);
+    addMessage(err.detail || "Error communicating with chatbot.", false);
+  });
+}
+
+  function postMessage(url, text) {
+    return fetch(url, {
+      method: "POST",
+      credentials: "same-origin",
+      headers: {
+        "Content-Type": "application/json",
+        "X-CSRFToken": getCSRFToken(),
+      },
+      body: JSON.stringify({ message: text }),
+    });
+  }
+
+  function fetchReply(text) {
+  postMessage("/chatbot/", text)
     .then((res) => res.json())
     .then((data) => {
       // Remove all loading messages
@@ -137,6 +157,74 @@ function addGreeting() {
     });
 }
 
+  // Reads Server-Sent Events from /chatbot/stream/: {"delta"} chunks are
+  // appended as they arrive, {"replace"} swaps the whole answer, {"done"} ends.
+  // Rejects only if nothing was shown yet; err.streamUnsupported is set when
+  // the endpoint is missing (404/405) or the browser can't read the body.
+  async function streamReply(text) {
+    const res = await postMessage("/chatbot/stream/", text);
+    if (res.status === 404 || res.status === 405 || (res.ok && !res.body)) {
+      const err = new Error(`Streaming not supported (${res.status})`);
+      err.streamUnsupported = true;
+      throw err;
+    }
+    if (!res.ok) {
+      const err = new Error(`Stream request failed (${res.status})`);
+      // DRF errors (e.g. a 429 throttle) carry a readable "detail"
+      err.detail = await res.json().then(data => data.detail, () => null);
+      throw err;
+    }
+
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    let botMessage = null;
+
+    const show = (update) => {
+      if (!botMessage) {
+        // First token: swap the "Thinking" placeholder for the answer
+        chatHistory = chatHistory.filter(m => !m.isLoading);
+        botMessage = { text: "", isUser: false, isLoading: false };
+        chatHistory.push(botMessage);
+        update(botMessage);
+        renderChat();
+        scrollToNewMessage();
+      } else {
+        update(botMessage);
+        renderChat();
+      }
+    };
+
+    try {
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let boundary;
+        while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+          const rawEvent = buffer.slice(0, boundary);
+          buffer = buffer.slice(boundary + 2);
+          const data = rawEvent
+            .split("\n")
+            .filter(line => line.startsWith("data:"))
+            .map(line => line.slice(5).trim())
+            .join("");
+          if (!data) continue;
+
+          const event = JSON.parse(data);
+          if (event.delta) show(msg => { msg.text += event.delta; });
+          if (event.replace) show(msg => { msg.text = event.replace; });
+        }
+      }
+    } catch (err) {
+      if (!botMessage) throw err;
+      console.error("Chatbot stream interrupted:", err);
+    }
+
+    if (!botMessage) throw new Error("Stream ended without an answer");
+  }
+
 
   // --- RENDER ---
   function renderChat() {
@@ -0,0 +1,581 @@
+from django.test import SimpleTestCase
+from chatbot.services.indexing_services import _split_long, chunk_text
+
+
+class ChunkingTests(SimpleTestCase):
+    def test_split_long_keeps_paragraph_order(self):
+        paragraph = "First short sentence. " + " ".join(f"w{n}" for n in range(40)) + ". Last."
+        pieces = _split_long(paragraph, 60)
+        self.assertEqual(" ".join(pieces), paragraph)
+        self.assertTrue(all(len(piece) <= 60 for piece in pieces))
+
+    def test_split_long_with_several_oversized_sentences(self):
+        paragraph = " ".join(
+            f"Intro {n}. " + " ".join(f"s{n}w{i}" for i in range(25)) + "." for n in range(3)
+        ) + " Outro."
+        pieces = _split_long(paragraph, 50)
+        self.assertEqual(" ".join(pieces), paragraph)
+        self.assertTrue(all(len(piece) <= 50 for piece in pieces))
+
+    def test_chunk_text_keeps_order(self):
+        text = "Heading.\n\n" + "First short sentence. " + " ".join(f"w{n}" for n in range(300)) + ". Last."
+        chunks = chunk_text(text, chunk_size=200, overlap=0)
+        self.assertEqual(" ".join(" ".join(chunks).split()), " ".join(text.split()))
+
+
+SCORING_CHUNKS = [
+    ("MDB Double Benefit Scheme doubles your deposit in six years. Minimum deposit is Tk 10,000.",
+     {"title": "Double Benefit Scheme", "section": "savings"}),
+    ("MDB Double Benefit Plus Scheme doubles your deposit faster. The plus variant needs a larger deposit.",
+     {"title": "Double Benefit Plus Scheme", "section": "savings"}),
+    ("Message from the Chairman. Ahsan Khan Chowdhury, chairman of the bank, shares our vision and mission.",
+     {"title": "Chairman's Message", "section": "general"}),
+    ("Md. Shamsuzzaman is the vice chairman of the bank and a member of the board of directors.",
+     {"title": "Vice Chairman", "section": "board of directors"}),
+    ("Our sponsors and founders established Midland Bank in 2013 with a vision of inclusive banking.",
+     {"title": "Sponsors", "section": "sponsor shareholders"}),
+    ("The sponsor directors hold a majority stake; the CEO and MD report to the board.",
+     {"title": "Shareholding", "section": "general"}),
+    ("Vision, mission, values and logo: the chairman and md describe our green banking profile.",
+     {"title": "Corporate Profile", "section": "general"}),
+    ("Agent banking services available: cash deposit, withdrawal, fund transfer and utility bill payment. "
+     "Prohibited activities include foreign exchange.",
+     {"title": "Agent Banking Services Available", "section": "digital"}),
+    ("MDB Car Loan and MDB Saalam Auto Finance help you buy a car. MDB College Saver and current account "
+     "holders get a discount on processing fees.",
+     {"title": "Car Loan", "section": "loans"}),
+    ("Md. Ahsan-uz Zaman, managing director and CEO, leads the bank's management team.",
+     {"title": "Managing Director", "section": "management"}),
+    ("Internet banking and the mobile app let you pay bills, transfer funds and open a current account.",
+     {"title": "Digital Banking", "section": "digital"}),
+]
+
+SCORING_QUERIES = [
+    ("double benefit", "savings"),
+    ("double benefit plus", "savings"),
+    ("double benefit scheme", None),
+    ("who is the vice chairman", "management"),
+    ("vice chairman of the bank", "management"),
+    ("who is the chairman", "management"),
+    ("who is the ceo", "management"),
+    ("who are the sponsors", "sponsor"),
+    ("sponsor of midland bank", "sponsor"),
+    ("what is internet banking?", "digital"),
+    ("what services are available in agent banking", "digital"),
+    ("prohibited activities in agent banking services", None),
+    ("car loan processing fees", "loans"),
+    ("current account", None),
+    ("vision and mission", None),
+]
+
+
+class ScoringParityTests(SimpleTestCase):
+    def test_score_candidates_matches_calculate_relevance_score(self):
+        from chatbot.apps import product_aliases_data
+        from chatbot.data.config import personnel_info
+        from chatbot.services.scoring_services import ChunkFeatures, calculate_relevance_score, score_candidates
+
+        chunks = [ChunkFeatures(doc, meta) for doc, meta in SCORING_CHUNKS]
+        distances = [0.15 * i for i in range(len(chunks))]
+        for query, category in SCORING_QUERIES:
+            with self.subTest(query=query, category=category):
+                batch = score_candidates(query, category, chunks, distances)
+                scalar = [
+                    calculate_relevance_score(
+                        doc, query, chunk.categories, category, product_aliases_data,
+                        personnel_info, meta=meta, distance=distance
+                    )
+                    for (doc, meta), chunk, distance in zip(SCORING_CHUNKS, chunks, distances)
+                ]
+                # The batch sums features in a different order: equal up to rounding
+                self.assertEqual(len(batch), len(scalar))
+                for batch_score, scalar_score in zip(batch, scalar):
+                    self.assertAlmostEqual(batch_score, scalar_score, places=9)
+
+    def test_proximity_matches_all_pairs_scan(self):
+        import random
+        from chatbot.services.scoring_services import proximity_raw, proximity_raw_all_pairs, word_positions
+
+        rng = random.Random(0)
+        vocabulary = ["loan", "loans", "fee", "fees", "car", "account", "current", "rate", "profit", "tk", "a", "an"]
+        for _ in range(2000):
+            words = [rng.choice(vocabulary) for _ in range(rng.randint(0, 60))]
+            terms = set(rng.sample(vocabulary, rng.randint(0, 4)))
+            self.assertEqual(proximity_raw(terms, word_positions(words)), proximity_raw_all_pairs(terms, words))
+        for doc, _ in SCORING_CHUNKS:
+            words = doc.lower().split()
+            for query, _ in SCORING_QUERIES:
+                terms = set(query.split())
+                self.assertEqual(proximity_raw(terms, word_positions(words)), proximity_raw_all_pairs(terms, words))
+
+
+BRANCH_DOCUMENT = """Our branches
+
+Branch Name: Gulshan Branch
+Address: House 5, Road 45, Gulshan-2, Dhaka 1212
+Banking Hours: 10:00 AM - 4:00 PM
+Phone: 02-9881234
+
+**Agrabad Branch**
+Bank Asia Tower, Agrabad C/A, Chattogram
+agrabad@midlandbankbd.net
+031-7123456
+"""
+
+
+class BranchDirectoryTests(SimpleTestCase):
+    def directory(self):
+        from chatbot.services.branch_directory import Branch, BranchDirectory
+        return BranchDirectory([
+            Branch("Gulshan Branch", city="dhaka"),
+            Branch("Banani Branch", city="dhaka"),
+            Branch("Mirpur Branch", city="dhaka"),
+            Branch("Kawran Bazar Branch", city="dhaka"),
+            Branch("Rajshahi Branch", city="rajshahi"),
+            Branch("Foyla Bazar Branch", city="khulna"),
+            Branch("Agrabad Branch", city="chattogram"),
+        ])
+
+    def names(self, branches):
+        return [branch.name for branch in branches]
+
+    def test_parse_labeled_and_heading_records(self):
+        from chatbot.services.branch_directory import parse_branches
+
+        gulshan, agrabad = parse_branches(BRANCH_DOCUMENT)
+        self.assertEqual(gulshan.name, "Gulshan Branch")
+        self.assertEqual(gulshan.address, "House 5, Road 45, Gulshan-2, Dhaka 1212")
+        self.assertEqual(gulshan.hours, "10:00 AM - 4:00 PM")
+        self.assertEqual(gulshan.phone, "02-9881234")
+        self.assertEqual(gulshan.city, "dhaka")
+        self.assertEqual(agrabad.name, "Agrabad Branch")
+        self.assertEqual(agrabad.address, "Bank Asia Tower, Agrabad C/A, Chattogram")
+        self.assertEqual(agrabad.email, "agrabad@midlandbankbd.net")
+        self.assertEqual(agrabad.phone, "031-7123456")
+        self.assertEqual(agrabad.city, "chattogram")
+
+    def test_parse_ignores_prose_before_a_record(self):
+        from chatbot.services.branch_directory import parse_branches
+
+        self.assertEqual(parse_branches("Please visit your nearest branch for details."), [])
+
+    def test_lookup_exact_and_typo(self):
+        directory = self.directory()
+        self.assertEqual(self.names(directory.lookup("Gulshan branch")), ["Gulshan Branch"])
+        self.assertEqual(self.names(directory.lookup("gulshn")), ["Gulshan Branch"])
+
+    def test_lookup_short_prefixes_do_not_match(self):
+        directory = self.directory()
+        for prefix in ("gul", "ban", "mir", "raj"):
+            with self.subTest(prefix=prefix):
+                self.assertEqual(directory.lookup(prefix), [])
+
+    def test_lookup_returns_every_tied_branch(self):
+        self.assertEqual(
+            sorted(self.names(self.directory().lookup("bazar"))),
+            ["Foyla Bazar Branch", "Kawran Bazar Branch"]
+        )
+
+    def test_lookup_city(self):
+        self.assertEqual(
+            self.names(self.directory().lookup("dhaka")),
+            ["Gulshan Branch", "Banani Branch", "Mirpur Branch", "Kawran Bazar Branch"]
+        )
+
+
+class SemanticAnswerCacheTests(SimpleTestCase):
+    CHUNKS = ["dps-1", "dps-2"]
+
+    def cache_with(self, question, answer="Tk 500", context="ctx"):
+        from chatbot.services.semantic_cache import SemanticAnswerCache
+        cache = SemanticAnswerCache(threshold=0.92)
+        cache.store([1.0, 0.0, 0.0], self.CHUNKS, answer, "v1", question, context)
+        return cache
+
+    def test_paraphrase_hits(self):
+        cache = self.cache_with("What is the minimum deposit for DPS?")
+        self.assertEqual(
+            cache.lookup([0.99, 0.05, 0.0], self.CHUNKS, "v1", "minimum amount I must deposit in a DPS", "ctx"),
+            "Tk 500"
+        )
+
+    def test_opposite_terms_miss(self):
+        cache = self.cache_with("What is the minimum deposit for DPS?")
+        self.assertIsNone(cache.lookup([0.99, 0.05, 0.0], self.CHUNKS, "v1", "What is the maximum deposit for DPS?", "ctx"))
+        cache = self.cache_with("What is the fee for opening an account?")
+        self.assertIsNone(cache.lookup([1.0, 0.0, 0.0], self.CHUNKS, "v1", "What is the fee for closing an account?", "ctx"))
+
+    def test_numbers_and_negation_miss(self):
+        cache = self.cache_with("Profit rate for a 3 year DPS?")
+        self.assertIsNone(cache.lookup([1.0, 0.0, 0.0], self.CHUNKS, "v1", "Profit rate for a 5 year DPS?", "ctx"))
+        cache = self.cache_with("Can I withdraw from DPS early?")
+        self.assertIsNone(cache.lookup([1.0, 0.0, 0.0], self.CHUNKS, "v1", "Can't I withdraw from DPS early?", "ctx"))
+
+    def test_different_conversation_misses(self):
+        cache = self.cache_with("What is the minimum deposit for DPS?")
+        self.assertIsNone(cache.lookup([1.0, 0.0, 0.0], self.CHUNKS, "v1", "What is the minimum deposit for DPS?", "other"))
+        self.assertIsNone(cache.lookup([1.0, 0.0, 0.0], ["dps-1"], "v1", "What is the minimum deposit for DPS?", "ctx"))
+
+    def test_low_similarity_misses(self):
+        cache = self.cache_with("What is the minimum deposit for DPS?")
+        self.assertIsNone(cache.lookup([0.6, 0.8, 0.0], self.CHUNKS, "v1", "What is the minimum deposit for DPS?", "ctx"))
+
+    def test_context_key_ignores_only_the_question(self):
+        from chatbot.services.llm_services import semantic_context_key
+
+        def messages(question, history):
+            return [{"role": "system", "content": "sys"}, *history,
+                    {"role": "user", "content": question}, {"role": "system", "content": "context"}]
+
+        history = [{"role": "user", "content": "Tell me about DPS"}, {"role": "assistant", "content": "DPS is ..."}]
+        self.assertEqual(
+            semantic_context_key(messages("minimum deposit?", history)),
+            semantic_context_key(messages("least amount to deposit?", history))
+        )
+        self.assertNotEqual(
+            semantic_context_key(messages("minimum deposit?", history)),
+            semantic_context_key(messages("minimum deposit?", []))
+        )
+
+
+class HybridRetrievalTests(SimpleTestCase):
+    def index(self):
+        from chatbot.services.lexical_index import BM25Index
+        index = BM25Index()
+        index.build(
+            ["fees", "car", "green", "savings"],
+            [
+                "Schedule of charges: account maintenance fee Tk 500 and closing charge Tk 300 plus VAT.",
+                "MDB Car Loan finances a new or reconditioned car for salaried individuals.",
+                "MDB Green loan supports green projects and renewable energy.",
+                "Private banking savings accounts with attractive profit rates.",
+            ],
+            [{"title": "Charges"}, {"title": "Car Loan"}, {"title": "Green"}, {"title": "Savings"}],
+            fingerprint="test"
+        )
+        return index
+
+    def test_bm25_ranks_the_matching_chunk_first(self):
+        index = self.index()
+        hits = index.search("car loan", top_k=3)
+        self.assertEqual(hits[0][0], "car")
+        self.assertEqual(len(hits), 2)  # "loan" also matches the green chunk
+        self.assertEqual(index.search("nothing like this"), [])
+        self.assertEqual(index.get("green")[1], {"title": "Green"})
+        self.assertEqual(index.get("missing"), (None, None))
+
+    def test_reciprocal_rank_fusion(self):
+        from chatbot.services.lexical_index import reciprocal_rank_fusion
+        fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "d"]], k=60)
+        self.assertEqual([item for item, _ in fused], ["b", "a", "d", "c"])
+        self.assertAlmostEqual(dict(fused)["b"], 1 / 62 + 1 / 61)
+
+    def test_lexical_only_query(self):
+        from chatbot.services.retrieval_services import is_lexical_only_query
+        index = self.index()
+        for query, expected in [
+            ("what is the closing charge", True),
+            ("maintenance fee", True),
+            ("private banking", False),      # "vat" inside "private" is not a fee term
+            ("savings deposit", False),      # product words are not fee terms
+            ("car loan fee", False),         # the top chunk does not cover every term
+        ]:
+            with self.subTest(query=query):
+                self.assertEqual(is_lexical_only_query(query, index.search(query), index), expected)
+        self.assertFalse(is_lexical_only_query("closing charge", [], index))
+
+    def test_fused_lexical_only_hits_rank_behind_vector_hits(self):
+        from chatbot.services.retrieval_services import _fuse_rankings
+        index = self.index()
+        vector = {
+            "ids": [["car", "green"]], "documents": [["car doc", "green doc"]],
+            "metadatas": [[{}, {}]], "distances": [[0.4, 0.9]],
+        }
+        fused = _fuse_rankings([("fees", 10.0), ("savings", 5.0), ("car", 3.0)], vector, index, 10)
+        distances = dict(zip(fused["ids"][0], fused["distances"][0]))
+        self.assertEqual(distances["car"], 0.4)
+        self.assertEqual(distances["fees"], 0.9)    # best BM25 hit: no closer than the worst vector hit
+        self.assertAlmostEqual(distances["savings"], 1.2)
+        self.assertEqual(fused["documents"][0][fused["ids"][0].index("fees")], index.get("fees")[0])
+
+        lexical_only = _fuse_rankings([("fees", 10.0), ("savings", 5.0)], None, index, 10)
+        self.assertEqual(lexical_only["distances"][0], [0.0, 0.75])
+
+
+class SingleFlightTests(SimpleTestCase):
+    def setUp(self):
+        import tempfile
+        import diskcache
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = diskcache.Cache(self.tmp.name)
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp.cleanup()
+
+    def flight(self, **kwargs):
+        from chatbot.services.single_flight import SingleFlight
+        return SingleFlight(self.store, poll_interval=0.01, **kwargs)
+
+    def test_follower_reraises_leader_error(self):
+        import threading
+        flight = self.flight(wait_timeout=5)
+        started, release = threading.Event(), threading.Event()
+
+        def fail():
+            started.set()
+            release.wait(5)
+            raise ValueError("upstream failed")
+
+        def lead():
+            try:
+                flight.do("k", lambda: None, fail)
+            except ValueError:
+                pass
+
+        leader = threading.Thread(target=lead)
+        leader.start()
+        started.wait(5)
+        call, is_leader = flight.join("k")
+        self.assertFalse(is_leader)
+        release.set()
+        with self.assertRaises(ValueError):
+            flight.wait(call)
+        leader.join(5)
+        self.assertIsNone(self.store.get("flight:k"))  # the leader released the shared lock
+
+    def test_wait_shared_times_out_then_computes(self):
+        flight = self.flight(wait_timeout=0.1)
+        self.store.add("flight:k", "another-worker", expire=60)
+        self.assertIsNone(flight.wait_shared("k", lambda: None))
+        self.assertEqual(flight.do("k", lambda: None, lambda: "computed"), "computed")
+
+    def test_cross_worker_lock_expires(self):
+        import time
+        flight = self.flight(lock_expire=0.2)
+        token = flight.acquire("k")
+        self.assertIsNotNone(token)
+        self.assertIsNone(flight.acquire("k"))
+        time.sleep(0.3)
+        # A worker that died holding the lock blocks others only until it expires
+        self.assertIsNotNone(flight.acquire("k"))
+        flight.release("k", token)  # a stale token does not release the new holder's lock
+        self.assertIsNotNone(self.store.get("flight:k"))
+
+    def test_async_callers_share_one_call(self):
+        import asyncio
+        flight = self.flight(wait_timeout=5)
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "answer"
+
+        async def main():
+            return await asyncio.gather(*(flight.ado("k", lambda: None, compute) for _ in range(3)))
+
+        self.assertEqual(asyncio.run(main()), ["answer"] * 3)
+        self.assertEqual(len(calls), 1)
+
+
+class CachedEmbeddingFunctionTests(SimpleTestCase):
+    def setUp(self):
+        import tempfile
+        import diskcache
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = diskcache.Cache(self.tmp.name)
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp.cleanup()
+
+    def embedder(self, store, calls):
+        from chatbot.services.embedding_services import CachedEmbeddingFunction
+
+        def embed(texts):
+            calls.append(list(texts))
+            return [[0.1 * len(text), 1 / 3, -2.0] for text in texts]
+
+        return CachedEmbeddingFunction(embed, store=store, model_name="test", max_entries=2)
+
+    def test_normalized_queries_share_one_embedding(self):
+        calls = []
+        embedder = self.embedder(self.store, calls)
+        first, second, third = embedder.embed(["Car  Loan", "car loan", " CAR LOAN\n"])
+        self.assertEqual(calls, [["car loan"]])
+        self.assertTrue((first == second).all() and (second == third).all())
+        embedder.embed_one("car loan")
+        self.assertEqual(len(calls), 1)
+        self.assertEqual((embedder.hits, embedder.misses), (1, 1))  # one model call for the batch, then a hit
+
+    def test_float16_round_trip_through_the_store(self):
+        import numpy as np
+        calls = []
+        fresh = self.embedder(self.store, calls).embed_one("profit rate")
+        self.assertEqual(fresh.dtype, np.float32)
+        np.testing.assert_array_equal(fresh, np.asarray([1.1, 1 / 3, -2.0], dtype=np.float16).astype(np.float32))
+
+        # Another worker reads the float16 bytes back without calling the model
+        stored = self.embedder(self.store, calls).embed_one("Profit Rate")
+        self.assertEqual(len(calls), 1)
+        np.testing.assert_array_equal(stored, fresh)
+
+    def test_memory_is_bounded(self):
+        calls = []
+        embedder = self.embedder(None, calls)
+        embedder.embed(["a", "b", "c"])
+        self.assertEqual(len(embedder._memory), 2)
+        embedder.embed_one("a")  # evicted and no disk store: embedded again
+        self.assertEqual(len(calls), 2)
+
+
+class ChunkStoreTests(SimpleTestCase):
+    def setUp(self):
+        import tempfile
+        import diskcache
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = diskcache.Cache(self.tmp.name)
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp.cleanup()
+
+    def chunk_store(self):
+        from chatbot.services.chunk_store import ChunkStore
+        return ChunkStore(self.store, max_entries=10)
+
+    def test_texts_are_shared_and_read_back_in_order(self):
+        self.chunk_store().put_many([("a", "same text"), ("b", "same text"), ("c", "other")], "v1")
+        self.assertEqual(sum(1 for key in self.store if key.startswith("chunk:")), 2)
+        # A new worker reads through the disk cache
+        self.assertEqual(self.chunk_store().get_many(["c", "a", "b"], "v1"), ["other", "same text", "same text"])
+
+    def test_stale_ref_and_missing_chunk_return_none(self):
+        self.chunk_store().put_many([("a", "text a")], "v1")
+        digest = self.store.get("chunkref:v1|a")
+        self.store.delete(f"chunk:{digest}")  # the text expired, the ref did not
+        self.assertEqual(self.chunk_store().get_many(["a", "missing"], "v1"), [None, None])
+        # Refs never carry over to another corpus version
+        self.chunk_store().put_many([("b", "text b")], "v1")
+        self.assertEqual(self.chunk_store().get_many(["b"], "v2"), [None])
+
+    def test_fetch_fills_gaps_and_repairs_stale_refs(self):
+        self.chunk_store().put_many([("a", "text a")], "v1")
+        self.store.delete(f"chunk:{self.store.get('chunkref:v1|a')}")
+        fetched = []
+
+        def fetch(ids):
+            fetched.append(list(ids))
+            return {chunk_id: f"fetched {chunk_id}" for chunk_id in ids if chunk_id != "gone"}
+
+        chunks = self.chunk_store()
+        self.assertEqual(chunks.get_many(["a", "gone"], "v1", fetch), ["fetched a", None])
+        self.assertEqual(fetched, [["a", "gone"]])
+        self.assertEqual(self.chunk_store().get_many(["a"], "v1"), ["fetched a"])
+
+
+class PromptBudgetTests(SimpleTestCase):
+    def setUp(self):
+        from unittest import mock
+        # Use the estimator so counts do not depend on tiktoken being installed
+        patcher = mock.patch("chatbot.services.prompt_budget._encoding", return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def history(self, turns):
+        return [
+            {"role": "user" if n % 2 == 0 else "assistant", "content": f"Turn {n}. " + "word " * 40}
+            for n in range(turns)
+        ]
+
+    def test_everything_fits_unchanged(self):
+        from chatbot.services.prompt_budget import assemble_prompt
+        history = self.history(2)
+        kept, context, report = assemble_prompt("sys", history, "question?", "Some context.", budget=1000, history_share=0.3)
+        self.assertEqual(kept, history)
+        self.assertEqual(context, "Some context.")
+        self.assertEqual(report["history"], report["history_wanted"])
+
+    def test_history_over_budget_drops_oldest_turns(self):
+        from chatbot.services.prompt_budget import assemble_prompt
+        history = self.history(10)
+        context = "Fee is Tk 500. " * 20
+        kept, trimmed, report = assemble_prompt("sys", history, "question?", context, budget=300, history_share=0.3)
+        self.assertLess(len(kept), len(history))
+        self.assertEqual(kept[-1], history[-1])               # newest turn kept whole
+        self.assertEqual(kept[1:], history[-len(kept) + 1:])  # a contiguous recent tail
+        self.assertTrue(history[-len(kept)]["content"].startswith(kept[0]["content"].removesuffix(" ...")))
+        self.assertEqual(trimmed, context)                    # context outranks history
+        self.assertLess(report["history"], report["history_wanted"])
+        self.assertLessEqual(report["total"], 300)
+
+    def test_context_trimmed_at_sentence_end_to_leave_history_reserve(self):
+        from chatbot.services.prompt_budget import assemble_prompt
+        history = self.history(4)
+        context = "Fee is Tk 500. " * 200
+        kept, trimmed, report = assemble_prompt("sys", history, "question?", context, budget=400, history_share=0.3)
+        self.assertTrue(trimmed.endswith("Tk 500."))
+        self.assertLess(len(trimmed), len(context))
+        self.assertTrue(kept)
+        self.assertLessEqual(report["total"], 400)
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        from unittest import mock
+        self.now = 1000.0
+        patcher = mock.patch("chatbot.services.circuit_breaker.time.monotonic", side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def breaker(self):
+        from chatbot.services.circuit_breaker import CircuitBreaker
+        return CircuitBreaker("test", failure_threshold=3, slow_call_seconds=5, cooldown=30)
+
+    def open_breaker(self):
+        breaker = self.breaker()
+        for _ in range(3):
+            breaker.record_failure()
+        return breaker
+
+    def test_consecutive_failures_open_it(self):
+        breaker = self.breaker()
+        breaker.record_failure()
+        breaker.record_failure()
+        breaker.record_success(0.1)  # a success resets the count
+        breaker.record_failure()
+        self.assertEqual(breaker.state, breaker.CLOSED)
+        breaker.record_failure()
+        breaker.record_success(6.0)  # slow calls count as failures
+        self.assertEqual(breaker.state, breaker.OPEN)
+        self.assertTrue(breaker.is_open())
+        self.assertFalse(breaker.allow_request())
+
+    def test_half_open_trial_success_closes_it(self):
+        breaker = self.open_breaker()
+        self.now += 31
+        self.assertFalse(breaker.is_open())
+        self.assertTrue(breaker.allow_request())
+        self.assertEqual(breaker.state, breaker.HALF_OPEN)
+        self.assertFalse(breaker.allow_request())  # one trial at a time
+        breaker.record_success(0.1)
+        self.assertEqual(breaker.state, breaker.CLOSED)
+        self.assertTrue(breaker.allow_request())
+
+    def test_half_open_trial_failure_reopens_it(self):
+        breaker = self.open_breaker()
+        self.now += 31
+        self.assertTrue(breaker.allow_request())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, breaker.OPEN)
+        self.assertFalse(breaker.allow_request())
+        self.now += 31
+        self.assertTrue(breaker.allow_request())  # the cooldown restarts from the failed trial
+
+    def test_lost_trial_is_rearmed_after_cooldown(self):
+        breaker = self.open_breaker()
+        self.now += 31
+        self.assertTrue(breaker.allow_request())
+        self.now += 31  # the trial never reported back
+        self.assertTrue(breaker.allow_request())
@@ -1,11 +1,17 @@
 from django.urls import include, path
 from . import views
 from .views import chatbot_response
+from .views import chatbot_stream
+from .views import chatbot_response_async
 from .views import index
+from .views import cache_version
 
 urlpatterns = [
     path("", index, name="index"),  # serves HTML page
     path("chatbot/", chatbot_response, name="chatbot_response"),  # POST endpoint
+    path("chatbot/async/", chatbot_response_async, name="chatbot_response_async"),  # POST endpoint, for ASGI servers
+    path("chatbot/stream/", chatbot_stream, name="chatbot_stream"),  # POST endpoint, Server-Sent Events
+    path("chatbot/cache/version/", cache_version, name="cache_version"),  # admin: bump cache namespace
  ]
 
 
@@ -0,0 +1,65 @@
+from chatbot.data import config
+from chatbot.utils.phrase_matcher import PhraseMatcher
+
+
+class KeywordHits:
+    """Everything the keyword tables say about one text."""
+
+    __slots__ = ("category_scores", "categories", "location_hits", "bonus_total")
+
+    def __init__(self, category_scores, categories, location_hits, bonus_total):
+        self.category_scores = category_scores  # {category: whole-word hits * weight}
+        self.categories = categories            # categories with any keyword as a substring
+        self.location_hits = location_hits      # [(city, alias)] found as substrings
+        self.bonus_total = bonus_total          # sum of bonus_keywords weights present
+
+
+class KeywordIndex:
+    """
+    Category, location and bonus keyword tables compiled into one matcher.
+
+    `analyze` scans a lowercased text once and answers what
+    identify_query_category and the chunk scorer used to work out with a
+    regex or substring test per keyword.
+    """
+
+    def __init__(self, category_keywords, bonus_keywords, location_aliases):
+        self.category_keywords = {
+            category: [kw.lower() for kw in info["keywords"]]
+            for category, info in category_keywords.items()
+        }
+        self.category_weights = {category: info["weight"] for category, info in category_keywords.items()}
+        self.location_aliases = {
+            city: [alias.lower() for alias in aliases] for city, aliases in location_aliases.items()
+        }
+        # Bonus keywords are matched verbatim against lowercased text, as before
+        self.bonus_keywords = dict(bonus_keywords)
+
+        phrases = [kw for kws in self.category_keywords.values() for kw in kws]
+        phrases += [alias for aliases in self.location_aliases.values() for alias in aliases]
+        phrases += list(self.bonus_keywords)
+        self.matcher = PhraseMatcher(phrases)
+
+    def analyze(self, text_lower):
+        hits = self.matcher.scan(text_lower)
+        found, words = hits.substring, hits.word
+
+        category_scores = {}
+        categories = []
+        for category, keywords in self.category_keywords.items():
+            score = sum(1 for kw in keywords if kw in words)
+            if score > 0:
+                category_scores[category] = score * self.category_weights[category]
+            if any(kw in found for kw in keywords):
+                categories.append(category)
+
+        location_hits = [
+            (city, alias)
+            for city, aliases in self.location_aliases.items()
+            for alias in aliases if alias in found
+        ]
+        bonus_total = sum(bonus for kw, bonus in self.bonus_keywords.items() if kw in found)
+        return KeywordHits(category_scores, categories, location_hits, bonus_total)
+
+
+keyword_index = KeywordIndex(config.category_keywords, config.bonus_keywords, config.location_aliases)
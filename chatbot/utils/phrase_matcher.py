@@ -0,0 +1,129 @@
+import hashlib
+import json
+from collections import deque
+
+
+def _is_word_char(ch):
+    """Mirror of the regex `\\w` class used by the old `\\b...\\b` patterns."""
+    return ch.isalnum() or ch == "_"
+
+
+class PhraseHits:
+    """Result of a single scan: phrases found as substrings and as whole words."""
+
+    __slots__ = ("substring", "word")
+
+    def __init__(self, substring=None, word=None):
+        self.substring = substring if substring is not None else set()
+        self.word = word if word is not None else set()
+
+
+class PhraseMatcher:
+    """
+    Aho-Corasick automaton over a fixed set of phrases.
+
+    One pass over a text returns every phrase that occurs in it, both as a
+    plain substring (`phrase in text`) and with regex word-boundary semantics
+    (`re.search(r'\\b' + re.escape(phrase) + r'\\b', text)`), so callers can
+    replace per-phrase loops with set lookups.
+    """
+
+    def __init__(self, phrases=()):
+        self.build(phrases)
+
+    def build(self, phrases):
+        """(Re)build the automaton in place from an iterable of phrases."""
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        self.phrases = set()
+
+        for phrase in phrases:
+            if not phrase or phrase in self.phrases:
+                continue
+            self.phrases.add(phrase)
+            node = 0
+            for ch in phrase:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                node = nxt
+            self._out[node].append(phrase)
+
+        # Breadth-first pass to wire failure links and merge outputs
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[child] = target if target != child else 0
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+        return self
+
+    def scan(self, text):
+        """Return a `PhraseHits` with every phrase occurring in `text`."""
+        hits = PhraseHits()
+        if not text or not self.phrases:
+            return hits
+
+        goto, fail, out = self._goto, self._fail, self._out
+        substring, word = hits.substring, hits.word
+        text_len = len(text)
+        node = 0
+        for end, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if not out[node]:
+                continue
+            for phrase in out[node]:
+                substring.add(phrase)
+                if phrase in word:
+                    continue
+                start = end - len(phrase) + 1
+                before = text[start - 1] if start > 0 else ""
+                after = text[end + 1] if end + 1 < text_len else ""
+                starts_on_boundary = _is_word_char(phrase[0]) != (bool(before) and _is_word_char(before))
+                ends_on_boundary = _is_word_char(phrase[-1]) != (bool(after) and _is_word_char(after))
+                if starts_on_boundary and ends_on_boundary:
+                    word.add(phrase)
+        return hits
+
+
+class AliasMatcher:
+    """
+    Product alias lookup built once from the alias -> canonical mapping.
+
+    All alias keys and canonical names are matched in lowercase with a single
+    `PhraseMatcher`, so a query, document or title is scanned exactly once.
+    """
+
+    def __init__(self, aliases=None):
+        self.build(aliases or {})
+
+    def build(self, aliases):
+        """(Re)build from an ordered alias -> canonical mapping."""
+        # Keep the original iteration order: scoring depends on the first pair
+        self.pairs = [(alias.lower(), canonical.lower()) for alias, canonical in aliases.items()]
+        self.canonical_names = [name.lower() for name in set(aliases.values())]
+        phrases = [p for pair in self.pairs for p in pair]
+        self.matcher = PhraseMatcher(phrases)
+        # Identifies this alias table in features precomputed at index time
+        self.fingerprint = hashlib.sha256(json.dumps(self.pairs).encode("utf-8")).hexdigest()[:12]
+        return self
+
+    def scan(self, text_lower):
+        return self.matcher.scan(text_lower)
+
+    def pairs_in_query(self, query_hits):
+        """Alias pairs whose alias or canonical name appears in the query."""
+        found = query_hits.substring
+        return [(a, c) for a, c in self.pairs if a in found or c in found]
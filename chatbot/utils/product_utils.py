@@ -3,6 +3,13 @@ from chatbot.data.config import greetings
 import re
 from fuzzywuzzy import fuzz
 from rapidfuzz import fuzz as rfuzz
+import hashlib
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from django.conf import settings
+from chatbot.services import cache_services
+from chatbot.services.executor_services import get_fanout_executor
+from chatbot.utils import text_utils
 
 
 def match_product_name(user_query, product_list, cutoff=0.6):
@@ -46,7 +53,8 @@ def extract_multiple_products(user_query, known_products, threshold=85):
 
 
 def summarize_context(context, llm_services, cache, history=None):
-    summary_key = f"summary:{hash(context)}"
+    # sha256, not hash(): str hashes are randomized per process, so workers never shared entries
+    summary_key = cache_services.versioned_key("summary", hashlib.sha256(context.encode("utf-8")).hexdigest())
     if cache and summary_key in cache:
         return cache[summary_key]
 
@@ -58,9 +66,41 @@ def summarize_context(context, llm_services, cache, history=None):
 
     print(f"📝 Summary returned ({len(summary)} chars): {summary[:300]}...")  # Add preview
     
-    if cache is not None:
-        cache[summary_key] = summary.strip()
+    if cache is not None and not llm_services.is_error_reply(summary):
+        cache.set(summary_key, summary.strip(), expire=getattr(settings, "CHATBOT_SUMMARY_CACHE_TTL", 30 * 24 * 60 * 60))
 
     return summary.strip()
 
 
+def summarize_contexts(contexts, llm_services, cache, history=None, max_length=2500):
+    """
+    summarize_context for every context longer than `max_length`, run side by
+    side on the fan-out pool. Summaries not back within CHATBOT_SUMMARY_DEADLINE
+    seconds (or that failed) are replaced by the context cut at `max_length`;
+    late ones still finish in the background and land in the summary cache.
+    """
+    deadline = time.monotonic() + getattr(settings, "CHATBOT_SUMMARY_DEADLINE", 12)
+    executor = get_fanout_executor()
+    futures = {
+        i: executor.submit(summarize_context, context, llm_services, cache, history)
+        for i, context in enumerate(contexts) if len(context) > max_length
+    }
+
+    processed = []
+    for i, context in enumerate(contexts):
+        if i not in futures:
+            processed.append(context)
+            continue
+        try:
+            summary = futures[i].result(timeout=max(deadline - time.monotonic(), 0))
+        except FutureTimeoutError:
+            print(f"⏱️ Summary {i + 1}/{len(contexts)} missed the deadline; using the context as is")
+            summary = None
+        except Exception as e:
+            print(f"Error summarizing context {i + 1}/{len(contexts)}: {e}")
+            summary = None
+        if not summary or llm_services.is_error_reply(summary):
+            summary = text_utils.truncate_context(context, max_chars=max_length)
+        processed.append(summary)
+    return processed
+
@@ -1,10 +1,13 @@
 import re
+import uuid
+from django.conf import settings
 from fuzzywuzzy import fuzz
 from difflib import get_close_matches
 from chatbot.data.config import bank_keywords
 from chatbot.services import llm_services
 from chatbot.services.retrieval_services import cache
 from chatbot.services import retrieval_services
+from chatbot.services import branch_directory
 
 def normalize_message(text):
     text = text.lower()
@@ -295,7 +298,7 @@ def reframe_confirmation_reply(user_message, last_topic, last_bot_message):
 
         followup_rephrased = llm_services.get_gpt_response(gpt_messages, cache=cache)
         print(f"🔄 GPT rephrased: {followup_rephrased}")
-        if not followup_rephrased or not followup_rephrased.strip():
+        if not followup_rephrased or not followup_rephrased.strip() or llm_services.is_error_reply(followup_rephrased):
             return f"Please continue explaining about {last_topic}."
     
         return followup_rephrased.strip()
@@ -311,6 +314,36 @@ def append_to_chat_history(request, user_message, bot_response):
     request.session.modified = True
 
 
+PENDING_REPLY_KEY = "pending_reply"
+
+
+def mark_pending_reply(request, user_message):
+    """
+    Note a streamed turn in the session. The session cookie goes out with the
+    response headers, before the answer exists, so the answer is parked in
+    the cache under the returned id and added to history on the next request.
+    """
+    reply_id = uuid.uuid4().hex
+    request.session[PENDING_REPLY_KEY] = {"id": reply_id, "user": user_message}
+    request.session.modified = True
+    return reply_id
+
+
+def complete_pending_reply(reply_id, bot_response):
+    cache.set(f"reply:{reply_id}", bot_response, expire=getattr(settings, "CHATBOT_PENDING_REPLY_TTL", 24 * 60 * 60))
+
+
+def resolve_pending_reply(request):
+    """Move the previous streamed turn, if it finished, into chat history."""
+    pending = request.session.pop(PENDING_REPLY_KEY, None)
+    if not pending:
+        return
+    request.session.modified = True
+    bot_response = cache.get(f"reply:{pending['id']}")
+    if bot_response is not None:
+        append_to_chat_history(request, pending["user"], bot_response)
+
+
 def get_last_bot_message(chat_history):
     for msg in reversed(chat_history):
         if msg["role"] == "assistant":
@@ -333,6 +366,11 @@ def handle_conversation_state(user_message, request):
         request.session["conversation_state"] = {"type": "location_received"}
         request.session.modified = True
 
+        # 🔹 Step 0: Answer from the parsed branch directory (no Chroma query, no GPT call)
+        directory_answer = branch_directory.answer_branch_query(location)
+        if directory_answer:
+            return directory_answer
+
         # 🔹 Step 1: Fetch ChromaDB data
         context = retrieval_services.get_relevant_chroma_data(location)
         sanitized = sanitize_context(context)
@@ -1,7 +1,9 @@
 # ChromaDB based chatbot implementation
-from django.http import JsonResponse
-from rest_framework.decorators import api_view
-import time, re, logging
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.views import APIView
+import time, re, logging, json
 logger = logging.getLogger(__name__)
 # Import from your new modules
 from chatbot.data import config #
@@ -9,6 +11,9 @@ from chatbot.services import retrieval_services
 from chatbot.services.retrieval_services import identify_query_category
 from chatbot.services import llm_services
 from chatbot.services import product_listing_service
+from chatbot.services import listing_renderer
+from chatbot.services import cache_services
+from chatbot.services.executor_services import run_blocking
 from chatbot.utils import text_utils
 from chatbot.utils import product_utils
 from chatbot.services.retrieval_services import cache
@@ -16,6 +21,7 @@ from chatbot.data.config import PRODUCT_ALIASES
 import os
 os.environ["CUDA_VISIBLE_DEVICES"] = "-1"
 from django.shortcuts import render
+from django.conf import settings
 from django.views.decorators.csrf import csrf_exempt
 
 
@@ -23,21 +29,134 @@ def index(request):
     return render(request, "chatbot/chatbot.html")
 
 
+@api_view(["GET", "POST"])
+@permission_classes([IsAdminUser])
+def cache_version(request):
+    """GET: current cache namespace. POST: bump it so every cached answer is recomputed."""
+    if request.method == "POST":
+        generation, namespace = cache_services.bump_generation()
+        logger.info(f"♻️ Cache generation bumped to {generation} by {request.user}")
+    else:
+        generation, namespace = cache_services.generation(), cache_services.namespace()
+    return JsonResponse({
+        "namespace": namespace,
+        "generation": generation,
+        "prompt_version": cache_services.prompt_version(),
+    })
+
+
+def sse_event(payload):
+    return f"data: {json.dumps(payload)}\n\n"
+
+
 @csrf_exempt
 @api_view(["GET", "POST"])
 def chatbot_response(request):
     """Handle chatbot responses using ChromaDB and GPT."""
+    text_utils.resolve_pending_reply(request)
+    reply = plan_reply(request)
+    if isinstance(reply, llm_services.GptReply):
+        response = reply.finish(reply.text())
+        if reply.record:
+            text_utils.append_to_chat_history(request, reply.user_message, response)
+        reply = response
+    return JsonResponse({"response": reply})
+
+
+def prepare_async_reply(request):
+    """
+    Blocking half of chatbot_response_async: the checks @api_view runs
+    (content negotiation, authentication, permissions, throttles), pending
+    history, then the pipeline. A failed check comes back as DRF's rendered
+    error response.
+    """
+    view = APIView()
+    view.args, view.kwargs = (), {}
+    drf_request = view.initialize_request(request)
+    view.request = drf_request
+    view.headers = view.default_response_headers
+    try:
+        view.initial(drf_request)
+    except Exception as exc:
+        response = view.finalize_response(drf_request, view.handle_exception(exc))
+        return drf_request, None, response.render()
+    text_utils.resolve_pending_reply(drf_request)
+    return drf_request, plan_reply(drf_request), None
+
+
+@csrf_exempt
+async def chatbot_response_async(request):
+    """
+    chatbot_response for ASGI. Retrieval runs on the bounded blocking
+    executor and the GPT call is awaited, so a conversation waiting on
+    OpenAI holds no thread.
+    """
+    if request.method not in ("GET", "POST"):
+        return JsonResponse({"detail": f'Method "{request.method}" not allowed.'}, status=405)
+    drf_request, reply, error_response = await run_blocking(prepare_async_reply, request)
+    if error_response is not None:
+        return error_response
+
+    if isinstance(reply, llm_services.GptReply):
+        response = await reply.atext()
+        # The product-list fallback may read the catalog from Chroma
+        response = await run_blocking(reply.finish, response)
+        if reply.record:
+            text_utils.append_to_chat_history(drf_request, reply.user_message, response)
+        reply = response
+    return JsonResponse({"response": reply})
+
+
+def stream_reply_events(reply, reply_id):
+    parts = []
+    for delta in reply.stream():
+        parts.append(delta)
+        yield sse_event({"delta": delta})
+    response = "".join(parts).strip()
+    final = reply.finish(response)
+    if final != response:
+        yield sse_event({"replace": final})
+    if reply_id:
+        text_utils.complete_pending_reply(reply_id, final)
+    yield sse_event({"done": True})
+
+
+@csrf_exempt
+@api_view(["POST"])
+def chatbot_stream(request):
+    """
+    Same pipeline as chatbot_response, sent as Server-Sent Events:
+    {"delta": text} as GPT writes, an optional {"replace": text}, then {"done": true}.
+    """
+    text_utils.resolve_pending_reply(request)
+    reply = plan_reply(request)
+    if isinstance(reply, llm_services.GptReply):
+        reply_id = text_utils.mark_pending_reply(request, reply.user_message) if reply.record else None
+        events = stream_reply_events(reply, reply_id)
+    else:
+        events = iter([sse_event({"delta": reply}), sse_event({"done": True})])
+    response = StreamingHttpResponse(events, content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # keep nginx from buffering the stream
+    return response
+
+
+def plan_reply(request):
+    """
+    Run the chatbot pipeline up to the GPT call. Returns the reply text when
+    no GPT answer is needed, otherwise an llm_services.GptReply.
+    """
     #load user input
     user_message = request.data.get("message", "").strip()
     
     if not user_message:
-        return JsonResponse({"response": "Please enter a question about Midland Bank."})
+        return "Please enter a question about Midland Bank."
     
          
     # Step: Handle follow-up values first
     followup_response = text_utils.handle_conversation_state(user_message, request)
     if followup_response:
-        return JsonResponse({"response": followup_response})
+        return followup_response
  
     conversation_state = request.session.get("conversation_state", {})
 
@@ -47,9 +166,7 @@ def chatbot_response(request):
         if query_category_identified == "location":
             request.session["conversation_state"] = {"type": "awaiting_location"}
             request.session.modified = True
-            return JsonResponse({
-                "response": "Share your area or city, and I’ll list the closest branches."
-            })
+            return "Share your area or city, and I’ll list the closest branches."
     
     # Initialize session chat history
     chat_history = request.session.get("chat_history", [])
@@ -66,26 +183,28 @@ def chatbot_response(request):
     if reframed_message:
         print(f"🛠️ Reframed user message: '{user_message}' → '{reframed_message}'")
         user_message = reframed_message
+
+    # Standalone questions can reuse an answer given to a paraphrase;
+    # reframed follow-ups depend on the conversation, so they always go to GPT.
+    semantic = not reframed_message
                
     #Handle common greetings
     normalized = text_utils.normalize_message(user_message)
     user_message_lower = user_message.lower()
     if normalized in config.greetings:
-        return JsonResponse({"response": config.greetings[normalized]})
+        return config.greetings[normalized]
 
     # Avoid fuzzy matching confirmation words like "yes"
     confirmation_words = {"yes", "yeah", "yep", "sure", "ok", "okay", "no", "nope"}
     if normalized not in confirmation_words and len(normalized) >3:  # Limit length for greetings
         matched_key = text_utils.fuzzy_greeting_match(normalized, config.greetings)
         if matched_key:
-            return JsonResponse({"response": config.greetings[matched_key]})
+            return config.greetings[matched_key]
         
     
     # Check if query is banking-related
     if not text_utils.is_relevant_query(user_message):
-        return JsonResponse({
-            "response": "I didn't quite catch that. Could you please rephrase your question related to Midland Bank?"
-        })
+        return "I didn't quite catch that. Could you please rephrase your question related to Midland Bank?"
         
         
     # Query normalization and alias handling
@@ -117,18 +236,27 @@ def chatbot_response(request):
             print(f"💡 New topic inferred: {current_topic}")    
         
     if not current_topic:
-        return JsonResponse({"response": "Could not determine the topic. Please clarify your question."})
+        return "Could not determine the topic. Please clarify your question."
 
     request.session["last_topic"] = current_topic   # Save topic
     request.session["chat_history"] = chat_history  # Ensure chat history is stored
     request.session.modified = True
     
+    def listing(text):
+        # Listings are fully determined by the catalog; GPT only rephrases
+        # them when CHATBOT_LISTING_LLM_POLISH is on
+        if getattr(settings, "CHATBOT_LISTING_LLM_POLISH", False):
+            messages = llm_services.build_message_list(user_message, text, cache, history=chat_history)
+            return llm_services.GptReply(user_message, messages)
+        text_utils.append_to_chat_history(request, user_message, text)
+        return text
+
     # === Structured product list handling ===
     user_message_lower = text_utils.normalize_query_for_matching(user_message)
     if any(q in user_message_lower for q in config.general_product_queries):
         grouped = product_listing_service.list_products_grouped_by_category()
         if not grouped:
-            return JsonResponse({"response": "No products found in the knowledge base."})
+            return "No products found in the knowledge base."
         
         response_lines = []
         response_lines.append("Midland Bank offers the following products:")
@@ -136,85 +264,56 @@ def chatbot_response(request):
             response_lines.append(f"{cat} Products")
             response_lines.extend(f"- {p}" for p in products)
             response_lines.append("")  # spacing
-        return JsonResponse({"response": "\n".join(response_lines)})
+        return "\n".join(response_lines)
     
     
     # === Islamic Product Listing with Subcategories ===
     if "islamic" in user_message_lower and "product" in user_message_lower:
         grouped = product_listing_service.list_islamic_products_grouped()
         
-        if not grouped:
-            return JsonResponse({"response": "No Islamic products found."})
+        if not any(grouped.values()):
+            return "No Islamic products found."
         
-        response_lines = ["📦*Midland Bank Islamic Products:*"]
-        for subcat, products in grouped.items():
-            if products:
-                response_lines.append(f"{subcat} Products")
-                response_lines.extend(f"- {p}" for p in products)
-                
-        response_text = "\n".join(response_lines)
-        messages = llm_services.build_message_list(user_message, response_text, cache, history=chat_history)
-        response = llm_services.get_gpt_response(messages, cache)
-        text_utils.append_to_chat_history(request, user_message, response)
-        return JsonResponse({"response": response})
+        return listing(listing_renderer.render_listing("islamic", groups=grouped, label="Islamic"))
 
     
     #islamic loan query handling 
     if "islamic" in user_message_lower and "loan" in user_message_lower:
         grouped = product_listing_service.list_islamic_products_grouped()
-        loan_products = grouped.get("Islamic Loan", [])
+        loan_products = grouped.get("Loan", [])
         
         if not loan_products:
-            return JsonResponse({"response": "No Islamic loan products found."})
+            return "No Islamic loan products found."
         
-        context = "\n".join(f"- {p}" for p in loan_products)
-        messages = llm_services.build_message_list(user_message, context, cache, history=chat_history)
-        response = llm_services.get_gpt_response(messages, cache)
-    
-        text_utils.append_to_chat_history(request, user_message, response)
-        return JsonResponse({"response": response})
+        return listing(listing_renderer.render_listing("islamic loan", products=loan_products))
     
     #islamic savings query handling 
     if "islamic" in user_message_lower and "savings" in user_message_lower:
         grouped = product_listing_service.list_islamic_products_grouped()
-        savings_products = grouped.get("Islamic Savings", [])
+        savings_products = grouped.get("Savings", [])
         
         if not savings_products:
-            return JsonResponse({"response": "No Islamic savings products found."})
+            return "No Islamic savings products found."
         
-        context = "\n".join(f"- {p}" for p in savings_products)
-        messages = llm_services.build_message_list(user_message, context, cache, history=chat_history)
-        response = llm_services.get_gpt_response(messages, cache)
-       
-        text_utils.append_to_chat_history(request, user_message, response)
-    
-        return JsonResponse({"response": response})
+        return listing(listing_renderer.render_listing("islamic savings", products=savings_products))
     
     #SME product listing handling
     if "sme" in user_message_lower and "product" in user_message_lower:
         product_list = product_listing_service.get_sme_product_names()
         
         if not product_list:
-            return JsonResponse({"response": "No SME products found."})
+            return "No SME products found."
         
-        context = "\n".join(f"- {p}" for p in product_list)
-        messages = llm_services.build_message_list(user_message, context, cache, history=chat_history)
-        response = llm_services.get_gpt_response(messages, cache)
-        text_utils.append_to_chat_history(request, user_message, response)
-        return JsonResponse({"response": response})
+        return listing(listing_renderer.render_listing("sme", products=product_list, label="SME"))
     
      #NRB product listing handling
     if "nrb" in user_message_lower and "product" in user_message_lower:
         product_list = product_listing_service.get_nrb_product_names()
         
         if not product_list:
-            return JsonResponse({"response": "No NRB products found."})
+            return "No NRB products found."
         
-        context = "\n".join(f"- {p}" for p in product_list)
-        messages = llm_services.build_message_list(user_message, context, cache, history=chat_history)
-        response = llm_services.get_gpt_response(messages, cache)
-        text_utils.append_to_chat_history(request, user_message, response)
-        return JsonResponse({"response": response})
+        return listing(listing_renderer.render_listing("nrb", products=product_list, label="NRB"))
 
           
     # Category-specific product listing
@@ -222,14 +321,9 @@ def chatbot_response(request):
         if any(k in user_message_lower for k in triggers) and "product" in user_message_lower:
             products = product_listing_service.list_products_by_category(cat)
             if products:
-                context = "\n".join(f"- {p}" for p in products)
-                messages = llm_services.build_message_list(user_message, context, cache, history=chat_history)
-                response = llm_services.get_gpt_response(messages, cache)
-                text_utils.append_to_chat_history(request, user_message, response)
-                print("DEBUG session before append", chat_history)
-                return JsonResponse({"response": response})
+                return listing(listing_renderer.render_listing(cat, products=products))
             else:
-                return JsonResponse({"response": f"No {cat} products found."})
+                return f"No {cat} products found."
             
                     
     #Fuzzy match product names in user query
@@ -244,9 +338,11 @@ def chatbot_response(request):
         print(f"🧠 Multiple products detected: {matched_products}")
     
         contexts = []
-        for prod in matched_products[:2]:  # Compare first two matched products
-            print(f"📄 Getting context for: {prod}")
-            context = retrieval_services.get_relevant_chroma_data(prod)
+        products = matched_products[:2]  # Compare first two matched products
+        print(f"📄 Getting context for: {products}")
+        # One embedding pass and one Chroma query for both products
+        product_contexts = retrieval_services.get_relevant_chroma_data_many(products)
+        for prod, context in zip(products, product_contexts):
             # print(f"📄 Raw context length: {len(context) if context else 0}")
             # print(f"📄 Context preview: {context[:300] if context else 'No context found'}")
             if context.strip():
@@ -254,13 +350,10 @@ def chatbot_response(request):
     
         if contexts:
             MAX_CONTEXT_LENGTH = 2500  # Adjust based on token limits
-            processed_contexts = []
-            for c in contexts:
-                if len(c) > MAX_CONTEXT_LENGTH:
-                    processed_contexts.append(product_utils.summarize_context(c, llm_services, cache, history=chat_history))
-                    # print(f"🗜️ Summarized context length: {len(processed_contexts)}")
-                else:
-                    processed_contexts.append(c)
+            # Long contexts are summarized in parallel, within CHATBOT_SUMMARY_DEADLINE
+            processed_contexts = product_utils.summarize_contexts(
+                contexts, llm_services, cache, history=chat_history, max_length=MAX_CONTEXT_LENGTH
+            )
             comparison_prompt = (
                 "Compare the following two Midland Bank products side by side based on their features, eligibility, "
                 "benefits, and any other distinguishing aspects. Present the comparison in clear bullet points or a table if possible."
@@ -269,33 +362,31 @@ def chatbot_response(request):
             final_context = f"{comparison_prompt}\n\n{combined_context}"
     
             messages = llm_services.build_message_list(user_message, final_context, cache, history=chat_history)
-            response = llm_services.get_gpt_response(messages, cache)
-            logger.info(f"🤖 GPT Comparison Response: {response}")
-            text_utils.append_to_chat_history(request, user_message, response)
-            return JsonResponse({"response": response})
+            return llm_services.GptReply(user_message, messages)
     
     # Fallback to single product match
-    matched_product = product_utils.match_product_name(user_message, all_products)
+    matched_product = product_listing_service.find_product(user_message) or \
+        product_utils.match_product_name(user_message, all_products)
     
     if matched_product:
         print(f"🎯 Fuzzy matched '{user_message}' → '{matched_product}'")
-        raw_context = retrieval_services.get_relevant_chroma_data(matched_product)
+        raw_context, chunk_ids = retrieval_services.retrieve_context(matched_product)
         context = text_utils.sanitize_context(raw_context)
     
         if context.strip():
             messages = llm_services.build_message_list(user_message, context, cache, history=chat_history)
-            response = llm_services.get_gpt_response(messages, cache)
-            text_utils.append_to_chat_history(request, user_message, response)
-            return JsonResponse({"response": response})
+            # No semantic cache here: the chunks were retrieved by product name,
+            # so every question about this product would share one bucket
+            return llm_services.GptReply(user_message, messages, chunk_ids)
         else:
-            return JsonResponse({"response": f"Sorry, I couldn't find specific information on {matched_product}."})
+            return f"Sorry, I couldn't find specific information on {matched_product}."
 
     
     # Get relevant information from ChromaDB
     print(f"🔍 Processing query: {current_topic}")
     start_time = time.time()
     # Pass all necessary config data to the service function
-    raw_context = retrieval_services.get_relevant_chroma_data(current_topic)
+    raw_context, chunk_ids = retrieval_services.retrieve_context(current_topic)
     # print("DEBUG: Raw context type: ", raw_context[:300])
     context = text_utils.sanitize_context(raw_context)
     end_time = time.time()
@@ -304,7 +395,7 @@ def chatbot_response(request):
     
     
     if not context.strip():
-        return JsonResponse({"response": "Sorry, I couldn’t find anything relevant for that. Could you please rephrase?"})
+        return "Sorry, I couldn’t find anything relevant for that. Could you please rephrase?"
     
     # If the query is about board members, extract relevant lines
     if query_category_identified== 'board':
@@ -315,8 +406,7 @@ def chatbot_response(request):
         ])
         # print("DEBUG: Extracted board context (first 300 chars):\n", formatted_board_context[:300])
         messages = llm_services.build_message_list(user_message, context, cache, history=chat_history)
-        response = llm_services.get_gpt_response(messages, cache)
-        return JsonResponse({"response": response})
+        return llm_services.GptReply(user_message, messages, record=False)
             
     # If the query is about management, extract only relevant lines
     elif query_category_identified == 'management':
@@ -324,45 +414,38 @@ def chatbot_response(request):
         if management_context.strip():
             # print("DEBUG: Extracted management context (first 300 chars):\n", management_context[:300])
             messages = llm_services.build_message_list(user_message, context, cache, history=chat_history)
-            response = llm_services.get_gpt_response(messages, cache)
-            return JsonResponse({"response": response})
+            return llm_services.GptReply(user_message, messages, record=False)
     #if query about sponsors, extract relevant sentences    
     elif query_category_identified == 'sponsor':
         sponsor_context = text_utils.extract_sponsor_sentences(context)
         if sponsor_context.strip():
             # print("DEBUG: Extracted sponsor context (first 300 chars):\n", sponsor_context[:300])
             messages = llm_services.build_message_list(user_message, context, cache, history=chat_history)
-            response = llm_services.get_gpt_response(messages, cache)
-            return JsonResponse({"response": response})
+            return llm_services.GptReply(user_message, messages, record=False)
     
     
     # Generate response using GPT
     # print(f"DEBUG: Context *before* calling get_gpt_response (first 500 chars):\n {context[:500]}") 
     messages = llm_services.build_message_list(user_message, context, cache, history=chat_history)
-    response = llm_services.get_gpt_response(messages, cache)
-    # Save to session
-    text_utils.append_to_chat_history(request, user_message, response)
-    # print("DEBUG session before append", chat_history)
-    # print(f"🤖 GPT Response: {response}")
-    
+
     # Fallback product listing if GPT doesn't help
-    if (
-        product_listing_service.is_product_list_request(user_message)
-        and current_topic
-        and (
-            not response.strip()
-            or "sorry" in response.lower()
-            or "not sure" in response.lower()
-            or "couldn’t find" in response.lower()
-        )
-    ):
-        print(f"⚠️ GPT was uncertain. Attempting fallback product list for: {current_topic}")
-        category_products = product_listing_service.list_products_by_category(current_topic)
-    
-        if category_products:
-            bullet_list = "\n- " + "\n- ".join(category_products)
-            fallback_response = f"I couldn’t find detailed info, but here are other {current_topic.title()} products:\n{bullet_list}"
-            text_utils.append_to_chat_history(request, user_message, fallback_response)
-            return JsonResponse({"response": fallback_response})
-        
-    return JsonResponse({"response": response}) 
+    def fallback_product_list(response):
+        if (
+            product_listing_service.is_product_list_request(user_message)
+            and current_topic
+            and (
+                not response.strip()
+                or "sorry" in response.lower()
+                or "not sure" in response.lower()
+                or "couldn’t find" in response.lower()
+            )
+        ):
+            print(f"⚠️ GPT was uncertain. Attempting fallback product list for: {current_topic}")
+            category_products = product_listing_service.list_products_by_category(current_topic)
+
+            if category_products:
+                bullet_list = "\n- " + "\n- ".join(category_products)
+                return f"I couldn’t find detailed info, but here are other {current_topic.title()} products:\n{bullet_list}"
+        return None
+
+    return llm_services.GptReply(user_message, messages, chunk_ids, semantic=semantic, finalize=fallback_product_list)
@@ -174,6 +174,93 @@ STATICFILES_DIRS = [
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 API_KEY = config('API_KEY')
 
+# Embedding model and Chroma collection (loaded lazily on first use)
+CHATBOT_EMBEDDING_MODEL_PATH = config('CHATBOT_EMBEDDING_MODEL_PATH', default=r"C:\Users\mdbl.plc\Downloads\bge-base-en-v1.5")
+CHATBOT_CHROMA_PATH = config('CHATBOT_CHROMA_PATH', default=r"C:\Users\mdbl.plc\Scraper\chroma_rich")
+# CHATBOT_CHROMA_PATH = r"/var/www/midlandbank_chatbot/chroma_rich"
+CHATBOT_COLLECTION_NAME = config('CHATBOT_COLLECTION_NAME', default='midland_detailed')
+# Load the model and collection in AppConfig.ready; only server processes
+# (WSGI/ASGI entry points, runserver) warm up, other commands never do
+CHATBOT_WARMUP_ON_START = config('CHATBOT_WARMUP_ON_START', default=False, cast=bool)
+
+# Number of Chroma candidates re-ranked per query (top 5 are kept)
+CHATBOT_CANDIDATE_POOL = config('CHATBOT_CANDIDATE_POOL', default=30, cast=int)
+# "vector" (Chroma only) or "hybrid" (BM25 + vector with reciprocal-rank fusion)
+CHATBOT_RETRIEVAL_MODE = config('CHATBOT_RETRIEVAL_MODE', default='vector')
+CHATBOT_RRF_K = config('CHATBOT_RRF_K', default=60, cast=int)
+# How often in-memory indexes check the collection for corpus changes
+CHATBOT_CORPUS_CHECK_SECONDS = config('CHATBOT_CORPUS_CHECK_SECONDS', default=60, cast=int)
+# Seconds before a failed product catalog build is retried (the last catalog is served meanwhile)
+CHATBOT_CATALOG_RETRY_SECONDS = config('CHATBOT_CATALOG_RETRY_SECONDS', default=60, cast=int)
+# Seconds before a failed branch directory build is retried
+CHATBOT_BRANCH_DIRECTORY_RETRY_SECONDS = config('CHATBOT_BRANCH_DIRECTORY_RETRY_SECONDS', default=60, cast=int)
+# In-memory LRU size for query embeddings (all embeddings also go to cache_dir)
+CHATBOT_EMBEDDING_CACHE_SIZE = config('CHATBOT_EMBEDDING_CACHE_SIZE', default=2048, cast=int)
+# Per-chunk scoring features kept in memory between requests
+CHATBOT_CHUNK_FEATURE_CACHE_SIZE = config('CHATBOT_CHUNK_FEATURE_CACHE_SIZE', default=4096, cast=int)
+# Semantic answer cache: reuse an answer for a paraphrased question over the same chunks
+CHATBOT_SEMANTIC_CACHE_ENABLED = config('CHATBOT_SEMANTIC_CACHE_ENABLED', default=True, cast=bool)
+CHATBOT_SEMANTIC_CACHE_THRESHOLD = config('CHATBOT_SEMANTIC_CACHE_THRESHOLD', default=0.92, cast=float)
+CHATBOT_SEMANTIC_CACHE_TTL = config('CHATBOT_SEMANTIC_CACHE_TTL', default=6 * 60 * 60, cast=int)
+CHATBOT_SEMANTIC_CACHE_SIZE = config('CHATBOT_SEMANTIC_CACHE_SIZE', default=5000, cast=int)
+# Cache entries are namespaced by corpus + prompt version, so TTLs can be long
+CHATBOT_PROMPT_VERSION = config('CHATBOT_PROMPT_VERSION', default='')
+CHATBOT_ANSWER_CACHE_TTL = config('CHATBOT_ANSWER_CACHE_TTL', default=7 * 24 * 60 * 60, cast=int)
+CHATBOT_RETRIEVAL_CACHE_TTL = config('CHATBOT_RETRIEVAL_CACHE_TTL', default=30 * 24 * 60 * 60, cast=int)
+# Rankings cached while the reranker was loading or out of budget expire sooner
+CHATBOT_RETRIEVAL_FALLBACK_CACHE_TTL = config('CHATBOT_RETRIEVAL_FALLBACK_CACHE_TTL', default=5 * 60, cast=int)
+CHATBOT_SUMMARY_CACHE_TTL = config('CHATBOT_SUMMARY_CACHE_TTL', default=30 * 24 * 60 * 60, cast=int)
+# How long a streamed answer waits in the cache to be added to the session's chat history
+CHATBOT_PENDING_REPLY_TTL = config('CHATBOT_PENDING_REPLY_TTL', default=24 * 60 * 60, cast=int)
+# Chunk texts held in memory for assembling cached retrieval contexts
+CHATBOT_CHUNK_STORE_SIZE = config('CHATBOT_CHUNK_STORE_SIZE', default=2048, cast=int)
+# Background removal of entries from old namespaces (0 disables)
+CHATBOT_CACHE_SWEEP_INTERVAL = config('CHATBOT_CACHE_SWEEP_INTERVAL', default=15 * 60, cast=int)
+CHATBOT_CACHE_SWEEP_BATCH = config('CHATBOT_CACHE_SWEEP_BATCH', default=500, cast=int)
+# Threads for Chroma/embedding work behind the async view (chatbot/async/)
+CHATBOT_BLOCKING_WORKERS = config('CHATBOT_BLOCKING_WORKERS', default=8, cast=int)
+# Threads for parallel work within one request, e.g. comparison summaries
+CHATBOT_FANOUT_WORKERS = config('CHATBOT_FANOUT_WORKERS', default=8, cast=int)
+# Seconds a comparison waits for its context summaries before using the raw contexts
+CHATBOT_SUMMARY_DEADLINE = config('CHATBOT_SUMMARY_DEADLINE', default=12, cast=float)
+# Product listings are rendered from templates; True also has GPT rephrase them
+CHATBOT_LISTING_LLM_POLISH = config('CHATBOT_LISTING_LLM_POLISH', default=False, cast=bool)
+# Identical concurrent GPT/retrieval calls wait for one leader, at most this long
+CHATBOT_SINGLE_FLIGHT_TIMEOUT = config('CHATBOT_SINGLE_FLIGHT_TIMEOUT', default=45, cast=int)
+CHATBOT_SINGLE_FLIGHT_LOCK_TTL = config('CHATBOT_SINGLE_FLIGHT_LOCK_TTL', default=120, cast=int)
+# Input tokens per GPT request, split system/user > context > history (see prompt_budget)
+CHATBOT_PROMPT_TOKEN_BUDGET = config('CHATBOT_PROMPT_TOKEN_BUDGET', default=2500, cast=int)
+CHATBOT_PROMPT_HISTORY_SHARE = config('CHATBOT_PROMPT_HISTORY_SHARE', default=0.3, cast=float)
+# tiktoken encoding for counting (optional; falls back to an estimate)
+CHATBOT_TOKENIZER = config('CHATBOT_TOKENIZER', default='o200k_base')
+# OpenAI transport: base URL (None = api.openai.com), keep-alive pool, per-stage timeouts (seconds)
+CHATBOT_OPENAI_BASE_URL = config('CHATBOT_OPENAI_BASE_URL', default=None)
+CHATBOT_OPENAI_MAX_CONNECTIONS = config('CHATBOT_OPENAI_MAX_CONNECTIONS', default=50, cast=int)
+CHATBOT_OPENAI_MAX_KEEPALIVE = config('CHATBOT_OPENAI_MAX_KEEPALIVE', default=20, cast=int)
+CHATBOT_OPENAI_KEEPALIVE_EXPIRY = config('CHATBOT_OPENAI_KEEPALIVE_EXPIRY', default=30.0, cast=float)
+CHATBOT_OPENAI_CONNECT_TIMEOUT = config('CHATBOT_OPENAI_CONNECT_TIMEOUT', default=3.0, cast=float)
+CHATBOT_OPENAI_READ_TIMEOUT = config('CHATBOT_OPENAI_READ_TIMEOUT', default=30.0, cast=float)
+CHATBOT_OPENAI_WRITE_TIMEOUT = config('CHATBOT_OPENAI_WRITE_TIMEOUT', default=10.0, cast=float)
+CHATBOT_OPENAI_POOL_TIMEOUT = config('CHATBOT_OPENAI_POOL_TIMEOUT', default=2.0, cast=float)
+CHATBOT_OPENAI_MAX_RETRIES = config('CHATBOT_OPENAI_MAX_RETRIES', default=0, cast=int)
+# Seconds tenacity may spend retrying rate limits before giving up
+CHATBOT_OPENAI_RETRY_DEADLINE = config('CHATBOT_OPENAI_RETRY_DEADLINE', default=8, cast=int)
+# Circuit breaker: open after N consecutive failures/slow calls, retry after the cooldown
+CHATBOT_BREAKER_FAILURES = config('CHATBOT_BREAKER_FAILURES', default=5, cast=int)
+CHATBOT_BREAKER_SLOW_SECONDS = config('CHATBOT_BREAKER_SLOW_SECONDS', default=20, cast=float)
+CHATBOT_BREAKER_COOLDOWN = config('CHATBOT_BREAKER_COOLDOWN', default=30, cast=int)
+# Optional CPU cross-encoder reranker (e.g. a local ms-marco-MiniLM-L-6-v2); unset disables it
+CHATBOT_RERANKER_MODEL_PATH = config('CHATBOT_RERANKER_MODEL_PATH', default=None)
+CHATBOT_RERANKER_MAX_LENGTH = config('CHATBOT_RERANKER_MAX_LENGTH', default=512, cast=int)
+CHATBOT_RERANK_TOP_N = config('CHATBOT_RERANK_TOP_N', default=10, cast=int)
+CHATBOT_RERANK_BATCH_SIZE = config('CHATBOT_RERANK_BATCH_SIZE', default=8, cast=int)
+# Seconds before a failed reranker load is retried
+CHATBOT_RERANK_RETRY_SECONDS = config('CHATBOT_RERANK_RETRY_SECONDS', default=60, cast=int)
+# Per-request budget; past it the heuristic order is used unchanged
+CHATBOT_RERANK_BUDGET_MS = config('CHATBOT_RERANK_BUDGET_MS', default=300, cast=int)
+# Chunks sent to GPT when the rerank succeeded (instead of 5)
+CHATBOT_RERANK_KEEP = config('CHATBOT_RERANK_KEEP', default=3, cast=int)
+
 REST_FRAMEWORK = {
     "DEFAULT_THROTTLE_CLASSES": [
         "chatbot.throttles.SessionRateThrottle",
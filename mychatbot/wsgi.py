@@ -12,5 +12,7 @@ import os
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mychatbot.settings')
+# Lets ChatbotConfig.ready warm up only in server processes
+os.environ.setdefault('CHATBOT_SERVER_PROCESS', '1')
 
 application = get_wsgi_application()